@@ -0,0 +1,55 @@
+"""Các phép toán trên bbox dạng mảng NumPy (N, 4) theo định dạng [x1, y1, x2, y2]."""
+import numpy as np
+
+
+def box_area(boxes: np.ndarray) -> np.ndarray:
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    return np.clip(boxes[:, 2] - boxes[:, 0], 0, None) * np.clip(boxes[:, 3] - boxes[:, 1], 0, None)
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """IoU giữa từng cặp bbox của a (N, 4) và b (M, 4), trả về ma trận (N, M)."""
+    a = np.asarray(a, dtype=np.float32).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float32).reshape(-1, 4)
+
+    top_left = np.maximum(a[:, None, :2], b[None, :, :2])
+    bottom_right = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    wh = np.clip(bottom_right - top_left, 0, None)
+    inter = wh[..., 0] * wh[..., 1]
+
+    union = box_area(a)[:, None] + box_area(b)[None, :] - inter
+    return np.where(union > 0, inter / np.maximum(union, 1e-9), 0.0).astype(np.float32)
+
+
+def nms(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5) -> np.ndarray:
+    """Non-maximum suppression, trả về chỉ số các bbox được giữ lại (theo score giảm dần)."""
+    labels = cluster_boxes(boxes, scores, iou_threshold)
+    order = np.argsort(-np.asarray(scores, dtype=np.float32).reshape(-1), kind='stable')
+    # Tâm của mỗi cụm (bbox xuất hiện đầu tiên theo score giảm dần) là bbox được giữ lại
+    _, first = np.unique(labels[order], return_index=True)
+    return order[first]
+
+
+def cluster_boxes(boxes: np.ndarray, scores: np.ndarray, iou_threshold: float = 0.5) -> np.ndarray:
+    """Gom cụm bbox kiểu NMS: bbox có score cao nhất chưa thuộc cụm nào làm tâm,
+    mọi bbox chưa gán có IoU >= iou_threshold với tâm thuộc cùng cụm.
+
+    Trả về mảng nhãn cụm (N,), cụm 0 là cụm có tâm score cao nhất.
+    """
+    boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+    scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+    labels = np.full(len(boxes), -1, dtype=np.int64)
+    if len(boxes) == 0:
+        return labels
+
+    iou = box_iou(boxes, boxes)
+    order = np.argsort(-scores, kind='stable')
+    cluster = 0
+    for seed in order:
+        if labels[seed] >= 0:
+            continue
+        members = (labels < 0) & (iou[seed] >= iou_threshold)
+        members[seed] = True
+        labels[members] = cluster
+        cluster += 1
+    return labels
@@ -0,0 +1,90 @@
+import logging
+import os
+from typing import Any, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Phương sai Laplacian (ảnh xám rộng 320px) nhỏ hơn ngưỡng này thì coi là mờ
+FRAME_MIN_SHARPNESS = float(os.getenv("FRAME_MIN_SHARPNESS", "20"))
+# Tỉ lệ pixel tối (< FRAME_DARK_LEVEL) hoặc cháy sáng (>= FRAME_BRIGHT_LEVEL) tối đa
+FRAME_MAX_CLIPPED_RATIO = float(os.getenv("FRAME_MAX_CLIPPED_RATIO", "0.4"))
+FRAME_DARK_LEVEL = int(os.getenv("FRAME_DARK_LEVEL", "16"))
+FRAME_BRIGHT_LEVEL = int(os.getenv("FRAME_BRIGHT_LEVEL", "240"))
+# Kích thước tối thiểu (px, toạ độ frame gốc) của bbox biển số để đáng chạy enhance + OCR
+PLATE_MIN_WIDTH = int(os.getenv("PLATE_MIN_WIDTH", "60"))
+PLATE_MIN_HEIGHT = int(os.getenv("PLATE_MIN_HEIGHT", "15"))
+
+
+class FrameQualityScorer:
+    """Chấm điểm nhanh chất lượng frame trước khi chạy detect → enhance → OCR.
+
+    - Độ nét: phương sai Laplacian trên ảnh xám đã thu nhỏ
+    - Phơi sáng: tỉ lệ pixel quá tối / quá sáng trên histogram
+    - Kích thước biển số: bbox quá nhỏ thì OCR gần như chắc chắn sai
+    """
+
+    def __init__(self, min_sharpness: float = FRAME_MIN_SHARPNESS, max_clipped_ratio: float = FRAME_MAX_CLIPPED_RATIO,
+                 min_plate_size: Tuple[int, int] = (PLATE_MIN_WIDTH, PLATE_MIN_HEIGHT), analysis_width: int = 320,
+                 dark_level: int = FRAME_DARK_LEVEL, bright_level: int = FRAME_BRIGHT_LEVEL):
+        self.min_sharpness = min_sharpness
+        self.max_clipped_ratio = max_clipped_ratio
+        self.min_plate_size = min_plate_size
+        self.analysis_width = analysis_width
+        self.dark_level = dark_level
+        self.bright_level = bright_level
+
+    def score_frame(self, frame: np.ndarray) -> Dict[str, Any]:
+        h, w = frame.shape[:2]
+        if w > self.analysis_width:
+            frame = cv2.resize(frame, (self.analysis_width, max(1, int(h * self.analysis_width / w))),
+                               interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+        sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+        hist = np.bincount(gray.ravel(), minlength=256) / gray.size
+        dark_ratio = float(hist[:self.dark_level].sum())
+        bright_ratio = float(hist[self.bright_level:].sum())
+
+        reason = None
+        if sharpness < self.min_sharpness:
+            reason = f"Ảnh bị mờ (sharpness={sharpness:.1f})"
+        elif dark_ratio > self.max_clipped_ratio:
+            reason = f"Ảnh quá tối ({dark_ratio:.0%} pixel tối)"
+        elif bright_ratio > self.max_clipped_ratio:
+            reason = f"Ảnh bị cháy sáng ({bright_ratio:.0%} pixel quá sáng)"
+
+        return {
+            'ok': reason is None,
+            'reason': reason,
+            'sharpness': sharpness,
+            'dark_ratio': dark_ratio,
+            'bright_ratio': bright_ratio,
+        }
+
+    def pick_sharpest(self, frames: List[np.ndarray]) -> Tuple[Optional[int], List[Dict[str, Any]]]:
+        """Chọn frame nét nhất trong các frame đạt chất lượng, trả về (chỉ số, điểm của từng frame)."""
+        scores = [self.score_frame(frame) for frame in frames]
+        candidates = [i for i, score in enumerate(scores) if score['ok']]
+        if not candidates:
+            return None, scores
+        best = max(candidates, key=lambda i: scores[i]['sharpness'])
+        logger.info(f"Chọn frame {best}/{len(frames)}, sharpness={scores[best]['sharpness']:.1f}")
+        return best, scores
+
+    def check_plate_box(self, boxes: np.ndarray, scores: np.ndarray) -> Tuple[bool, Optional[str]]:
+        """Kiểm tra kích thước bbox biển số tốt nhất, trước khi cắt + enhance."""
+        if boxes is None or len(boxes) == 0:
+            return False, "Không tìm thấy biển số nào"
+
+        x1, y1, x2, y2 = boxes[int(np.argmax(scores))]
+        min_w, min_h = self.min_plate_size
+        if x2 - x1 < min_w or y2 - y1 < min_h:
+            return False, f"Biển số quá nhỏ ({x2 - x1:.0f}x{y2 - y1:.0f}px)"
+        return True, None
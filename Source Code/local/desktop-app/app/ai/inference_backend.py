@@ -0,0 +1,205 @@
+import glob
+import logging
+import os
+import shutil
+from typing import Dict, List, Optional, Type
+
+import cv2
+import numpy as np
+
+from dotenv import load_dotenv
+from ultralytics import YOLO
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_BACKEND = os.getenv("DETECTOR_BACKEND", "torch")
+DEFAULT_CACHE_DIR = os.path.join(os.path.dirname(__file__), 'exported')
+# Dữ liệu hiệu chỉnh (calibration) cho lượng tử hóa INT8
+CALIB_DATA = os.getenv("DETECTOR_CALIB_DATA")        # file dataset .yaml (OpenVINO/NNCF)
+CALIB_IMAGES = os.getenv("DETECTOR_CALIB_IMAGES")    # thư mục ảnh (ONNX Runtime static quantization)
+
+
+class InferenceBackend:
+    """Backend mặc định: chạy trực tiếp file .pt bằng PyTorch eager."""
+    name = 'torch'
+
+    def __init__(self, model_path: str, cache_dir: str = DEFAULT_CACHE_DIR, imgsz: int = 640):
+        self.model_path = model_path
+        self.cache_dir = cache_dir
+        self.imgsz = imgsz
+
+    def resolve_model_path(self) -> str:
+        return self.model_path
+
+    def load(self) -> YOLO:
+        path = self.resolve_model_path()
+        model = YOLO(path, task='detect')
+        logger.info(f"Backend '{self.name}' đã load model từ: {path}")
+        return model
+
+
+class ExportedBackend(InferenceBackend):
+    """Backend dùng model đã export, lưu cache theo kích thước + thời gian sửa của file .pt."""
+    export_format: str = ''
+    export_suffix: str = ''
+    export_kwargs: Dict = {}
+
+    def _fingerprint(self) -> str:
+        stat = os.stat(self.model_path)
+        return f"{stat.st_size:x}{stat.st_mtime_ns:x}"
+
+    def cached_model_path(self) -> str:
+        stem = os.path.splitext(os.path.basename(self.model_path))[0]
+        name = f"{stem}-{self.name}-{self.imgsz}-{self._fingerprint()}{self.export_suffix}"
+        return os.path.join(self.cache_dir, name)
+
+    def resolve_model_path(self) -> str:
+        target = self.cached_model_path()
+        if os.path.exists(target):
+            logger.info(f"Dùng model '{self.name}' đã export: {target}")
+            return target
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        logger.info(f"Chưa có model '{self.name}' trong cache, đang export từ {self.model_path} ...")
+        exported = self._export()
+        shutil.move(exported, target)
+        logger.info(f"Export xong: {target}")
+        return target
+
+    def _export(self) -> str:
+        # dynamic=True để model export vẫn nhận batch nhiều frame
+        return YOLO(self.model_path).export(
+            format=self.export_format, imgsz=self.imgsz, dynamic=True, **self.export_kwargs
+        )
+
+
+class OnnxBackend(ExportedBackend):
+    name = 'onnx'
+    export_format = 'onnx'
+    export_suffix = '.onnx'
+    export_kwargs = {'simplify': True}
+
+
+class OpenVinoBackend(ExportedBackend):
+    name = 'openvino'
+    export_format = 'openvino'
+    export_suffix = '_openvino_model'
+
+
+class OnnxInt8Backend(OnnxBackend):
+    """ONNX lượng tử hóa INT8.
+
+    Có DETECTOR_CALIB_IMAGES thì dùng static quantization (QDQ) với ảnh thật,
+    không có thì dùng dynamic quantization (chỉ lượng tử hóa trọng số).
+    """
+    name = 'onnx-int8'
+
+    def _export(self) -> str:
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_dynamic, quantize_static
+
+        fp32_path = super()._export()
+        int8_path = fp32_path.replace('.onnx', '.int8.onnx')
+
+        images = list_calibration_images(CALIB_IMAGES)
+        if images:
+            logger.info(f"Static quantization với {len(images)} ảnh hiệu chỉnh")
+            quantize_static(
+                fp32_path, int8_path,
+                _OnnxCalibrationReader(fp32_path, images, self.imgsz),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+            )
+        else:
+            logger.warning("Không có DETECTOR_CALIB_IMAGES, dùng dynamic quantization")
+            quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QUInt8)
+
+        os.remove(fp32_path)
+        return int8_path
+
+
+class OpenVinoInt8Backend(OpenVinoBackend):
+    """OpenVINO INT8 (NNCF post-training quantization), cần dataset .yaml để hiệu chỉnh."""
+    name = 'openvino-int8'
+
+    def _export(self) -> str:
+        if not CALIB_DATA:
+            raise ValueError("Cần đặt DETECTOR_CALIB_DATA (dataset .yaml) để export OpenVINO INT8")
+        return YOLO(self.model_path).export(
+            format=self.export_format, imgsz=self.imgsz, dynamic=True, int8=True, data=CALIB_DATA
+        )
+
+
+class _OnnxCalibrationReader:
+    """CalibrationDataReader cho onnxruntime: letterbox ảnh giống tiền xử lý của YOLO."""
+
+    def __init__(self, model_path: str, images: List[str], imgsz: int):
+        import onnxruntime as ort
+
+        session = ort.InferenceSession(model_path, providers=['CPUExecutionProvider'])
+        self._input_name = session.get_inputs()[0].name
+        self._images = iter(images)
+        self._imgsz = imgsz
+
+    def get_next(self) -> Optional[Dict[str, np.ndarray]]:
+        for path in self._images:
+            image = cv2.imread(path)
+            if image is not None:
+                return {self._input_name: letterbox_tensor(image, self._imgsz)}
+        return None
+
+
+def list_calibration_images(directory: Optional[str], limit: int = 200) -> List[str]:
+    if not directory or not os.path.isdir(directory):
+        return []
+    paths = []
+    for ext in ('*.jpg', '*.jpeg', '*.png'):
+        paths.extend(glob.glob(os.path.join(directory, '**', ext), recursive=True))
+    return sorted(paths)[:limit]
+
+
+def letterbox_tensor(image: np.ndarray, imgsz: int) -> np.ndarray:
+    """Resize giữ tỉ lệ + pad 114 về imgsz x imgsz, trả về tensor NCHW float32 (RGB, 0..1)."""
+    h, w = image.shape[:2]
+    scale = min(imgsz / h, imgsz / w)
+    new_w, new_h = int(round(w * scale)), int(round(h * scale))
+    resized = cv2.resize(image, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((imgsz, imgsz, 3), 114, dtype=np.uint8)
+    top, left = (imgsz - new_h) // 2, (imgsz - new_w) // 2
+    canvas[top:top + new_h, left:left + new_w] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1)[None].astype(np.float32) / 255.0
+    return np.ascontiguousarray(tensor)
+
+
+BACKENDS: Dict[str, Type[InferenceBackend]] = {
+    InferenceBackend.name: InferenceBackend,
+    OnnxBackend.name: OnnxBackend,
+    OpenVinoBackend.name: OpenVinoBackend,
+    OnnxInt8Backend.name: OnnxInt8Backend,
+    OpenVinoInt8Backend.name: OpenVinoInt8Backend,
+}
+
+
+def create_backend(name: Optional[str], model_path: str, **kwargs) -> InferenceBackend:
+    name = (name or DEFAULT_BACKEND).strip().lower()
+    if name not in BACKENDS:
+        raise ValueError(f"Backend không hợp lệ: {name} (hỗ trợ: {', '.join(BACKENDS)})")
+    return BACKENDS[name](model_path, **kwargs)
+
+
+def load_model(name: Optional[str], model_path: str, **kwargs) -> YOLO:
+    """Load model theo backend, nếu export/load lỗi thì quay về PyTorch eager."""
+    backend = create_backend(name, model_path, **kwargs)
+    try:
+        return backend.load()
+    except Exception as e:
+        if backend.name == InferenceBackend.name:
+            raise
+        logger.error(f"Không load được backend '{backend.name}': {e}. Chuyển về backend torch")
+        return InferenceBackend(model_path, **kwargs).load()
@@ -0,0 +1,136 @@
+"""Engine suy luận dùng chung cho nhiều làn (cổng vào / cổng ra) trong cùng một tiến trình.
+
+Model YOLO + OCR chỉ được load 1 lần cho cả máy; mỗi làn có hàng đợi riêng, pipeline lấy job
+của các làn theo vòng (round-robin) và gom frame của nhiều làn vào cùng 1 batch detect.
+"""
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from dotenv import load_dotenv
+
+from app.ai.pipeline import DEFAULT_QUEUE_SIZE, PipelineJob, PlatePipeline
+from app.ai.stage_metrics import stage_metrics
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# 'thread': model chạy trong tiến trình GUI; 'process': model chạy ở tiến trình con (app/ai/inference_process.py);
+# 'remote': gửi ảnh tới inference service trên máy khác / tiến trình khác (app/ai/inference_service.py)
+INFERENCE_MODES = ('thread', 'process', 'remote')
+DEFAULT_INFERENCE_MODE = os.getenv("INFERENCE_MODE", "thread")
+
+
+class InferenceEngine:
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = super(InferenceEngine, cls).__new__(cls)
+        return cls._instance
+
+    def __init__(self):
+        if hasattr(self, "_initialized"):
+            return
+
+        self.mode = DEFAULT_INFERENCE_MODE
+        if self.mode not in INFERENCE_MODES:
+            raise ValueError(f"INFERENCE_MODE phải là một trong {INFERENCE_MODES}, nhận '{self.mode}'")
+        # Proccessor chỉ có trong tiến trình này khi mode='thread'
+        self.proccessor = None
+        self.pipeline = None
+        self.timings: Dict[str, float] = {}
+        self._lanes: Dict[str, Callable[[PipelineJob], None]] = {}
+        self._load_lock = threading.Lock()
+
+        self._initialized = True
+
+    @property
+    def ready(self) -> bool:
+        return self.pipeline is not None
+
+    def load(self, plate_index=None, workers: Optional[Dict[str, int]] = None,
+             queue_size: int = DEFAULT_QUEUE_SIZE, mode: Optional[str] = None):
+        """Load + warmup model và khởi động pipeline; các lần gọi sau (làn khác) dùng lại model đã load.
+
+        Trả về Proccessor, hoặc None khi model không nằm trong tiến trình này (mode 'process' / 'remote').
+        """
+        with self._load_lock:
+            if self.pipeline is not None:
+                logger.info("Inference engine đã sẵn sàng, dùng lại model đã load")
+                return self.proccessor
+
+            self.mode = mode or self.mode
+            if self.mode == 'remote':
+                from app.ai.inference_service import RemotePipeline
+
+                pipeline = RemotePipeline(queue_size=queue_size)
+                pipeline.start()
+                self.timings = dict(pipeline.timings)
+            elif self.mode == 'process':
+                from app.ai.inference_process import ProcessPipeline
+
+                pipeline = ProcessPipeline(plate_index, queue_size=queue_size)
+                pipeline.start()
+                self.timings = dict(pipeline.timings)
+            else:
+                # Import tại đây để chỉ kéo theo torch/ultralytics/easyocr khi thật sự load model
+                from app.ai.proccessor import Proccessor
+
+                self.proccessor = Proccessor(plate_index=plate_index)
+                self.timings = dict(self.proccessor.warmup())
+                pipeline = PlatePipeline(self.proccessor, workers=workers, queue_size=queue_size)
+                pipeline.start()
+
+            for lane in self._lanes:
+                pipeline.add_lane(lane)
+            self.pipeline = pipeline
+            return self.proccessor
+
+    def register_lane(self, lane: str, on_done: Callable[[PipelineJob], None]):
+        """Đăng ký làn và callback nhận kết quả (gọi từ thread của stage cuối pipeline)."""
+        self._lanes[lane] = on_done
+        if self.pipeline is not None:
+            self.pipeline.add_lane(lane)
+        logger.info(f"Đăng ký làn '{lane}', tổng {len(self._lanes)} làn")
+
+    def unregister_lane(self, lane: str):
+        self._lanes.pop(lane, None)
+        if self.pipeline is not None:
+            self.pipeline.remove_lane(lane)
+
+    def submit(self, lane: str, data, camera_id: Optional[str] = None,
+               fallback_detection: Optional[dict] = None, context: Any = None,
+               cache_scope: Optional[str] = None) -> bool:
+        """Đưa ảnh (hoặc list ảnh của 1 burst) của làn vào hàng đợi; False nếu model chưa sẵn sàng hoặc
+        hàng đợi của làn đã đầy.
+
+        cache_scope: UID thẻ, cho phép dùng lại kết quả OCR khi cùng thẻ được quẹt lại.
+        """
+        on_done = self._lanes.get(lane)
+        if on_done is None:
+            raise ValueError(f"Làn '{lane}' chưa được đăng ký")
+        if self.pipeline is None:
+            logger.warning(f"Inference engine chưa sẵn sàng, bỏ ảnh của làn '{lane}'")
+            return False
+        return self.pipeline.submit(data, camera_id, fallback_detection, context, lane=lane, on_done=on_done,
+                                    cache_scope=cache_scope)
+
+    def stage_stats(self) -> Dict[str, Dict[str, float]]:
+        """p50/p95/p99 (ms) của từng stage trên STAGE_METRICS_WINDOW job gần nhất."""
+        return stage_metrics.snapshot()
+
+    def queue_depths(self) -> Dict[str, int]:
+        return self.pipeline.queue_depths() if self.pipeline is not None else {}
+
+    def shutdown(self):
+        with self._load_lock:
+            if self.pipeline is not None:
+                self.pipeline.stop()
+            self.pipeline = None
+            self.proccessor = None
@@ -0,0 +1,346 @@
+"""Chạy Proccessor ở tiến trình riêng để YOLO/EasyOCR không tranh GIL với GUI và vòng lặp MQTT.
+
+Ảnh (hoặc cả loạt ảnh burst) được chép vào các slot của một vùng `multiprocessing.shared_memory` (ring)
+thay vì pickle ndarray qua queue; queue chỉ chở metadata nhỏ (slot, kích thước, camera id). Tiến trình con
+trả slot ngay sau khi chép ảnh ra, rồi detect (gom batch các ảnh đang chờ) → crop → OCR.
+"""
+import atexit
+import logging
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from multiprocessing import shared_memory
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.ai.pipeline import DEFAULT_LANE, DEFAULT_QUEUE_SIZE, PipelineJob, finish_job
+from app.ai.stage_metrics import StageTimer
+from app.utils.convert_util import bytes_to_ndarray
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INFERENCE_SLOTS = int(os.getenv("INFERENCE_SLOTS", "8"))
+# Mỗi slot đủ chứa 1 frame BGR 1920x1080 chưa nén hoặc cả loạt ảnh JPEG của 1 lần chụp
+INFERENCE_SLOT_SIZE = int(float(os.getenv("INFERENCE_SLOT_SIZE_MB", "8")) * 1024 * 1024)
+INFERENCE_START_TIMEOUT = float(os.getenv("INFERENCE_START_TIMEOUT", "300"))
+
+# Metadata của 1 ảnh trong slot: ('jpeg', số byte, offset) hoặc ('raw', shape, dtype, offset);
+# cả loạt ảnh trong 1 slot: ('burst', [metadata từng ảnh])
+SlotMeta = Tuple
+
+
+class FrameRing:
+    """Vùng shared memory chia thành các slot kích thước cố định."""
+
+    def __init__(self, slots: int = INFERENCE_SLOTS, slot_size: int = INFERENCE_SLOT_SIZE, name: Optional[str] = None):
+        self.slots = slots
+        self.slot_size = slot_size
+        self.owner = name is None
+        self.shm = shared_memory.SharedMemory(name=name, create=self.owner, size=slots * slot_size)
+
+    @property
+    def name(self) -> str:
+        return self.shm.name
+
+    def _view(self, slot: int, nbytes: int, offset: int = 0) -> np.ndarray:
+        offset += slot * self.slot_size
+        return np.ndarray((nbytes,), dtype=np.uint8, buffer=self.shm.buf, offset=offset)
+
+    def write(self, slot: int, data) -> SlotMeta:
+        """Chép ảnh (bytes JPEG hoặc ndarray) hoặc cả loạt ảnh (list) vào slot, trả về metadata để bên kia đọc lại."""
+        if isinstance(data, (list, tuple)):
+            metas, offset = [], 0
+            for item in data:
+                meta, offset = self._write_at(slot, offset, item)
+                metas.append(meta)
+            return ('burst', metas)
+        return self._write_at(slot, 0, data)[0]
+
+    def _write_at(self, slot: int, offset: int, data) -> Tuple[SlotMeta, int]:
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            payload = np.frombuffer(data, dtype=np.uint8)
+            meta = ('jpeg', payload.nbytes, offset)
+        else:
+            data = np.ascontiguousarray(data)
+            payload = data.reshape(-1).view(np.uint8)
+            meta = ('raw', data.shape, data.dtype.str, offset)
+        if offset + payload.nbytes > self.slot_size:
+            raise ValueError(f"Ảnh {offset + payload.nbytes} byte vượt kích thước slot {self.slot_size} byte")
+        self._view(slot, payload.nbytes, offset)[:] = payload
+        return meta, offset + payload.nbytes
+
+    def read(self, slot: int, meta: SlotMeta):
+        """Chép ảnh (hoặc list ảnh của loạt) ra khỏi slot để slot được dùng lại ngay, giải mã nếu là JPEG."""
+        if meta[0] == 'burst':
+            return [self.read(slot, item) for item in meta[1]]
+        if meta[0] == 'jpeg':
+            return bytes_to_ndarray(self._view(slot, meta[1], meta[2]).tobytes())
+        shape, dtype = meta[1], np.dtype(meta[2])
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+        return self._view(slot, nbytes, meta[3]).copy().view(dtype).reshape(shape)
+
+    def close(self):
+        self.shm.close()
+        if self.owner:
+            try:
+                self.shm.unlink()
+            except FileNotFoundError:
+                pass
+
+
+def _worker_main(shm_name: str, slots: int, slot_size: int, requests, results, plates, batch_size: int):
+    """Vòng lặp của tiến trình con: load model, nhận job qua requests, trả kết quả qua results."""
+    # Import tại đây để tiến trình cha không phải load torch/ultralytics/easyocr
+    from app.ai.plate_index import PlateIndex
+    from app.ai.proccessor import Proccessor
+
+    ring = FrameRing(slots, slot_size, name=shm_name)
+    try:
+        plate_index = PlateIndex()
+        plate_index.add_many(plates)
+        proccessor = Proccessor(plate_index=plate_index)
+        results.put(('ready', dict(proccessor.warmup())))
+    except Exception as e:
+        results.put(('failed', str(e)))
+        ring.close()
+        return
+
+    stopping = False
+    while not stopping:
+        messages = [requests.get()]
+        # Gom các job đang chờ để detect 1 batch
+        while len(messages) < batch_size:
+            try:
+                messages.append(requests.get_nowait())
+            except queue.Empty:
+                break
+
+        jobs = []
+        for message in messages:
+            if message is None:
+                stopping = True
+            elif message[0] == 'plates':
+                plate_index.add_many(message[1])
+            else:
+                _, job_id, slot, meta, camera_id, fallback_detection, cache_scope = message
+                timer = StageTimer()
+                try:
+                    with timer.stage('decode'):
+                        frames = ring.read(slot, meta)
+                    jobs.append((job_id, frames, camera_id, fallback_detection, timer, cache_scope))
+                except Exception as e:
+                    results.put(('done', job_id, None, str(e), {}, 0))
+                finally:
+                    results.put(('free', job_id, slot))
+        if jobs:
+            _process_jobs(proccessor, jobs, results)
+    ring.close()
+
+
+def _process_jobs(proccessor, jobs: list, results):
+    try:
+        detections = proccessor.detect_frames([job[1] for job in jobs], [job[2] for job in jobs],
+                                              [job[4] for job in jobs])
+    except Exception as e:
+        for job_id, *_, timer, _ in jobs:
+            results.put(('done', job_id, None, str(e), timer.timings, 0))
+        return
+
+    for (job_id, frames, _, fallback_detection, timer, cache_scope), detection in zip(jobs, detections):
+        result, error, frame_index = None, None, 0
+        try:
+            detect_result = proccessor.crop_detection(frames, detection, fallback_detection, timer)
+            frame_index = detect_result.get('frame_index', 0)
+            result = proccessor.read_and_validate(detect_result, timer, cache_scope)
+        except Exception as e:
+            error = str(e)
+        results.put(('done', job_id, result, error, timer.timings, frame_index))
+
+
+class ProcessPipeline:
+    """Cùng giao diện với PlatePipeline nhưng model chạy ở tiến trình con.
+
+    Mỗi làn được giữ tối đa queue_size slot cùng lúc nên một làn đông xe không chiếm hết ring.
+    """
+
+    def __init__(self, plate_index=None, on_done: Optional[Callable[[PipelineJob], None]] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, slots: int = INFERENCE_SLOTS,
+                 slot_size: int = INFERENCE_SLOT_SIZE, detect_batch_size: int = 4):
+        self.plate_index = plate_index
+        self.on_done = on_done
+        self.queue_size = queue_size
+        self.detect_batch_size = detect_batch_size
+        self.timings: Dict[str, float] = {}
+
+        self._ring = FrameRing(slots, slot_size)
+        self._free_slots: "queue.Queue[int]" = queue.Queue()
+        for slot in range(slots):
+            self._free_slots.put(slot)
+        # Dùng spawn: fork sau khi Qt/torch đã tạo thread dễ bị treo
+        self._context = multiprocessing.get_context('spawn')
+        self._requests = self._context.Queue()
+        self._results = self._context.Queue()
+        self._process: Optional[multiprocessing.Process] = None
+        self._listener: Optional[threading.Thread] = None
+
+        self._lock = threading.Lock()
+        # job_id → (job, slot đang giữ hoặc None khi tiến trình con đã trả slot)
+        self._pending: Dict[int, Tuple[PipelineJob, Optional[int]]] = {}
+        self._in_flight: Dict[str, int] = {}
+        self._closing: set = set()
+        self._synced_plates = set()
+        self._stopped = False
+
+    def start(self):
+        """Khởi động tiến trình con và chờ model load + warmup xong."""
+        plates = self._plates_to_sync()
+        self._process = self._context.Process(
+            target=_worker_main, name='plate-inference', daemon=True,
+            args=(self._ring.name, self._ring.slots, self._ring.slot_size, self._requests, self._results,
+                  plates, self.detect_batch_size))
+        self._process.start()
+        atexit.register(self.stop)
+
+        try:
+            message = self._results.get(timeout=INFERENCE_START_TIMEOUT)
+        except queue.Empty:
+            self.stop()
+            raise RuntimeError("Tiến trình inference không khởi động kịp")
+        if message[0] == 'failed':
+            self.stop()
+            raise RuntimeError(f"Tiến trình inference lỗi khi load model: {message[1]}")
+        self.timings = message[1]
+
+        self._listener = threading.Thread(target=self._listen, name='plate-inference-results', daemon=True)
+        self._listener.start()
+        logger.info(f"Inference process started (pid {self._process.pid}, {self._ring.slots} slot x "
+                    f"{self._ring.slot_size // (1024 * 1024)}MB)")
+
+    def stop(self):
+        if self._stopped:
+            return
+        self._stopped = True
+        if self._process is not None and self._process.is_alive():
+            self._requests.put(None)
+            self._process.join(timeout=5)
+            if self._process.is_alive():
+                self._process.terminate()
+        self._ring.close()
+
+    def add_lane(self, lane: str):
+        with self._lock:
+            self._closing.discard(lane)
+            self._in_flight.setdefault(lane, 0)
+
+    def remove_lane(self, lane: str):
+        # Làn còn job đang xử lý thì được xoá khi job cuối cùng xong
+        with self._lock:
+            if not self._in_flight.get(lane):
+                self._in_flight.pop(lane, None)
+            else:
+                self._closing.add(lane)
+
+    def submit(self, data, camera_id: Optional[str] = None, fallback_detection: Optional[dict] = None,
+               context: Any = None, lane: str = DEFAULT_LANE,
+               on_done: Optional[Callable[[PipelineJob], None]] = None, cache_scope: Optional[str] = None) -> bool:
+        """Chép ảnh vào 1 slot trống và gửi job; False nếu làn đã đủ job hoặc ring đã đầy."""
+        job = PipelineJob(None, camera_id, fallback_detection, context, lane, on_done, cache_scope)
+        with self._lock:
+            if self._stopped or self._in_flight.get(lane, 0) >= self.queue_size:
+                logger.warning(f"Làn '{lane}' đầy, bỏ job {job.id} (queue: {self.queue_depths()})")
+                return False
+            try:
+                slot = self._free_slots.get_nowait()
+            except queue.Empty:
+                logger.warning(f"Hết slot shared memory, bỏ job {job.id}")
+                return False
+            self._in_flight[lane] = self._in_flight.get(lane, 0) + 1
+            self._pending[job.id] = (job, slot)
+
+        try:
+            meta = self._ring.write(slot, data)
+        except Exception as e:
+            self._release(job.id, free_slot=True)
+            logger.warning(f"Không chép được ảnh vào shared memory: {e}")
+            return False
+
+        plates = self._plates_to_sync()
+        if plates:
+            self._requests.put(('plates', plates))
+        self._requests.put(('job', job.id, slot, meta, camera_id, fallback_detection, cache_scope))
+        logger.info(f"Submit job {job.id} (làn '{lane}', slot {slot}), queue: {self.queue_depths()}")
+        return True
+
+    def queue_depths(self) -> Dict[str, int]:
+        depths = {f"lane:{lane}": count for lane, count in self._in_flight.items()}
+        depths['free_slots'] = self._free_slots.qsize()
+        return depths
+
+    def _plates_to_sync(self) -> list:
+        # Biển số mới trong index của tiến trình cha được gửi sang tiến trình con
+        if self.plate_index is None:
+            return []
+        new_plates = self.plate_index.snapshot() - self._synced_plates
+        self._synced_plates |= new_plates
+        return list(new_plates)
+
+    def _release(self, job_id: int, free_slot: bool = False) -> Optional[PipelineJob]:
+        """Bỏ job khỏi danh sách đang chờ; free_slot trả luôn slot nếu tiến trình con chưa trả."""
+        with self._lock:
+            job, slot = self._pending.pop(job_id, (None, None))
+            if job is not None:
+                self._in_flight[job.lane] = max(0, self._in_flight.get(job.lane, 0) - 1)
+                if job.lane in self._closing and not self._in_flight[job.lane]:
+                    self._closing.discard(job.lane)
+                    del self._in_flight[job.lane]
+        if free_slot and slot is not None:
+            self._free_slots.put(slot)
+        return job
+
+    def _listen(self):
+        while not self._stopped:
+            try:
+                message = self._results.get(timeout=1.0)
+            except queue.Empty:
+                if self._process is not None and not self._process.is_alive():
+                    self._fail_pending("Tiến trình inference đã dừng")
+                    return
+                continue
+
+            if message[0] == 'free':
+                _, job_id, slot = message
+                with self._lock:
+                    # Slot đã về free list: job (nếu còn chờ kết quả) không còn giữ slot
+                    if job_id in self._pending:
+                        self._pending[job_id] = (self._pending[job_id][0], None)
+                self._free_slots.put(slot)
+                continue
+            _, job_id, result, error, timings, frame_index = message
+            job = self._release(job_id)
+            if job is None:
+                continue
+            job.result, job.error, job.timings, job.frame_index = result, error, timings, frame_index
+            # Phần còn lại của thời gian từ lúc submit: chép ảnh, chờ trong queue giữa 2 tiến trình
+            job.timer.add('ipc', max(0, time.perf_counter_ns() - job._enqueued_at - job.timer.total_ns))
+            self._finish(job)
+
+    def _fail_pending(self, error: str):
+        logger.error(error)
+        with self._lock:
+            job_ids = list(self._pending)
+        for job_id in job_ids:
+            # Tiến trình con đã dừng nên slot của job chưa được trả sẽ không bao giờ được trả
+            job = self._release(job_id, free_slot=True)
+            if job is not None:
+                job.error = error
+                self._finish(job)
+
+    def _finish(self, job: PipelineJob):
+        finish_job(job, self.on_done)
@@ -0,0 +1,345 @@
+"""Dịch vụ nhận dạng biển số cục bộ: một máy giữ model, các bốt bảo vệ gửi ảnh qua TCP.
+
+Giao thức nhị phân (big-endian), mỗi kết nối gửi nhiều request liên tiếp, response có thể về
+không theo thứ tự (ghép theo request id):
+
+    bắt tay : HANDSHAKE (magic, độ dài token) + token (utf-8), server trả 1 byte trạng thái
+    request : REQUEST_HEADER (magic, request id, kiểu ảnh, cao, rộng, độ dài camera id, độ dài ảnh)
+              + camera id (utf-8) + ảnh (JPEG, hoặc BGR uint8 thô cao x rộng x 3)
+    response: RESPONSE_HEADER (magic, request id, trạng thái, độ dài JSON, độ dài ảnh biển số)
+              + JSON {plate, vehicle_type, ocr_text, error, timings (ns)} + ảnh biển số đã cắt (JPEG, có thể rỗng)
+
+Server đưa ảnh vào InferenceEngine, mỗi kết nối là một làn nên các bốt được phục vụ lần lượt và
+ảnh của nhiều bốt được gom vào cùng batch detect. Vượt INFERENCE_SERVICE_MAX_INFLIGHT request
+đang xử lý (hoặc hàng đợi của bốt đầy) thì trả STATUS_BUSY ngay.
+
+Dữ liệu không mã hoá, chỉ dùng trong mạng LAN nội bộ. Đặt INFERENCE_SERVICE_TOKEN (giống nhau ở service
+và các bốt) thì kết nối sai token bị từ chối ngay khi bắt tay.
+"""
+import hmac
+import itertools
+import json
+import logging
+import os
+import select
+import socket
+import socketserver
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.ai.frame_quality import FrameQualityScorer
+from app.ai.pipeline import DEFAULT_LANE, DEFAULT_QUEUE_SIZE, PipelineJob, finish_job
+from app.utils.convert_util import bytes_to_ndarray, ndarray_to_bytes
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+INFERENCE_SERVICE_HOST = os.getenv("INFERENCE_SERVICE_HOST", "127.0.0.1")
+INFERENCE_SERVICE_PORT = int(os.getenv("INFERENCE_SERVICE_PORT", "8765"))
+INFERENCE_SERVICE_MAX_INFLIGHT = int(os.getenv("INFERENCE_SERVICE_MAX_INFLIGHT", "16"))
+INFERENCE_SERVICE_CONCURRENCY = int(os.getenv("INFERENCE_SERVICE_CONCURRENCY", "2"))
+INFERENCE_SERVICE_TIMEOUT = float(os.getenv("INFERENCE_SERVICE_TIMEOUT", "30"))
+INFERENCE_SERVICE_TOKEN = os.getenv("INFERENCE_SERVICE_TOKEN", "")
+
+MAGIC = b'LPR2'
+HANDSHAKE = struct.Struct('!4sH')
+REQUEST_HEADER = struct.Struct('!4sIBHHHI')
+RESPONSE_HEADER = struct.Struct('!4sIBII')
+FRAME_JPEG, FRAME_RAW = 0, 1
+STATUS_OK, STATUS_NO_PLATE, STATUS_BUSY, STATUS_ERROR = 0, 1, 2, 3
+MAX_PAYLOAD = 32 * 1024 * 1024
+
+
+def _recv_exact(sock: socket.socket, size: int) -> bytes:
+    buffer = bytearray()
+    while len(buffer) < size:
+        chunk = sock.recv(size - len(buffer))
+        if not chunk:
+            raise ConnectionError("Kết nối bị đóng")
+        buffer.extend(chunk)
+    return bytes(buffer)
+
+
+def encode_handshake(token: str) -> bytes:
+    token_bytes = token.encode('utf-8')
+    return HANDSHAKE.pack(MAGIC, len(token_bytes)) + token_bytes
+
+
+def read_handshake(sock: socket.socket) -> bytes:
+    magic, token_len = HANDSHAKE.unpack(_recv_exact(sock, HANDSHAKE.size))
+    if magic != MAGIC:
+        raise ValueError("Bắt tay không đúng giao thức")
+    return _recv_exact(sock, token_len)
+
+
+def encode_request(request_id: int, image, camera_id: Optional[str] = None) -> bytes:
+    camera = (camera_id or '').encode('utf-8')
+    if isinstance(image, (bytes, bytearray)):
+        kind, height, width, payload = FRAME_JPEG, 0, 0, bytes(image)
+    else:
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        kind, (height, width), payload = FRAME_RAW, image.shape[:2], image.tobytes()
+    return REQUEST_HEADER.pack(MAGIC, request_id, kind, height, width, len(camera), len(payload)) + camera + payload
+
+
+def read_request(sock: socket.socket) -> Tuple[int, np.ndarray, Optional[str]]:
+    magic, request_id, kind, height, width, camera_len, payload_len = REQUEST_HEADER.unpack(
+        _recv_exact(sock, REQUEST_HEADER.size))
+    if magic != MAGIC or payload_len > MAX_PAYLOAD:
+        raise ValueError("Request không đúng giao thức")
+    camera_id = _recv_exact(sock, camera_len).decode('utf-8') or None
+    payload = _recv_exact(sock, payload_len)
+    if kind == FRAME_RAW:
+        frame = np.frombuffer(payload, dtype=np.uint8).reshape(height, width, 3)
+    else:
+        frame = bytes_to_ndarray(payload)
+    return request_id, frame, camera_id
+
+
+def encode_response(request_id: int, status: int, result: Optional[tuple] = None, error: Optional[str] = None,
+                    timings: Optional[Dict[str, int]] = None) -> bytes:
+    plate, vehicle_type, cropped_plate, ocr_text = result if result else (None, None, None, None)
+    body = json.dumps({'plate': plate, 'vehicle_type': vehicle_type, 'ocr_text': ocr_text, 'error': error,
+                       'timings': timings or {}}).encode('utf-8')
+    crop = ndarray_to_bytes(cropped_plate) if isinstance(cropped_plate, np.ndarray) else b''
+    return RESPONSE_HEADER.pack(MAGIC, request_id, status, len(body), len(crop)) + body + crop
+
+
+def read_response(sock: socket.socket) -> Tuple[int, int, Dict[str, Any], Optional[np.ndarray]]:
+    magic, request_id, status, body_len, crop_len = RESPONSE_HEADER.unpack(_recv_exact(sock, RESPONSE_HEADER.size))
+    if magic != MAGIC:
+        raise ValueError("Response không đúng giao thức")
+    body = json.loads(_recv_exact(sock, body_len).decode('utf-8'))
+    crop = bytes_to_ndarray(_recv_exact(sock, crop_len)) if crop_len else None
+    return request_id, status, body, crop
+
+
+class _ConnectionHandler(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.lane = f"{self.client_address[0]}:{self.client_address[1]}"
+        self.send_lock = threading.Lock()
+        self.server.engine.register_lane(self.lane, self._on_done)
+        logger.info(f"Client {self.lane} kết nối")
+
+    def handle(self):
+        try:
+            token = read_handshake(self.request)
+        except (ConnectionError, OSError):
+            return
+        except Exception as e:
+            logger.warning(f"Client {self.lane}: {e}")
+            return
+        expected = self.server.token.encode('utf-8')
+        accepted = hmac.compare_digest(token, expected)
+        self._send(bytes([STATUS_OK if accepted else STATUS_ERROR]))
+        if not accepted:
+            logger.warning(f"Client {self.lane} sai token, đóng kết nối")
+            return
+
+        while True:
+            try:
+                request_id, frame, camera_id = read_request(self.request)
+            except (ConnectionError, OSError):
+                return
+            except Exception as e:
+                logger.warning(f"Client {self.lane}: {e}")
+                return
+
+            if not self.server.inflight.acquire(blocking=False):
+                self._send(encode_response(request_id, STATUS_BUSY, error="Server quá tải"))
+                continue
+            if not self.server.engine.submit(self.lane, frame, camera_id, context=request_id):
+                self.server.inflight.release()
+                self._send(encode_response(request_id, STATUS_BUSY, error="Hàng đợi đầy"))
+
+    def finish(self):
+        self.server.engine.unregister_lane(self.lane)
+        logger.info(f"Client {self.lane} ngắt kết nối")
+
+    def _on_done(self, job: PipelineJob):
+        self.server.inflight.release()
+        if job.error is None and job.result and job.result[0]:
+            status = STATUS_OK
+        else:
+            status = STATUS_ERROR if job.error else STATUS_NO_PLATE
+        self._send(encode_response(job.context, status, job.result, job.error, job.timings))
+
+    def _send(self, data: bytes):
+        with self.send_lock:
+            try:
+                self.request.sendall(data)
+            except OSError:
+                pass
+
+
+class InferenceServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, engine, host: str = INFERENCE_SERVICE_HOST, port: int = INFERENCE_SERVICE_PORT,
+                 max_inflight: int = INFERENCE_SERVICE_MAX_INFLIGHT, token: str = INFERENCE_SERVICE_TOKEN):
+        self.engine = engine
+        self.token = token
+        self.inflight = threading.BoundedSemaphore(max_inflight)
+        super().__init__((host, port), _ConnectionHandler)
+
+
+class InferenceClient:
+    """Client đồng bộ: mỗi thread dùng một kết nối riêng, tự kết nối lại khi mất kết nối."""
+
+    def __init__(self, host: str = INFERENCE_SERVICE_HOST, port: int = INFERENCE_SERVICE_PORT,
+                 timeout: float = INFERENCE_SERVICE_TIMEOUT, token: str = INFERENCE_SERVICE_TOKEN):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.token = token
+        self._local = threading.local()
+        self._ids = itertools.count(1)
+
+    def connect(self) -> socket.socket:
+        """Kết nối của thread hiện tại (đã bắt tay), tạo mới nếu chưa có hoặc server đã đóng kết nối cũ."""
+        sock = getattr(self._local, 'sock', None)
+        # Kết nối rảnh mà đọc được nghĩa là server đã đóng (ví dụ khởi động lại): mở kết nối mới
+        # trước khi gửi, để không phải gửi lại ảnh khi không biết server đã nhận hay chưa
+        if sock is not None and select.select([sock], [], [], 0)[0]:
+            self.close()
+            sock = None
+        if sock is None:
+            sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+            try:
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                sock.sendall(encode_handshake(self.token))
+                status = _recv_exact(sock, 1)[0]
+            except Exception:
+                sock.close()
+                raise
+            if status != STATUS_OK:
+                sock.close()
+                raise PermissionError("Inference service từ chối kết nối: sai INFERENCE_SERVICE_TOKEN")
+            self._local.sock = sock
+        return sock
+
+    def close(self):
+        sock = getattr(self._local, 'sock', None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def request(self, image, camera_id: Optional[str] = None) -> Tuple[int, Dict[str, Any], Optional[np.ndarray]]:
+        """Gửi 1 ảnh (bytes JPEG hoặc ndarray BGR), trả về (trạng thái, JSON kết quả, ảnh biển số)."""
+        request_id = next(self._ids)
+        data = encode_request(request_id, image, camera_id)
+        sock = self.connect()
+        try:
+            # Không gửi lại khi lỗi/timeout: server có thể vẫn đang xử lý ảnh này
+            sock.sendall(data)
+            response_id, status, body, crop = read_response(sock)
+            if response_id != request_id:
+                raise ValueError(f"Response id {response_id} không khớp request {request_id}")
+        except Exception:
+            # Đóng kết nối để response đến muộn không bị đọc nhầm cho request sau
+            self.close()
+            raise
+        return status, body, crop
+
+
+class RemotePipeline:
+    """Cùng giao diện với PlatePipeline, gửi ảnh tới inference service qua InferenceClient."""
+
+    def __init__(self, client: Optional[InferenceClient] = None,
+                 on_done: Optional[Callable[[PipelineJob], None]] = None,
+                 queue_size: int = DEFAULT_QUEUE_SIZE, concurrency: int = INFERENCE_SERVICE_CONCURRENCY):
+        self.client = client or InferenceClient()
+        self.on_done = on_done
+        self.queue_size = queue_size
+        self.concurrency = concurrency
+        self.quality = FrameQualityScorer()
+        self.timings: Dict[str, float] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, int] = {}
+        self._closing: set = set()
+
+    def start(self):
+        # Kiểm tra service đã chạy trước khi báo sẵn sàng
+        start = time.perf_counter()
+        self.client.connect()
+        self.client.close()
+        self.timings = {'load_total': 0.0, 'warmup_total': 0.0, 'connect': time.perf_counter() - start}
+        self._executor = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='inference-client')
+        logger.info(f"Dùng inference service tại {self.client.host}:{self.client.port}")
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def add_lane(self, lane: str):
+        with self._lock:
+            self._closing.discard(lane)
+            self._in_flight.setdefault(lane, 0)
+
+    def remove_lane(self, lane: str):
+        # Làn còn job đang xử lý thì được xoá khi job cuối cùng xong
+        with self._lock:
+            if not self._in_flight.get(lane):
+                self._in_flight.pop(lane, None)
+            else:
+                self._closing.add(lane)
+
+    def submit(self, data, camera_id: Optional[str] = None, fallback_detection: Optional[dict] = None,
+               context: Any = None, lane: str = DEFAULT_LANE,
+               on_done: Optional[Callable[[PipelineJob], None]] = None, cache_scope: Optional[str] = None) -> bool:
+        # Giao thức không gửi UID thẻ (cache_scope) nên service không dùng cache OCR
+        job = PipelineJob(data, camera_id, fallback_detection, context, lane, on_done)
+        with self._lock:
+            if self._in_flight.get(lane, 0) >= self.queue_size:
+                logger.warning(f"Làn '{lane}' đầy, bỏ job {job.id} (queue: {self.queue_depths()})")
+                return False
+            self._in_flight[lane] = self._in_flight.get(lane, 0) + 1
+        self._executor.submit(self._run, job)
+        return True
+
+    def queue_depths(self) -> Dict[str, int]:
+        return {f"lane:{lane}": count for lane, count in self._in_flight.items()}
+
+    def _pick_frame(self, job: PipelineJob):
+        """Giao thức gửi 1 ảnh mỗi request: với loạt ảnh (burst) chỉ gửi ảnh nét nhất đạt chất lượng."""
+        if not isinstance(job.data, (list, tuple)):
+            return job.data
+        frames = [bytes_to_ndarray(data) if isinstance(data, (bytes, bytearray)) else data for data in job.data]
+        readable = [i for i, frame in enumerate(frames) if frame is not None]
+        if not readable:
+            return job.data[0]
+        best, _ = self.quality.pick_sharpest([frames[i] for i in readable])
+        # Không frame nào đạt: vẫn gửi ảnh đầu để service trả lỗi chất lượng
+        job.frame_index = readable[best] if best is not None else readable[0]
+        return job.data[job.frame_index]
+
+    def _run(self, job: PipelineJob):
+        try:
+            status, body, crop = self.client.request(self._pick_frame(job), job.camera_id)
+            job.timings = body.get('timings') or {}
+            if status == STATUS_OK:
+                job.result = (body['plate'], body['vehicle_type'], crop, body.get('ocr_text'))
+            elif status != STATUS_NO_PLATE:
+                job.error = body.get('error') or f"Inference service trả trạng thái {status}"
+        except Exception as e:
+            job.error = str(e)
+        # Phần thời gian không nằm trong các stage của server: mạng, mã hoá/giải mã giao thức, chờ thread
+        job.timer.add('network', max(0, time.perf_counter_ns() - job._enqueued_at - job.timer.total_ns))
+        job.data = None
+
+        with self._lock:
+            self._in_flight[job.lane] = max(0, self._in_flight.get(job.lane, 0) - 1)
+            if job.lane in self._closing and not self._in_flight[job.lane]:
+                self._closing.discard(job.lane)
+                del self._in_flight[job.lane]
+        finish_job(job, self.on_done)
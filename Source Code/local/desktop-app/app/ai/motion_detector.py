@@ -0,0 +1,89 @@
+import logging
+from typing import Optional
+
+import cv2
+import numpy as np
+
+from app.ai.roi import RegionOfInterest
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class MotionDetector:
+    """Phát hiện có xe trong làn bằng trừ nền trên frame đã thu nhỏ.
+
+    - Nền được cập nhật chậm (running average) khi làn trống và đóng băng khi có xe,
+      để xe dừng lại quẹt thẻ không bị "hoà" vào nền.
+    - Dùng hysteresis (on_frames/off_frames) để trạng thái không bật tắt liên tục.
+    """
+
+    def __init__(self, width: int = 160, diff_threshold: int = 25, min_area_ratio: float = 0.02,
+                 on_frames: int = 3, off_frames: int = 15, learning_rate: float = 0.05,
+                 max_present_frames: int = 3000, roi: Optional[RegionOfInterest] = None):
+        self.width = width
+        self.diff_threshold = diff_threshold
+        self.min_area_ratio = min_area_ratio
+        self.on_frames = on_frames
+        self.off_frames = off_frames
+        self.learning_rate = learning_rate
+        self.max_present_frames = max_present_frames
+        self.roi = roi
+
+        self.present = False
+        self.motion_ratio = 0.0
+        self._background: Optional[np.ndarray] = None
+        self._above = 0
+        self._below = 0
+        self._present_frames = 0
+
+    def reset(self):
+        self.present = False
+        self.motion_ratio = 0.0
+        self._background = None
+        self._above = self._below = self._present_frames = 0
+
+    def _prepare(self, frame: np.ndarray) -> np.ndarray:
+        if self.roi is not None:
+            frame, _ = self.roi.crop(frame)
+        h, w = frame.shape[:2]
+        height = max(1, int(h * self.width / w))
+        small = cv2.resize(frame, (self.width, height), interpolation=cv2.INTER_AREA)
+        gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if small.ndim == 3 else small
+        return cv2.GaussianBlur(gray, (5, 5), 0)
+
+    def update(self, frame: np.ndarray) -> bool:
+        """Đưa 1 frame vào, trả về trạng thái có xe hiện tại."""
+        gray = self._prepare(frame)
+        if self._background is None or self._background.shape != gray.shape:
+            self._background = gray.astype(np.float32)
+            return self.present
+
+        diff = cv2.absdiff(gray, cv2.convertScaleAbs(self._background))
+        self.motion_ratio = float(np.count_nonzero(diff > self.diff_threshold)) / diff.size
+
+        if self.motion_ratio >= self.min_area_ratio:
+            self._above += 1
+            self._below = 0
+        else:
+            self._below += 1
+            self._above = 0
+
+        if not self.present and self._above >= self.on_frames:
+            self.present = True
+            self._present_frames = 0
+        elif self.present and self._below >= self.off_frames:
+            self.present = False
+
+        if self.present:
+            self._present_frames += 1
+            # Có xe quá lâu thường là do ánh sáng thay đổi: học lại nền
+            if self._present_frames >= self.max_present_frames:
+                logger.info("Trạng thái có xe kéo dài bất thường, học lại nền")
+                self._background = gray.astype(np.float32)
+                self.present = False
+                self._above = self._below = 0
+        else:
+            cv2.accumulateWeighted(gray, self._background, self.learning_rate)
+
+        return self.present
@@ -0,0 +1,107 @@
+"""Cache kết quả OCR theo perceptual hash của ảnh biển số (LRU + TTL).
+
+Cùng một xe thường được quẹt thẻ lại sau vài giây: ảnh biển số gần như giống hệt nên
+dùng lại kết quả đọc trước đó thay vì chạy OCR lại. Hai ảnh được coi là giống nhau khi
+khoảng cách Hamming giữa 2 dHash 64 bit không vượt quá max_distance.
+
+Hash không phân biệt được 2 biển chỉ khác nhau 1 ký tự (nhiễu ảnh lật nhiều bit hơn cả
+một ký tự khác), nên caller phải đưa phạm vi vào tag (UID thẻ, xem PlateReader): kết quả
+chỉ được dùng lại cho đúng lần quẹt lại của cùng thẻ.
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEFAULT_CACHE_SIZE = int(os.getenv("OCR_CACHE_SIZE", "64"))
+DEFAULT_CACHE_TTL = float(os.getenv("OCR_CACHE_TTL", "30"))
+DEFAULT_MAX_DISTANCE = int(os.getenv("OCR_CACHE_MAX_DISTANCE", "6"))
+
+
+def dhash(image: np.ndarray, hash_size: int = 8, margin: int = 2) -> int:
+    """Difference hash: so sánh độ sáng các pixel liền kề trên ảnh xám thu nhỏ.
+
+    Chỉ đặt bit khi chênh lệch lớn hơn margin để vùng nền đồng màu không bị nhiễu làm lật bit.
+    """
+    gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+    small = cv2.resize(gray, (hash_size + 1, hash_size), interpolation=cv2.INTER_AREA).astype(np.int16)
+    bits = (small[:, 1:] - small[:, :-1] > margin).ravel()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+class OcrCache:
+    """LRU cache có TTL, tra cứu theo dHash với sai số Hamming cho phép."""
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE, ttl: float = DEFAULT_CACHE_TTL,
+                 max_distance: int = DEFAULT_MAX_DISTANCE):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        # (hash, tag) -> (thời điểm lưu, kết quả)
+        self._entries: "OrderedDict[Tuple[int, Hashable], Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_size > 0 and self.ttl > 0
+
+    def get(self, image: np.ndarray, tag: Hashable = None) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        key_hash = dhash(image)
+        now = time.monotonic()
+        with self._lock:
+            self._evict_expired(now)
+            best_key, best_distance = None, self.max_distance + 1
+            for entry_hash, entry_tag in self._entries:
+                if entry_tag != tag:
+                    continue
+                distance = (entry_hash ^ key_hash).bit_count()
+                if distance < best_distance:
+                    best_key, best_distance = (entry_hash, entry_tag), distance
+
+            if best_key is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            return dict(self._entries[best_key][1])
+
+    def put(self, image: np.ndarray, result: Dict[str, Any], tag: Hashable = None):
+        if not self.enabled:
+            return
+        key = (dhash(image), tag)
+        with self._lock:
+            self._entries[key] = (time.monotonic(), dict(result))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self, now: float):
+        # OrderedDict sắp theo lần dùng gần nhất chứ không theo thời điểm lưu nên phải duyệt hết
+        expired = [key for key, (stored_at, _) in self._entries.items() if now - stored_at > self.ttl]
+        for key in expired:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,48 @@
+"""Gộp kết quả OCR của nhiều ảnh biển số khác nhau (burst / luồng camera) thành 1 kết quả."""
+from collections import defaultdict
+from typing import List, Optional, Sequence, Tuple
+
+# (text, confidence, confidence từng ký tự hoặc None)
+Reading = Tuple[str, float, Optional[Sequence[float]]]
+
+SEPARATORS = str.maketrans('', '', ' .,-')
+
+
+def normalize_plate_text(text: str) -> str:
+    return text.strip().upper().translate(SEPARATORS)
+
+
+def fuse_readings(readings: List[Reading]) -> Tuple[str, float]:
+    """Voting theo từng vị trí ký tự, có trọng số confidence.
+
+    - Chuẩn hoá text (bỏ khoảng trắng, dấu chấm, gạch ngang) rồi nhóm theo độ dài,
+      chọn nhóm độ dài có tổng confidence lớn nhất.
+    - Ở mỗi vị trí, ký tự có tổng trọng số lớn nhất thắng; trọng số là confidence
+      của ký tự nếu recognizer trả về, nếu không thì dùng confidence của cả chuỗi.
+    - Confidence kết quả là trung bình (trọng số ký tự thắng / số lần đọc) trên các vị trí.
+    """
+    groups = defaultdict(list)
+    for text, conf, char_confs in readings:
+        normalized = normalize_plate_text(text)
+        if not normalized or conf <= 0:
+            continue
+        if char_confs is None or len(char_confs) != len(normalized):
+            char_confs = [conf] * len(normalized)
+        groups[len(normalized)].append((normalized, list(char_confs)))
+
+    if not groups:
+        return "N/A", 0.0
+
+    length, group = max(groups.items(), key=lambda item: sum(sum(c) / len(c) for _, c in item[1]))
+
+    fused_chars = []
+    support = []
+    for pos in range(length):
+        weights = defaultdict(float)
+        for text, char_confs in group:
+            weights[text[pos]] += char_confs[pos]
+        char, weight = max(weights.items(), key=lambda item: item[1])
+        fused_chars.append(char)
+        support.append(weight / len(group))
+
+    return ''.join(fused_chars), sum(support) / len(support)
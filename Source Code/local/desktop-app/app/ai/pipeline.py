@@ -0,0 +1,271 @@
+"""Pipeline xử lý biển số theo từng stage, mỗi stage có hàng đợi giới hạn và số worker riêng.
+
+    lane (hàng đợi riêng mỗi làn) → decode → detect (batch) → crop/enhance → OCR + validate
+
+Xe đến liên tiếp được xử lý chồng lấn (xe sau detect trong lúc xe trước đang OCR) thay vì
+chờ nhau hoặc huỷ xử lý của xe trước. Stage decode lấy job từ các làn theo vòng (round-robin)
+nên một làn đông xe không chiếm hết pipeline; stage detect gom frame của nhiều làn vào 1 batch.
+Hàng đợi đầy thì stage trước bị chặn (backpressure); hàng đợi của làn đầy thì submit trả về False.
+"""
+import itertools
+import logging
+import os
+import queue
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+from app.ai.stage_metrics import StageTimer, format_timings, stage_metrics
+from app.utils.convert_util import bytes_to_ndarray
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGES = ('decode', 'detect', 'crop', 'ocr')
+DEFAULT_WORKERS = {'decode': 1, 'detect': 1, 'crop': 1, 'ocr': int(os.getenv("PIPELINE_OCR_WORKERS", "2"))}
+DEFAULT_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "4"))
+DEFAULT_LANE = 'default'
+
+_STOP = object()
+
+
+class PipelineJob:
+    """Một ảnh (hoặc 1 loạt ảnh chụp liên tiếp) cần xử lý; context là dữ liệu của caller
+    (ví dụ UID thẻ), được trả lại nguyên vẹn.
+
+    cache_scope (UID thẻ) cho phép OCR dùng lại kết quả của lần quẹt trước với cùng thẻ.
+    frame_index là vị trí trong loạt của ảnh được chọn để cắt biển số.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, data, camera_id: Optional[str] = None, fallback_detection: Optional[dict] = None,
+                 context: Any = None, lane: str = DEFAULT_LANE,
+                 on_done: Optional[Callable[["PipelineJob"], None]] = None, cache_scope: Optional[str] = None):
+        self.id = next(self._ids)
+        self.lane = lane
+        self.on_done = on_done
+        self.data = data
+        self.camera_id = camera_id
+        self.fallback_detection = fallback_detection
+        self.context = context
+        self.cache_scope = cache_scope
+
+        self.frames: List[Optional[np.ndarray]] = []
+        self.frame_index = 0
+        self.detection = None
+        self.detect_result: Optional[dict] = None
+        self.result = None
+        self.error: Optional[str] = None
+        # Thời gian (ns) chờ trong hàng đợi ('queue') và xử lý của từng stage
+        self.timer = StageTimer()
+        self._enqueued_at = time.perf_counter_ns()
+
+    @property
+    def timings(self) -> Dict[str, int]:
+        return self.timer.timings
+
+    @timings.setter
+    def timings(self, timings: Dict[str, int]):
+        self.timer = StageTimer(dict(timings))
+
+
+class PlatePipeline:
+    def __init__(self, proccessor, on_done: Optional[Callable[[PipelineJob], None]] = None,
+                 workers: Optional[Dict[str, int]] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 detect_batch_size: int = 4):
+        self.proccessor = proccessor
+        self.on_done = on_done
+        self.workers = {**DEFAULT_WORKERS, **(workers or {})}
+        self.detect_batch_size = detect_batch_size
+        self.queue_size = queue_size
+        self.queues: Dict[str, queue.Queue] = {stage: queue.Queue(maxsize=queue_size) for stage in STAGES[1:]}
+        # Hàng đợi đầu vào của từng làn, stage decode lấy job theo vòng
+        self._lanes: "OrderedDict[str, queue.Queue]" = OrderedDict()
+        self._lanes_lock = threading.Lock()
+        # Làn đã bị gỡ nhưng còn job đang chờ: xoá khi stage decode lấy hết job của làn
+        self._closing: set = set()
+        self._pending = threading.Semaphore(0)
+        self._stopping = False
+        self._handlers = {
+            'decode': self._decode,
+            'detect': self._detect,
+            'crop': self._crop,
+            'ocr': self._ocr,
+        }
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        for stage in STAGES:
+            for i in range(self.workers[stage]):
+                thread = threading.Thread(target=self._run_stage, args=(stage,),
+                                          name=f"pipeline-{stage}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+        logger.info(f"Pipeline started: {', '.join(f'{s}x{self.workers[s]}' for s in STAGES)}")
+
+    def stop(self):
+        # Mỗi worker nhận 1 tín hiệu dừng; job đang nằm giữa pipeline sẽ bị bỏ
+        self._stopping = True
+        for _ in range(self.workers['decode']):
+            self._pending.release()
+        for stage in STAGES[1:]:
+            for _ in range(self.workers[stage]):
+                self.queues[stage].put(_STOP)
+
+    def add_lane(self, lane: str) -> queue.Queue:
+        with self._lanes_lock:
+            self._closing.discard(lane)
+            if lane not in self._lanes:
+                self._lanes[lane] = queue.Queue(maxsize=self.queue_size)
+            return self._lanes[lane]
+
+    def remove_lane(self, lane: str):
+        # Làn còn job đang chờ thì vẫn xử lý hết, làn được xoá khi đã rỗng
+        with self._lanes_lock:
+            lane_queue = self._lanes.get(lane)
+            if lane_queue is None:
+                return
+            if lane_queue.empty():
+                del self._lanes[lane]
+            else:
+                self._closing.add(lane)
+
+    def submit(self, data, camera_id: Optional[str] = None, fallback_detection: Optional[dict] = None,
+               context: Any = None, lane: str = DEFAULT_LANE,
+               on_done: Optional[Callable[[PipelineJob], None]] = None, cache_scope: Optional[str] = None) -> bool:
+        """Đưa ảnh (bytes JPEG hoặc ndarray, hoặc list các ảnh của 1 burst) vào hàng đợi của làn;
+        False nếu hàng đợi đó đã đầy."""
+        job = PipelineJob(data, camera_id, fallback_detection, context, lane, on_done, cache_scope)
+        try:
+            self.add_lane(lane).put_nowait(job)
+        except queue.Full:
+            logger.warning(f"Làn '{lane}' đầy, bỏ job {job.id} (queue: {self.queue_depths()})")
+            return False
+        self._pending.release()
+        logger.info(f"Submit job {job.id} (làn '{lane}'), queue: {self.queue_depths()}")
+        return True
+
+    def queue_depths(self) -> Dict[str, int]:
+        with self._lanes_lock:
+            depths = {f"lane:{lane}": lane_queue.qsize() for lane, lane_queue in self._lanes.items()}
+        depths.update({stage: self.queues[stage].qsize() for stage in STAGES[1:]})
+        return depths
+
+    def _next_lane_job(self) -> Optional[PipelineJob]:
+        """Chờ tới khi có job, lấy job từ làn kế tiếp theo vòng (round-robin)."""
+        self._pending.acquire()
+        if self._stopping:
+            return None
+        with self._lanes_lock:
+            for lane in list(self._lanes):
+                lane_queue = self._lanes[lane]
+                # Làn vừa được phục vụ chuyển xuống cuối vòng
+                self._lanes.move_to_end(lane)
+                try:
+                    job = lane_queue.get_nowait()
+                except queue.Empty:
+                    job = None
+                if lane in self._closing and lane_queue.empty():
+                    self._closing.discard(lane)
+                    del self._lanes[lane]
+                if job is not None:
+                    return job
+        return None
+
+    def _run_stage(self, stage: str):
+        in_queue = self.queues.get(stage)
+        next_stage = STAGES[STAGES.index(stage) + 1] if stage != STAGES[-1] else None
+        handler = self._handlers[stage]
+
+        while True:
+            job = self._next_lane_job() if stage == STAGES[0] else in_queue.get()
+            if job is None and self._stopping:
+                break
+            if job is _STOP:
+                break
+            if job is None:
+                continue
+            jobs = [job]
+            # Detect: gom các job đang chờ thành 1 batch YOLO
+            if stage == 'detect':
+                while len(jobs) < self.detect_batch_size:
+                    try:
+                        pending = in_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if pending is _STOP:
+                        in_queue.put(_STOP)
+                        break
+                    jobs.append(pending)
+
+            start = time.perf_counter_ns()
+            for job in jobs:
+                job.timer.add('queue', start - job._enqueued_at)
+            try:
+                handler(jobs)
+            except Exception as e:
+                logger.exception(f"Pipeline stage {stage} error: {e}")
+                for job in jobs:
+                    job.error = job.error or str(e)
+            end = time.perf_counter_ns()
+
+            for job in jobs:
+                if job.error is not None or next_stage is None:
+                    self._finish(job)
+                else:
+                    job._enqueued_at = end
+                    self.queues[next_stage].put(job)
+
+    def _finish(self, job: PipelineJob):
+        finish_job(job, self.on_done)
+
+    def _decode(self, jobs: List[PipelineJob]):
+        for job in jobs:
+            burst = job.data if isinstance(job.data, (list, tuple)) else [job.data]
+            with job.timer.stage('decode'):
+                job.frames = [bytes_to_ndarray(data) if isinstance(data, (bytes, bytearray)) else data
+                              for data in burst]
+            job.data = None
+
+    def _detect(self, jobs: List[PipelineJob]):
+        detections = self.proccessor.detect_frames([job.frames for job in jobs], [job.camera_id for job in jobs],
+                                                   [job.timer for job in jobs])
+        for job, detection in zip(jobs, detections):
+            job.detection = detection
+
+    def _crop(self, jobs: List[PipelineJob]):
+        for job in jobs:
+            try:
+                job.detect_result = self.proccessor.crop_detection(job.frames, job.detection, job.fallback_detection,
+                                                                   job.timer)
+                job.frame_index = job.detect_result.get('frame_index', 0)
+            except Exception as e:
+                job.error = str(e)
+
+    def _ocr(self, jobs: List[PipelineJob]):
+        for job in jobs:
+            try:
+                job.result = self.proccessor.read_and_validate(job.detect_result, job.timer, job.cache_scope)
+            except Exception as e:
+                job.error = str(e)
+
+
+def finish_job(job: PipelineJob, default_on_done: Optional[Callable[[PipelineJob], None]] = None):
+    """Ghi log + thống kê thời gian từng stage của job rồi gọi callback của job."""
+    stage_metrics.record(job.timings)
+    logger.info(f"Job {job.id} xong sau {job.timer.total_ns / 1e6:.0f}ms ({format_timings(job.timings)})"
+                + (f", lỗi: {job.error}" if job.error else ""))
+    try:
+        callback = job.on_done or default_on_done
+        if callback is not None:
+            callback(job)
+    except Exception as e:
+        logger.exception(f"Pipeline callback error: {e}")
+
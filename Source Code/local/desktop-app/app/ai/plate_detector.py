@@ -1,11 +1,12 @@
-import cv2
 import numpy as np
-from ultralytics import YOLO
 from typing import Dict, Any, Optional, List, Tuple
-from collections import Counter
-from concurrent.futures import ThreadPoolExecutor, as_completed
 import logging
 import os
+import threading
+
+from app.ai.box_ops import cluster_boxes, nms
+from app.ai.plate_enhancer import DEFAULT_PROFILE, PlateEnhancer
+from app.ai.roi import DEFAULT_CAMERA_CONFIG, DEFAULT_IMGSZ, CameraConfig, load_camera_configs, to_full_frame
 
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO)
@@ -13,24 +14,51 @@ logger = logging.getLogger(__name__)
 
 
 class PlateDetector:
-    def __init__(self, model_path: str = r'app/ai/model.pt', conf_threshold: float = 0.3, num_threads: int = 3):
+    def __init__(self, model_path: str = r'app/ai/model.pt', conf_threshold: float = 0.3, batch_size: int = 8,
+                 backend: Optional[str] = None, imgsz: int = DEFAULT_IMGSZ,
+                 camera_config_path: str = DEFAULT_CAMERA_CONFIG, enhance_profile: str = DEFAULT_PROFILE,
+                 nms_threshold: float = 0.5):
         self._model_path = model_path
         self._conf_threshold = conf_threshold
-        self.num_threads = num_threads
+        self.nms_threshold = nms_threshold
+        self.batch_size = max(1, batch_size)
+        self.imgsz = imgsz
+        self.enhancer = PlateEnhancer(enhance_profile)
+        # Model được dùng chung giữa luồng chụp ảnh và luồng camera, predictor của YOLO không thread-safe
+        self._model_lock = threading.Lock()
+
+        # ROI + imgsz riêng cho từng camera, camera không có cấu hình thì dùng cả frame
+        self._cameras = load_camera_configs(camera_config_path)
+        self._default_camera = self._cameras.get('default', CameraConfig(imgsz=imgsz))
         
         # Kiểm tra file model
         if not os.path.exists(model_path):
             raise FileNotFoundError(f"Không tìm thấy model file: {model_path}")
         
-        # Khởi tạo YOLO model
+        # Khởi tạo YOLO model theo backend cấu hình (torch / onnx / openvino)
         try:
-            self._model = YOLO(model_path)
+            # Import tại đây để chỉ kéo theo ultralytics khi thật sự load model
+            from app.ai.inference_backend import load_model
+
+            self._model = load_model(backend, model_path, imgsz=imgsz)
             logger.info(f"YOLO model đã được load từ: {model_path}")
         except Exception as e:
             logger.error(f"Lỗi load YOLO model: {e}")
             raise
         
-    def detect_plate_with_frame(self, frame) -> Dict[str, Any]:
+    def warmup(self):
+        """Chạy thử model với ảnh rỗng ở mọi imgsz sẽ dùng, để lần detect thật đầu tiên không phải khởi tạo."""
+        sizes = sorted({config.imgsz for config in self._cameras.values()} | {self._default_camera.imgsz})
+        for imgsz in sizes:
+            with self._model_lock:
+                self._model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), conf=self._conf_threshold,
+                            imgsz=imgsz, verbose=False)
+        logger.info(f"Warmup detector xong, imgsz={sizes}")
+
+    def camera_config(self, camera_id: Optional[str] = None) -> CameraConfig:
+        return self._cameras.get(camera_id, self._default_camera) if camera_id else self._default_camera
+
+    def detect_plate_with_frame(self, frame, camera_id: Optional[str] = None) -> Dict[str, Any]:
         try:
             if frame is None:
                 return {
@@ -41,8 +69,8 @@ class PlateDetector:
                     'error': f"Không thể đọc ảnh"
                 }
             
-            # Detect và cắt biển số với đa luồng + voting
-            result = self._detect_with_voting(frame)
+            # Model YOLO là tất định nên chỉ cần chạy 1 lần cho 1 frame
+            result = self.detect_plates_batch([frame], [camera_id])[0]
             result['success'] = result['cropped_plate'] is not None
             
             return result
@@ -56,144 +84,172 @@ class PlateDetector:
                 'bbox': None,
                 'error': str(e)
             }
-    
-    def _detect_with_voting(self, image_array: np.ndarray) -> Dict[str, Any]:
-        def single_detection(img_copy: np.ndarray, thread_id: int) -> Dict[str, Any]:
-            """Single detection operation cho parallel execution."""
-            try:
-                result = self._detect_and_crop_best_plate(img_copy)
-                
-                # Create a hashable key for voting (using bbox as identifier)
-                bbox_key = None
-                if result['bbox'] is not None:
-                    bbox_key = tuple(result['bbox'])
-                
-                logger.info(f"Thread {thread_id}: bbox={bbox_key}, conf={result['confidence']:.2f}")
-                
-                return {
-                    'result': result,
-                    'bbox_key': bbox_key,
-                    'thread_id': thread_id
-                }
-            except Exception as e:
-                logger.error(f"Thread {thread_id} error: {e}")
+
+    def detect_plate_with_frames(self, frames: List[np.ndarray], camera_id: Optional[str] = None) -> Dict[str, Any]:
+        """Detect trên một loạt frame khác nhau (burst) rồi voting để chọn biển số tốt nhất."""
+        try:
+            valid_frames = [f for f in frames if f is not None]
+            if not valid_frames:
                 return {
-                    'result': {'cropped_plate': None, 'confidence': 0.0, 'bbox': None, 'error': str(e)},
-                    'bbox_key': None,
-                    'thread_id': thread_id
+                    'success': False,
+                    'cropped_plate': None,
+                    'confidence': 0.0,
+                    'bbox': None,
+                    'error': f"Không thể đọc ảnh"
                 }
-        
-        # Run detection in parallel
-        detection_results: List[Dict[str, Any]] = []
-        
-        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            futures = {
-                executor.submit(single_detection, image_array.copy(), i): i 
-                for i in range(self.num_threads)
-            }
-            
-            for future in as_completed(futures):
-                try:
-                    result = future.result()
-                    detection_results.append(result)
-                except Exception as e:
-                    logger.error(f"Thread execution error: {e}")
-        
-        # Filter valid detections
-        valid_detections = [
-            d for d in detection_results 
-            if d['result']['cropped_plate'] is not None and d['bbox_key'] is not None
-        ]
-        
-        if not valid_detections:
+
+            result = self.detect_plates_batch(valid_frames, [camera_id] * len(valid_frames),
+                                              [0] * len(valid_frames))[0]
+            result['success'] = result['cropped_plate'] is not None
+
+            return result
+
+        except Exception as e:
+            logger.error(f"Lỗi detect biển số: {e}")
             return {
+                'success': False,
                 'cropped_plate': None,
                 'confidence': 0.0,
                 'bbox': None,
-                'error': 'Không tìm thấy biển số nào sau khi thử đa luồng'
+                'error': str(e)
             }
-        
-        # Voting mechanism: Find most common bbox region (with tolerance for slight variations)
-        # Group similar bboxes together
-        bbox_groups = self._group_similar_bboxes(valid_detections)
-        
-        # Select the group with highest total confidence
-        best_group = max(bbox_groups, key=lambda g: sum(d['result']['confidence'] for d in g))
-        
-        # From best group, select detection with highest individual confidence
-        best_detection = max(best_group, key=lambda d: d['result']['confidence'])
-        
-        logger.info(f"Voting result: Selected bbox from thread {best_detection['thread_id']}, "
-                   f"group_size={len(best_group)}/{len(valid_detections)}, "
-                   f"conf={best_detection['result']['confidence']:.2f}")
-        
-        return best_detection['result']
-    
-    def _group_similar_bboxes(self, detections: List[Dict[str, Any]], tolerance: float = 20.0) -> List[List[Dict[str, Any]]]:
-        if not detections:
-            return []
-        
-        groups: List[List[Dict[str, Any]]] = []
-        
-        for detection in detections:
-            bbox = detection['bbox_key']
-            if bbox is None:
+
+    def detect_plates_batch(self, frames: List[np.ndarray], camera_ids: Optional[List[Optional[str]]] = None,
+                            bursts: Optional[List[Any]] = None) -> List[Dict[str, Any]]:
+        """Chạy YOLO một lần (batched forward pass) cho cả danh sách frame.
+
+        bursts gán mỗi frame vào một loạt ảnh (ví dụ burst chụp của từng làn); bbox của mọi frame
+        cùng loạt được gom cụm theo IoU và voting, mỗi loạt trả về 1 kết quả theo thứ tự xuất hiện.
+        Mặc định mỗi frame là một loạt riêng. Ngoài biển số tốt nhất đã cắt, mỗi kết quả có
+        'boxes' (N, 4) và 'scores' (N,) của tất cả biển số tìm thấy trong loạt.
+        """
+        bursts = bursts if bursts is not None else list(range(len(frames)))
+        groups: Dict[Any, List[int]] = {}
+        for i, burst in enumerate(bursts):
+            groups.setdefault(burst, []).append(i)
+
+        detections = self.detect_boxes_batch(frames, camera_ids)
+        results = []
+        for members in groups.values():
+            burst_detections = [detections[i] for i in members]
+            errors = [error for _, _, error in burst_detections if error is not None]
+            if len(errors) == len(members):
+                results.append(self._empty_result(errors[0]))
                 continue
-            
-            # Calculate bbox center
-            center_x = (bbox[0] + bbox[2]) / 2.0
-            center_y = (bbox[1] + bbox[3]) / 2.0
-            
-            # Try to find existing group
-            added_to_group = False
-            for group in groups:
-                # Compare with first detection in group
-                ref_bbox = group[0]['bbox_key']
-                ref_center_x = (ref_bbox[0] + ref_bbox[2]) / 2.0
-                ref_center_y = (ref_bbox[1] + ref_bbox[3]) / 2.0
-                
-                # Calculate distance between centers
-                distance = np.sqrt((center_x - ref_center_x)**2 + (center_y - ref_center_y)**2)
-                
-                if distance <= tolerance:
-                    group.append(detection)
-                    added_to_group = True
-                    break
-            
-            # Create new group if not added
-            if not added_to_group:
-                groups.append([detection])
-        
-        return groups
-    
-    def _detect_and_crop_best_plate(self, image_array: np.ndarray) -> Dict[str, Any]:
+            vote = self.vote_across_frames([(boxes, scores) if error is None else None
+                                            for boxes, scores, error in burst_detections])
+            results.append(self.crop_vote([frames[i] for i in members], vote))
+
+        logger.info(f"Batch detect: {len(frames)} frame, {len(results)} loạt, "
+                   f"{sum(r['cropped_plate'] is not None for r in results)} loạt có biển số")
+
+        return results
+
+    def detect_boxes_batch(self, frames: List[np.ndarray],
+                           camera_ids: Optional[List[Optional[str]]] = None
+                           ) -> List[Tuple[np.ndarray, np.ndarray, Optional[str]]]:
+        """Chỉ detect bbox (không cắt ảnh), trả về (boxes, scores, error) cho từng frame.
+
+        Mỗi frame chỉ đưa vùng ROI của camera tương ứng vào model, bbox được quy đổi
+        về toạ độ của frame gốc; bbox biển số chồng nhau trong cùng frame được gộp bằng NMS.
+        """
+        camera_ids = camera_ids or [None] * len(frames)
+        outputs: List[Optional[Tuple[np.ndarray, np.ndarray, Optional[str]]]] = [None] * len(frames)
+
+        # Gom các frame cùng imgsz để mỗi lần gọi model là một batch
+        groups: Dict[int, List[Tuple[int, np.ndarray, Tuple[int, int]]]] = {}
+        for i, (frame, camera_id) in enumerate(zip(frames, camera_ids)):
+            config = self.camera_config(camera_id)
+            roi_frame, offset = config.prepare(frame)
+            groups.setdefault(config.imgsz, []).append((i, roi_frame, offset))
+
+        for imgsz, items in groups.items():
+            for start in range(0, len(items), self.batch_size):
+                chunk = items[start:start + self.batch_size]
+                try:
+                    with self._model_lock:
+                        predictions = self._model([roi for _, roi, _ in chunk], conf=self._conf_threshold,
+                                                  imgsz=imgsz, verbose=False)
+                except Exception as e:
+                    logger.error(f"Lỗi detect biển số: {e}")
+                    for i, _, _ in chunk:
+                        outputs[i] = (np.zeros((0, 4), dtype=np.float32), np.zeros(0, dtype=np.float32), str(e))
+                    continue
+
+                for (i, _, offset), prediction in zip(chunk, predictions):
+                    boxes, scores = self._extract_plates(prediction)
+                    # NMS của YOLO chỉ loại bbox có IoU >= 0.7: gộp tiếp các bbox của cùng 1 biển số
+                    keep = nms(boxes, scores, self.nms_threshold)
+                    outputs[i] = (to_full_frame(boxes[keep], offset), scores[keep], None)
+
+        return outputs
+
+    def _extract_plates(self, prediction) -> Tuple[np.ndarray, np.ndarray]:
+        # Lọc chỉ lấy License_Plate (vector hoá trên toàn bộ bbox của frame)
+        plate_ids = [cls_id for cls_id, name in prediction.names.items() if name == "License_Plate"]
+        boxes = prediction.boxes.xyxy.cpu().numpy().astype(np.float32).reshape(-1, 4)
+        scores = prediction.boxes.conf.cpu().numpy().astype(np.float32).reshape(-1)
+        classes = prediction.boxes.cls.cpu().numpy().astype(np.int64).reshape(-1)
+
+        keep = np.isin(classes, plate_ids)
+        logger.info(f"Tìm thấy {int(keep.sum())} biển số")
+        return boxes[keep], scores[keep]
+
+    def vote_across_frames(self, detections: List[Optional[Tuple[np.ndarray, np.ndarray]]],
+                           iou_threshold: float = 0.3) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Voting giữa các frame của 1 loạt ảnh; detections là (boxes, scores) của từng frame, None nếu bỏ qua.
+
+        Gom cụm toàn bộ bbox của mọi frame theo IoU, chọn cụm có tổng confidence cao nhất.
+        Trả về (frame_ids, boxes, scores) của mọi bbox và chỉ số các bbox trong cụm thắng
+        (confidence giảm dần, rỗng nếu không frame nào có biển số).
+        """
+        kept = [(i, d) for i, d in enumerate(detections) if d is not None]
+        frame_ids = np.concatenate([np.full(len(d[1]), i, dtype=np.int64) for i, d in kept] or [np.zeros(0, np.int64)])
+        boxes = np.concatenate([d[0] for _, d in kept] or [np.zeros((0, 4))]).astype(np.float32).reshape(-1, 4)
+        scores = np.concatenate([d[1] for _, d in kept] or [np.zeros(0)]).astype(np.float32).reshape(-1)
+        if len(boxes) == 0:
+            return frame_ids, boxes, scores, np.zeros(0, dtype=np.int64)
+
+        labels = cluster_boxes(boxes, scores, iou_threshold)
+        best_cluster = int(np.argmax(np.bincount(labels, weights=scores)))
+        members = np.flatnonzero(labels == best_cluster)
+        members = members[np.argsort(-scores[members], kind='stable')]
+        logger.info(f"Voting: chọn bbox ở frame {frame_ids[members[0]]}, "
+                    f"cụm {len(members)}/{len(boxes)} bbox, conf={scores[members[0]]:.2f}")
+        return frame_ids, boxes, scores, members
+
+    def crop_vote(self, frames: List[np.ndarray], vote: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+                  ) -> Dict[str, Any]:
+        """Cắt + enhance biển số thắng voting; các frame khác trong cụm góp thêm ảnh biển số để OCR voting."""
+        frame_ids, boxes, scores, members = vote
+        if len(members) == 0:
+            return self._empty_result('Không tìm thấy biển số nào', boxes, scores)
+
+        best = members[0]
+        result = self.crop_plate(frames[frame_ids[best]], boxes[best], float(scores[best]))
+        if result['cropped_plate'] is None:
+            return result
+        result['frame_index'] = int(frame_ids[best])
+        result['boxes'] = boxes
+        result['scores'] = scores
+
+        # Mỗi frame khác góp 1 ảnh biển số (bbox confidence cao nhất của frame đó trong cụm)
+        crops, used = [result['cropped_plate']], {int(frame_ids[best])}
+        for member in members[1:]:
+            if int(frame_ids[member]) in used:
+                continue
+            used.add(int(frame_ids[member]))
+            other = self.crop_plate(frames[frame_ids[member]], boxes[member], float(scores[member]))
+            if other['cropped_plate'] is not None:
+                crops.append(other['cropped_plate'])
+        if len(crops) > 1:
+            result['cropped_plates'] = crops
+        return result
+
+    def crop_plate(self, image_array: np.ndarray, box: np.ndarray, confidence: float) -> Dict[str, Any]:
+        """Cắt (có padding) và tăng chất lượng vùng biển số theo 1 bbox toạ độ frame gốc."""
         try:
-            # Detect biển số
-            results = self._model(image_array, conf=self._conf_threshold, verbose=False)
-            
-            # Lọc chỉ lấy License_Plate
-            plates = []
-            for box in results[0].boxes:
-                cls_id = int(box.cls[0])
-                cls_name = results[0].names[cls_id]
-                if cls_name == "License_Plate":
-                    bbox = box.xyxy[0].tolist()
-                    conf = float(box.conf[0])
-                    plates.append((bbox, conf))
-            
-            logger.info(f"Tìm thấy {len(plates)} biển số")
-            
-            if not plates:
-                return {
-                    'cropped_plate': None,
-                    'confidence': 0.0,
-                    'bbox': None,
-                    'error': 'Không tìm thấy biển số nào'
-                }
-            
-            # Chọn biển số có confidence cao nhất
-            best_bbox, best_conf = max(plates, key=lambda x: x[1])
-            x1, y1, x2, y2 = map(int, best_bbox)
+            x1, y1, x2, y2 = map(int, box)
             
             # Kiểm tra bbox hợp lệ
             h, w = image_array.shape[:2]
@@ -213,106 +269,35 @@ class PlateDetector:
             # Cắt vùng biển số với padding
             cropped_plate = image_array[y1_pad:y2_pad, x1_pad:x2_pad]
 
-            # Cải thiện chất lượng ảnh
-            enhanced_plate = self._enhance_plate(cropped_plate)
+            # Cải thiện chất lượng ảnh (ảnh xám, theo profile của enhancer)
+            enhanced_plate, enhance_timings = self.enhancer.enhance_with_timings(cropped_plate)
 
-            logger.info(f"Biển số tốt nhất: bbox=({x1},{y1},{x2},{y2}), pad=({x1_pad},{y1_pad},{x2_pad},{y2_pad}), conf={best_conf:.2f}")
+            logger.info(f"Biển số tốt nhất: bbox=({x1},{y1},{x2},{y2}), pad=({x1_pad},{y1_pad},{x2_pad},{y2_pad}), conf={confidence:.2f}")
+            logger.info(f"Enhance '{self.enhancer.profile}': "
+                        + ', '.join(f"{step}={ms:.2f}ms" for step, ms in enhance_timings.items()))
 
             return {
                 'cropped_plate': enhanced_plate,
-                'confidence': best_conf,
+                'raw_plate': cropped_plate,
+                'enhance_timings': enhance_timings,
+                'confidence': confidence,
                 'bbox': [x1_pad, y1_pad, x2_pad, y2_pad],
+                'boxes': np.asarray(box, dtype=np.float32).reshape(1, 4),
+                'scores': np.array([confidence], dtype=np.float32),
                 'error': None
             }
             
         except Exception as e:
             logger.error(f"Lỗi detect biển số: {e}")
-            return {
-                'cropped_plate': None,
-                'confidence': 0.0,
-                'bbox': None,
-                'error': str(e)
-            }
-    
-    def _enhance_plate(self, cropped_plate: np.ndarray) -> np.ndarray:
-        return self._enhance_advanced(cropped_plate)
-    
-    def _enhance_basic(self, image: np.ndarray) -> np.ndarray:
-        h, w = image.shape[:2]
-        
-        # Tăng kích thước nếu quá nhỏ
-        if w < 200 or h < 50:
-            scale_factor = max(200/w, 50/h, 2.0)
-            image = cv2.resize(image, None, fx=scale_factor, fy=scale_factor, 
-                             interpolation=cv2.INTER_CUBIC)
-        
-        # Denoise
-        if len(image.shape) == 3:
-            denoised = cv2.fastNlMeansDenoisingColored(image, None, h=3, hColor=3, 
-                                                     templateWindowSize=7, searchWindowSize=21)
-        else:
-            denoised = cv2.fastNlMeansDenoising(image, None, h=3, 
-                                              templateWindowSize=7, searchWindowSize=21)
-        
-        # Sharpen
-        if len(denoised.shape) == 3:
-            gray = cv2.cvtColor(denoised, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = denoised
-        
-        kernel = np.array([[-1, -1, -1],
-                          [-1,  9, -1],
-                          [-1, -1, -1]])
-        sharpened = cv2.filter2D(gray, -1, kernel)
-        
-        # Convert back to BGR if needed
-        if len(image.shape) == 3:
-            result = cv2.cvtColor(sharpened, cv2.COLOR_GRAY2BGR)
-        else:
-            result = sharpened
-        
-        return result
-    
-    def _enhance_advanced(self, image: np.ndarray) -> np.ndarray:
-        h, w = image.shape[:2]
-        
-        # Tăng kích thước
-        if w < 300 or h < 80:
-            scale_factor = max(300/w, 80/h, 3.0)
-            image = cv2.resize(image, None, fx=scale_factor, fy=scale_factor, 
-                             interpolation=cv2.INTER_CUBIC)
-        
-        # Chuyển sang LAB color space
-        if len(image.shape) == 3:
-            lab = cv2.cvtColor(image, cv2.COLOR_BGR2LAB)
-            l, a, b = cv2.split(lab)
-        else:
-            l = image.copy()
-        
-        # CLAHE trên L channel
-        clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-        l_enhanced = clahe.apply(l)
-        
-        # Merge back nếu cần
-        if len(image.shape) == 3:
-            enhanced_lab = cv2.merge([l_enhanced, a, b])
-            enhanced = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
-            gray = cv2.cvtColor(enhanced, cv2.COLOR_BGR2GRAY)
-        else:
-            gray = l_enhanced
-        
-        # Bilateral filter
-        bilateral = cv2.bilateralFilter(gray, 9, 75, 75)
-        
-        # Unsharp mask
-        gaussian_blur = cv2.GaussianBlur(bilateral, (0, 0), 2.0)
-        unsharp = cv2.addWeighted(bilateral, 1.5, gaussian_blur, -0.5, 0)
-        unsharp = np.clip(unsharp, 0, 255).astype(np.uint8)
-        
-        # Convert back to BGR nếu cần
-        if len(image.shape) == 3:
-            result = cv2.cvtColor(unsharp, cv2.COLOR_GRAY2BGR)
-        else:
-            result = unsharp
-        
-        return result
+            return self._empty_result(str(e))
+
+    def _empty_result(self, error: str, boxes: Optional[np.ndarray] = None,
+                      scores: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        return {
+            'cropped_plate': None,
+            'confidence': 0.0,
+            'bbox': None,
+            'boxes': boxes if boxes is not None else np.zeros((0, 4), dtype=np.float32),
+            'scores': scores if scores is not None else np.zeros(0, dtype=np.float32),
+            'error': error
+        }
@@ -0,0 +1,109 @@
+"""Danh sách biển số đã biết (các lần check-in/out thành công tại chỗ).
+
+Dùng BK-tree theo khoảng cách Levenshtein để tìm nhanh biển số đã biết gần với chuỗi OCR
+đọc được; OCR sai 1 ký tự thì "snap" về biển số đã biết thay vì bắt bảo vệ quẹt lại thẻ.
+"""
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from app.ai.ocr_fusion import normalize_plate_text
+
+
+def edit_distance(a: str, b: str) -> int:
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+class BKTree:
+    def __init__(self):
+        # Mỗi node: (chuỗi, {khoảng cách: node con})
+        self._root: Optional[Tuple[str, Dict[int, tuple]]] = None
+
+    def add(self, word: str):
+        if self._root is None:
+            self._root = (word, {})
+            return
+        node = self._root
+        while True:
+            distance = edit_distance(word, node[0])
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (word, {})
+                return
+            node = child
+
+    def search(self, word: str, max_distance: int) -> List[Tuple[int, str]]:
+        if self._root is None:
+            return []
+        matches, stack = [], [self._root]
+        while stack:
+            current, children = stack.pop()
+            distance = edit_distance(word, current)
+            if distance <= max_distance:
+                matches.append((distance, current))
+            # Bất đẳng thức tam giác: chỉ các nhánh trong [d - max, d + max] có thể khớp
+            for child_distance, child in children.items():
+                if distance - max_distance <= child_distance <= distance + max_distance:
+                    stack.append(child)
+        return sorted(matches)
+
+
+class PlateIndex:
+    """Tập biển số đã biết (đã chuẩn hoá, không có '-' / '.'), an toàn khi dùng từ nhiều thread."""
+
+    def __init__(self):
+        self._tree = BKTree()
+        self._plates = set()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._plates)
+
+    def __contains__(self, plate: str) -> bool:
+        return normalize_plate_text(plate) in self._plates
+
+    def snapshot(self) -> set:
+        with self._lock:
+            return set(self._plates)
+
+    def add(self, plate: Optional[str]) -> bool:
+        if not plate:
+            return False
+        plate = normalize_plate_text(plate)
+        with self._lock:
+            if plate in self._plates:
+                return False
+            self._plates.add(plate)
+            self._tree.add(plate)
+        return True
+
+    def add_many(self, plates: Iterable[Optional[str]]) -> int:
+        return sum(self.add(plate) for plate in plates)
+
+    def search(self, text: str, max_distance: int = 1) -> List[Tuple[int, str]]:
+        with self._lock:
+            return self._tree.search(normalize_plate_text(text), max_distance)
+
+    def snap(self, candidates: List[str], max_distance: int = 1) -> Optional[str]:
+        """Biển số đã biết khớp với các ứng viên OCR (theo thứ tự ưu tiên).
+
+        Ứng viên trùng khớp hoàn toàn được ưu tiên; sau đó là biển số duy nhất trong
+        phạm vi max_distance. Nhiều biển số cùng gần như nhau thì không snap.
+        """
+        for candidate in candidates:
+            if candidate and candidate in self:
+                return normalize_plate_text(candidate)
+        for candidate in candidates:
+            if not candidate or candidate == 'N/A':
+                continue
+            matches = {plate for _, plate in self.search(candidate, max_distance)}
+            if len(matches) == 1:
+                return matches.pop()
+        return None
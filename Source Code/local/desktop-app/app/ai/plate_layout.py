@@ -0,0 +1,128 @@
+"""Bố cục biển số (1 dòng / 2 dòng) và ghép chuỗi theo ngữ pháp biển số Việt Nam.
+
+Biển số: 2 số tỉnh + seri (1 chữ cái, theo sau là 1 chữ cái hoặc chữ số) + 4-5 số.
+Biển xe máy có 2 dòng: "29-B1" ở trên, "123.45" ở dưới.
+"""
+from typing import List, Optional, Sequence
+
+import cv2
+import numpy as np
+
+from app.ai.ocr_fusion import normalize_plate_text
+
+# Biển 1 dòng dài (~4.7:1), biển 2 dòng gần vuông (~1.4:1)
+TWO_LINE_MAX_ASPECT = 2.5
+# Hàng "trống" giữa 2 dòng có lượng mực < tỉ lệ này so với hàng có chữ (median)
+LINE_GAP_RATIO = 0.5
+
+# Sửa nhầm lẫn thường gặp theo vị trí: vị trí chữ số / vị trí chữ cái đầu của seri
+DIGIT_FIXES = str.maketrans('ODQILZSBGT', '0001125867')
+LETTER_FIXES = str.maketrans('082564', 'DBZSGA')
+
+
+def binarize(gray: np.ndarray) -> np.ndarray:
+    """Ảnh nhị phân với ký tự màu trắng (255) trên nền đen."""
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    # Ký tự chiếm ít pixel hơn nền biển số; chỉ xét phần giữa ảnh vì ảnh cắt từ detector có
+    # padding (xe, bóng tối quanh biển) có thể chiếm gần nửa ảnh và làm đảo ngược kết luận
+    h, w = binary.shape[:2]
+    interior = binary[h // 4:h - h // 4, w // 4:w - w // 4]
+    if cv2.countNonZero(interior) > interior.size // 2:
+        binary = cv2.bitwise_not(binary)
+    return binary
+
+
+def _find_line_gap(binary: np.ndarray) -> Optional[int]:
+    """Hàng ít mực nhất ở giữa ảnh (30%-70% chiều cao) nếu đó là khoảng trống giữa 2 dòng."""
+    h = binary.shape[0]
+    profile = binary.sum(axis=1, dtype=np.float64) / 255.0
+    window = max(1, h // 30)
+    profile = np.convolve(profile, np.ones(window) / window, mode='same')
+
+    lo, hi = int(h * 0.3), int(h * 0.7)
+    if hi <= lo:
+        return None
+    gap = lo + int(np.argmin(profile[lo:hi]))
+    text_rows = profile[profile > 0]
+    if len(text_rows) == 0 or profile[gap] >= LINE_GAP_RATIO * np.median(text_rows):
+        return None
+    return gap
+
+
+def split_lines(gray: np.ndarray, binary: Optional[np.ndarray] = None) -> List[List[int]]:
+    """Box [x_min, x_max, y_min, y_max] cho từng dòng ký tự, từ trên xuống dưới.
+
+    Biển dài luôn là 1 dòng; biển gần vuông được cắt tại hàng trống giữa 2 dòng
+    (projection profile theo chiều ngang).
+    """
+    h, w = gray.shape[:2]
+    if w / h > TWO_LINE_MAX_ASPECT:
+        return [[0, w, 0, h]]
+
+    gap = _find_line_gap(binarize(gray) if binary is None else binary)
+    if gap is None:
+        return [[0, w, 0, h]]
+    # Chừa một ít chồng lấn để không cắt mất nét chữ
+    overlap = max(1, int(h * 0.02))
+    return [[0, w, 0, min(h, gap + overlap)], [0, w, max(0, gap - overlap), h]]
+
+
+def join_lines(gray: np.ndarray, lines: List[List[int]]) -> np.ndarray:
+    """Ghép các dòng [x_min, x_max, y_min, y_max] cạnh nhau (dòng trên bên trái) thành 1 ảnh 1 dòng.
+
+    Recognizer của EasyOCR trên CPU đọc từng box một dù batch_size lớn, nên biển 2 dòng
+    được đưa vào như 1 box để chỉ chạy recognizer 1 lần.
+    """
+    crops = [gray[y_min:y_max, x_min:x_max] for x_min, x_max, y_min, y_max in lines]
+    height = max(crop.shape[0] for crop in crops)
+    # Khoảng cách giữa 2 dòng tô bằng màu nền biển số để recognizer đọc như khoảng trắng
+    gap = np.full((height, max(1, height // 2)), int(np.median(gray)), dtype=gray.dtype)
+    parts = []
+    for crop in crops:
+        if crop.shape[0] != height:
+            crop = cv2.resize(crop, (max(1, round(crop.shape[1] * height / crop.shape[0])), height),
+                              interpolation=cv2.INTER_CUBIC)
+        parts += [crop, gap]
+    return np.hstack(parts[:-1])
+
+
+def reading_order(boxes: Sequence[Sequence]) -> List[List[int]]:
+    """Nhóm các box 4 điểm (định dạng EasyOCR) thành dòng, trả về chỉ số theo thứ tự đọc."""
+    points = [np.asarray(box, dtype=np.float32).reshape(-1, 2) for box in boxes]
+    top = np.array([p[:, 1].min() for p in points])
+    bottom = np.array([p[:, 1].max() for p in points])
+    left = np.array([p[:, 0].min() for p in points])
+    centers, heights = (top + bottom) / 2, bottom - top
+
+    lines: List[List[int]] = []
+    for i in np.argsort(centers):
+        first = lines[-1][0] if lines else None
+        if first is not None and abs(centers[i] - centers[first]) < 0.5 * max(heights[i], heights[first]):
+            lines[-1].append(int(i))
+        else:
+            lines.append([int(i)])
+    return [sorted(line, key=lambda i: left[i]) for line in lines]
+
+
+def apply_plate_grammar(text: str) -> str:
+    """Sửa ký tự nhầm theo vị trí: 2 số tỉnh, chữ cái seri, các chữ số cuối."""
+    text = normalize_plate_text(text)
+    if len(text) < 7:
+        return text
+    province = text[:2].translate(DIGIT_FIXES)
+    series = text[2].translate(LETTER_FIXES) + text[3]
+    number = text[4:].translate(DIGIT_FIXES)
+    return province + series + number
+
+
+def order_lines(lines: List[str]) -> str:
+    """Ghép các dòng đã đọc (dòng seri trước, dòng số sau), chưa sửa theo ngữ pháp."""
+    lines = [line for line in (normalize_plate_text(line) for line in lines) if line]
+    if len(lines) == 2 and lines[0].isdigit() and not lines[1].isdigit():
+        lines.reverse()
+    return ''.join(lines)
+
+
+def assemble_lines(lines: List[str]) -> str:
+    """Ghép các dòng đã đọc thành số biển (dòng seri trước, dòng số sau)."""
+    return apply_plate_grammar(order_lines(lines))
@@ -0,0 +1,170 @@
+"""OCR riêng cho biển số: tách ký tự bằng connected components + phân loại bằng template.
+
+Biển số có định dạng cố định, chỉ gồm 10 chữ số và một số chữ cái Latin nên không cần
+đến model OCR đa dụng. Template mặc định được vẽ từ font Hershey của OpenCV; nếu có
+thư mục template thật (ảnh `<ký tự>_*.png`, tạo bằng tools/build_char_templates.py)
+thì dùng thêm các template đó.
+"""
+import glob
+import logging
+import os
+from typing import List, Optional, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+from app.ai.plate_layout import binarize, reading_order
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Ký tự có trên biển số Việt Nam (không có I, J, O, Q, W)
+PLATE_ALLOWLIST = '0123456789ABCDEFGHKLMNPRSTUVXYZ'
+DEFAULT_TEMPLATES_DIR = os.getenv("PLATE_TEMPLATES_DIR", os.path.join(os.path.dirname(__file__), 'plate_templates'))
+
+CHAR_SIZE = (20, 40)  # (w, h) sau khi chuẩn hoá
+MIN_PLATE_CHARS = 7
+MIN_CHAR_HEIGHT = 8  # px, ảnh đã được phóng to trước khi OCR
+# Chiều cao ký tự hợp lệ so với trung vị chiều cao các ký tự trong dòng
+CHAR_HEIGHT_RANGE = (0.6, 1.4)
+
+
+def find_char_boxes(binary: np.ndarray) -> Tuple[List[Tuple[int, int, int, int, int]], np.ndarray]:
+    """Các connected component có hình dạng giống ký tự: ([(x, y, w, h, label)], ảnh label)."""
+    img_h = binary.shape[0]
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    boxes = []
+    for label in range(1, count):
+        x, y, w, h, area = stats[label]
+        # Bỏ nền quanh biển / viền biển số (quá cao hoặc quá rộng), dấu gạch ngang và nhiễu
+        if h < MIN_CHAR_HEIGHT or h > 0.95 * img_h:
+            continue
+        if w > 1.2 * h or w < 0.08 * h:
+            continue
+        if area < 0.1 * w * h:
+            continue
+        boxes.append((int(x), int(y), int(w), int(h), label))
+    return boxes, labels
+
+
+def group_lines(boxes: List[Tuple[int, int, int, int, int]]) -> List[List[Tuple[int, int, int, int, int]]]:
+    """Nhóm box ký tự thành dòng (trên xuống, trái sang phải), lọc chiều cao theo từng dòng."""
+    if not boxes:
+        return []
+    lines = []
+    for line in reading_order([[(x, y), (x + w, y + h)] for x, y, w, h, _ in boxes]):
+        # Ký tự trong cùng dòng cao gần bằng nhau; dấu chấm, ốc vít, nhiễu thấp hơn hẳn
+        median_h = float(np.median([boxes[i][3] for i in line]))
+        kept = [boxes[i] for i in line if CHAR_HEIGHT_RANGE[0] * median_h <= boxes[i][3] <= CHAR_HEIGHT_RANGE[1] * median_h]
+        if len(kept) >= 2:
+            lines.append(kept)
+    # Biển số có tối đa 2 dòng: giữ 2 dòng nhiều ký tự nhất, vẫn theo thứ tự trên xuống
+    if len(lines) > 2:
+        keep = sorted(sorted(range(len(lines)), key=lambda i: len(lines[i]), reverse=True)[:2])
+        lines = [lines[i] for i in keep]
+    return lines
+
+
+def segment_plate_chars(gray: np.ndarray) -> List[np.ndarray]:
+    """Ảnh nhị phân của từng ký tự trên biển số theo thứ tự đọc (dòng trên trước).
+
+    Ảnh có thể là ảnh cắt có padding từ detector: ký tự được tìm trên toàn ảnh rồi nhóm
+    thành dòng, không dựa vào chiều cao ảnh.
+    """
+    boxes, labels = find_char_boxes(binarize(gray))
+    chars = []
+    for line in group_lines(boxes):
+        for x, y, w, h, label in line:
+            # Chỉ lấy đúng component của ký tự, bỏ phần của component khác lọt vào box
+            chars.append(np.where(labels[y:y + h, x:x + w] == label, 255, 0).astype(np.uint8))
+    return chars
+
+
+def normalize_char(binary_char: np.ndarray) -> np.ndarray:
+    """Đưa ảnh ký tự về CHAR_SIZE (giữ tỉ lệ, căn giữa), trả về vector zero-mean chuẩn hoá L2."""
+    target_w, target_h = CHAR_SIZE
+    h, w = binary_char.shape[:2]
+    scale = min(target_w / w, target_h / h)
+    new_w, new_h = max(1, int(round(w * scale))), max(1, int(round(h * scale)))
+    resized = cv2.resize(binary_char, (new_w, new_h), interpolation=cv2.INTER_AREA)
+
+    canvas = np.zeros((target_h, target_w), dtype=np.float32)
+    x0, y0 = (target_w - new_w) // 2, (target_h - new_h) // 2
+    canvas[y0:y0 + new_h, x0:x0 + new_w] = resized / 255.0
+
+    vector = canvas.ravel()
+    vector -= vector.mean()
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm > 0 else vector
+
+
+class TemplateClassifier:
+    """Phân loại ký tự bằng normalized cross-correlation với toàn bộ template (một phép nhân ma trận)."""
+
+    FONTS = (cv2.FONT_HERSHEY_SIMPLEX, cv2.FONT_HERSHEY_DUPLEX)
+    THICKNESSES = (3, 5, 7)
+
+    def __init__(self, templates_dir: Optional[str] = DEFAULT_TEMPLATES_DIR, charset: str = PLATE_ALLOWLIST):
+        self.charset = charset
+        labels, vectors = self._render_templates()
+        if templates_dir and os.path.isdir(templates_dir):
+            file_labels, file_vectors = self._load_templates(templates_dir)
+            labels += file_labels
+            vectors += file_vectors
+            logger.info(f"Đã load {len(file_labels)} template ký tự từ {templates_dir}")
+        self.labels = np.array(labels)
+        self.templates = np.stack(vectors)  # (K, CHAR_SIZE[0] * CHAR_SIZE[1])
+
+    def _render_templates(self) -> Tuple[List[str], List[np.ndarray]]:
+        labels, vectors = [], []
+        for char in self.charset:
+            for font in self.FONTS:
+                for thickness in self.THICKNESSES:
+                    canvas = np.zeros((120, 100), dtype=np.uint8)
+                    cv2.putText(canvas, char, (10, 100), font, 3.0, 255, thickness)
+                    x, y, w, h = cv2.boundingRect(canvas)
+                    labels.append(char)
+                    vectors.append(normalize_char(canvas[y:y + h, x:x + w]))
+        return labels, vectors
+
+    def _load_templates(self, templates_dir: str) -> Tuple[List[str], List[np.ndarray]]:
+        labels, vectors = [], []
+        for path in sorted(glob.glob(os.path.join(templates_dir, '*.png'))):
+            char = os.path.basename(path).split('_')[0].upper()
+            image = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+            if char not in self.charset or image is None:
+                continue
+            labels.append(char)
+            vectors.append(normalize_char(image))
+        return labels, vectors
+
+    def classify(self, chars: List[np.ndarray]) -> Tuple[str, np.ndarray]:
+        """Phân loại nhiều ký tự cùng lúc, trả về (chuỗi ký tự, điểm tương quan từng ký tự)."""
+        if not chars:
+            return '', np.zeros(0, dtype=np.float32)
+        samples = np.stack([normalize_char(char) for char in chars])
+        similarity = samples @ self.templates.T  # (N, K)
+        best = similarity.argmax(axis=1)
+        scores = np.clip(similarity[np.arange(len(chars)), best], 0.0, 1.0)
+        return ''.join(self.labels[best]), scores
+
+
+class NativePlateRecognizer:
+    """Đọc biển số từ ảnh xám: nhị phân hoá → tách dòng → tách ký tự → phân loại template."""
+
+    def __init__(self, templates_dir: Optional[str] = DEFAULT_TEMPLATES_DIR):
+        self.classifier = TemplateClassifier(templates_dir)
+
+    def read(self, gray: np.ndarray) -> Tuple[str, float, List[float]]:
+        """Trả về (text, confidence, confidence từng ký tự); ("N/A", 0, []) nếu tách ký tự thất bại.
+
+        Text là chuỗi ký tự đọc được, chưa sửa theo ngữ pháp biển số (PlateReader làm việc đó).
+        """
+        chars = segment_plate_chars(gray)
+        if len(chars) < MIN_PLATE_CHARS:
+            return "N/A", 0.0, []
+        text, scores = self.classifier.classify(chars)
+        return text, float(scores.mean()), scores.tolist()
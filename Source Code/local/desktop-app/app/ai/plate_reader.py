@@ -1,23 +1,60 @@
 import os
+import time
 from typing import Dict, Any, Optional, Tuple, List
-from collections import Counter
-from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import cv2
 import numpy as np
 from easyocr import Reader
+from dotenv import load_dotenv
 import logging
 
+from app.ai.ocr_cache import OcrCache
+from app.ai.ocr_fusion import fuse_readings
+from app.ai.plate_layout import apply_plate_grammar, join_lines, order_lines, reading_order, split_lines
+from app.ai.plate_ocr import PLATE_ALLOWLIST, NativePlateRecognizer
+from app.utils.debug_image_writer import DebugImageWriter
+
+load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+OCR_MODES = ('full', 'recognize')
+DEFAULT_OCR_MODE = os.getenv("OCR_MODE", "full")
+OCR_ENGINES = ('native', 'easyocr')
+DEFAULT_OCR_ENGINE = os.getenv("OCR_ENGINE", "native")
+NATIVE_MIN_CONFIDENCE = float(os.getenv("NATIVE_OCR_MIN_CONF", "0.75"))
+
 
 class PlateReader:
-    def __init__(self, lang_list=('en',), gpu=False, num_threads=3):
+    """Đọc ký tự trên ảnh biển số đã cắt.
+
+    Engine native (tách ký tự + template, xem plate_ocr.py) chạy trước; EasyOCR chỉ chạy
+    khi native không đủ tin cậy, hoặc khi được gọi với engine='easyocr'. Chế độ EasyOCR:
+
+    - full:      readtext (CRAFT text detector + recognizer) cho biển 1 dòng
+    - recognize: bỏ qua text detector, chạy recognizer trực tiếp trên các dòng
+                 của biển số với allowlist ký tự biển số
+
+    Biển 2 dòng (xe máy) luôn được tách dòng theo hình học (plate_layout.py), 2 dòng được
+    ghép cạnh nhau thành 1 box để chỉ chạy recognizer 1 lần, không cần text detector.
+    """
+
+    def __init__(self, lang_list=('en',), gpu=False, mode: str = DEFAULT_OCR_MODE,
+                 engine: str = DEFAULT_OCR_ENGINE, native_min_confidence: float = NATIVE_MIN_CONFIDENCE):
+        if mode not in OCR_MODES:
+            raise ValueError(f"OCR mode không hợp lệ: {mode} (hỗ trợ: {', '.join(OCR_MODES)})")
+        if engine not in OCR_ENGINES:
+            raise ValueError(f"OCR engine không hợp lệ: {engine} (hỗ trợ: {', '.join(OCR_ENGINES)})")
+        self.mode = mode
+        self.engine = engine
+        self.native_min_confidence = native_min_confidence
+        self.native = NativePlateRecognizer() if engine == 'native' else None
+        self.cache = OcrCache()
         try:
-            logger.info("Initializing EasyOCR...")
-            self.ocr = Reader(list(lang_list), gpu=gpu)
+            logger.info(f"Initializing EasyOCR (mode={mode})...")
+            # Chế độ recognize không cần load model CRAFT
+            self.ocr = Reader(list(lang_list), gpu=gpu, detector=(mode == 'full'))
             logger.info("EasyOCR initialized successfully")
         except Exception as e:
             logger.exception("Error initializing EasyOCR: %s", e)
@@ -26,41 +63,41 @@ class PlateReader:
         # debug directory 
         base = os.path.dirname(os.path.dirname(__file__))
         self.debug_dir = os.path.join(base, 'temps', 'proccessing_images')
-        os.makedirs(self.debug_dir, exist_ok=True)
-        
-        # Multi-threading configuration
-        self.num_threads = num_threads
+        self.debug_writer = DebugImageWriter(self.debug_dir)
 
-    def _save_step(self, img: np.ndarray, step: str) -> str:
-        try:
-            filename = f"{step}.png"
-            path = os.path.join(self.debug_dir, filename)
-            if img is None:
-                return path
+    def warmup(self):
+        """Đọc thử 1 ảnh biển số giả (có chữ) để EasyOCR khởi tạo cả detector lẫn recognizer."""
+        dummy = np.full((120, 360, 3), 255, dtype=np.uint8)
+        cv2.putText(dummy, "51A12345", (15, 80), cv2.FONT_HERSHEY_SIMPLEX, 1.8, (0, 0, 0), 4)
+        # Warmup EasyOCR (fallback) kể cả khi engine chính là native
+        self.read_plate_with_frame(dummy, save_steps=False, engine='easyocr', use_cache=False)
+        logger.info("Warmup EasyOCR xong")
 
-            if img.dtype != np.uint8:
-                to_write = cv2.convertScaleAbs(img)
-            else:
-                to_write = img
-            cv2.imwrite(path, to_write)
-            return path
+    def _save_step(self, img: np.ndarray, prefix: str, step: str) -> str:
+        # Ghi ở thread nền (DebugImageWriter), không chặn luồng OCR
+        try:
+            return self.debug_writer.submit(img, prefix, step)
         except Exception:
             logger.exception("Failed to save debug image for step %s", step)
             return ""
 
-    def _preprocess_plate_image(self, image: np.ndarray, save_steps: bool = True) -> Tuple[Optional[np.ndarray], Dict[str, str]]:
+    def _preprocess_plate_image(self, image: np.ndarray,
+                                save_steps: Optional[bool] = None) -> Tuple[Optional[np.ndarray], Dict[str, str]]:
+        """save_steps: None = lưu theo DEBUG_IMAGES + tỉ lệ lấy mẫu, True = luôn lưu, False = không lưu."""
         saved = {}
         if image is None:
             return None, saved
 
+        prefix = None if save_steps is False else self.debug_writer.sample(force=bool(save_steps))
+
         # Save original cropped plate for debugging
-        if save_steps:
-            saved['cropped'] = self._save_step(image, 'cropped_plate')
+        if prefix:
+            saved['cropped'] = self._save_step(image, prefix, 'cropped_plate')
 
-        # Convert to grayscale
-        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
-        if save_steps:
-            saved['gray'] = self._save_step(gray, 'gray')
+        # Convert to grayscale (PlateEnhancer đã trả về ảnh xám thì giữ nguyên)
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        if prefix:
+            saved['gray'] = self._save_step(gray, prefix, 'gray')
 
         # Upscale small images to improve OCR accuracy (but don't overly enlarge)
         h, w = gray.shape[:2]
@@ -69,12 +106,18 @@ class PlateReader:
             scale = target_w / float(w)
             new_h = int(h * scale)
             gray = cv2.resize(gray, (target_w, new_h), interpolation=cv2.INTER_CUBIC)
-            if save_steps:
-                saved['resized'] = self._save_step(gray, 'resized')
+            if prefix:
+                saved['resized'] = self._save_step(gray, prefix, 'resized')
 
         return gray, saved
 
-    def read_plate_with_frame(self, image_frame: np.ndarray, save_steps: bool = True) -> Dict[str, Any]:
+    def read_plate_with_frame(self, image_frame: np.ndarray, save_steps: Optional[bool] = None,
+                              engine: Optional[str] = None, use_cache: bool = True,
+                              fallback: bool = True, cache_scope: Optional[str] = None) -> Dict[str, Any]:
+        """fallback=False: engine native trả kết quả của chính nó kể cả khi confidence thấp (dùng cho cascade).
+
+        cache_scope: UID thẻ của lần quẹt; cache chỉ trả kết quả đã đọc với cùng thẻ, không có thì không dùng cache.
+        """
         try:
             if image_frame is None:
                 return {
@@ -85,25 +128,41 @@ class PlateReader:
                     'debug_paths': {}
                 }
 
+            # Ảnh biển số gần giống ảnh vừa đọc khi quẹt lại cùng thẻ: trả kết quả cũ ngay
+            use_cache = use_cache and cache_scope is not None
+            cache_tag = (cache_scope, engine or self.engine, fallback)
+            cached = self.cache.get(image_frame, cache_tag) if use_cache else None
+            if cached is not None:
+                logger.info(f"OCR cache hit: '{cached['text']}' (hit rate {self.cache.stats()['hit_rate']:.0%})")
+                cached['cached'] = True
+                return cached
+
             processed, saved = self._preprocess_plate_image(image_frame, save_steps=save_steps)
             if processed is None:
                 return {'success': False, 'text': 'N/A', 'confidence': 0.0, 'error': 'Preprocessing failed', 'debug_paths': saved}
 
-            # Multi-threaded OCR with voting mechanism
-            text, confidence = self._read_with_voting(processed)
+            # EasyOCR là tất định nên mỗi ảnh chỉ cần đọc 1 lần
+            text, raw_text, confidence, _, used_engine = self._read_once(processed, engine, fallback)
             
             success = (text != 'N/A' and confidence > 0)
             error_msg = None
             if not success:
                 error_msg = 'Không phát hiện ký tự trên ảnh (OCR không trả về kết quả rõ ràng)'
 
-            return {
+            result = {
                 'success': success,
                 'text': text,
+                # Chuỗi OCR trước khi sửa theo ngữ pháp biển số
+                'raw_text': raw_text,
                 'confidence': confidence,
+                'candidates': [text] if success else [],
                 'error': error_msg,
+                'engine': used_engine,
                 'debug_paths': saved
             }
+            if success and use_cache:
+                self.cache.put(image_frame, result, cache_tag)
+            return result
 
         except Exception as e:
             logger.exception("Error reading plate: %s", e)
@@ -115,60 +174,106 @@ class PlateReader:
                 'debug_paths': {}
             }
     
-    def _read_with_voting(self, processed_image: np.ndarray) -> Tuple[str, float]:
-        def single_ocr_read(img_copy: np.ndarray, thread_id: int) -> Tuple[str, float]:
-            """Single OCR read operation for parallel execution."""
-            try:
-                results = self.ocr.readtext(img_copy, detail=1, paragraph=False)
-                text, conf = self._process_results(results)
-                logger.info(f"Thread {thread_id}: text='{text}', conf={conf:.2f}")
-                return text, conf
-            except Exception as e:
-                logger.error(f"Thread {thread_id} error: {e}")
-                return "N/A", 0.0
-        
-        # Run OCR in parallel threads
-        results_list: List[Tuple[str, float]] = []
-        
-        with ThreadPoolExecutor(max_workers=self.num_threads) as executor:
-            # Submit all tasks
-            futures = {
-                executor.submit(single_ocr_read, processed_image.copy(), i): i 
-                for i in range(self.num_threads)
+    def read_plate_with_frames(self, image_frames: List[np.ndarray], save_steps: Optional[bool] = None,
+                               engine: Optional[str] = None) -> Dict[str, Any]:
+        """Đọc các ảnh biển số cắt từ nhiều frame khác nhau (mỗi ảnh đúng 1 lần) rồi voting theo từng ký tự."""
+        try:
+            readings = []
+            engines = set()
+            saved = {}
+            for image_frame in image_frames:
+                if image_frame is None:
+                    continue
+                processed, saved = self._preprocess_plate_image(image_frame, save_steps=save_steps)
+                if processed is None:
+                    continue
+                text, _, confidence, char_confs, used_engine = self._read_once(processed, engine)
+                if text != 'N/A':
+                    readings.append((text, confidence, char_confs))
+                    engines.add(used_engine)
+
+            text, confidence = fuse_readings(readings)
+            logger.info(f"Voting result: '{text}' từ {len(readings)}/{len(image_frames)} ảnh, conf={confidence:.2f}")
+
+            success = (text != 'N/A' and confidence > 0)
+            # Ứng viên cho việc đối chiếu biển số đã biết: kết quả voting, rồi từng lần đọc theo confidence
+            candidates = [text] if success else []
+            for reading_text, _, _ in sorted(readings, key=lambda r: -r[1]):
+                if reading_text not in candidates:
+                    candidates.append(reading_text)
+            return {
+                'success': success,
+                'text': text,
+                'confidence': confidence,
+                'candidates': candidates,
+                'error': None if success else 'Không phát hiện ký tự trên ảnh (OCR không trả về kết quả rõ ràng)',
+                'engine': 'native' if engines == {'native'} else 'easyocr',
+                'debug_paths': saved
             }
-            
-            # Collect results as they complete
-            for future in as_completed(futures):
-                try:
-                    result = future.result()
-                    results_list.append(result)
-                except Exception as e:
-                    logger.error(f"Thread execution error: {e}")
-        
-        # Filter out N/A results
-        valid_results = [(text, conf) for text, conf in results_list if text != 'N/A']
-        
-        if not valid_results:
+
+        except Exception as e:
+            logger.exception("Error reading plate: %s", e)
+            return {
+                'success': False,
+                'text': 'N/A',
+                'confidence': 0.0,
+                'error': str(e),
+                'debug_paths': {}
+            }
+
+    def _read_once(self, processed_image: np.ndarray, engine: Optional[str] = None,
+                   fallback: bool = True) -> Tuple[str, str, float, Optional[List[float]], str]:
+        """Đọc 1 ảnh, trả về (text đã sửa theo ngữ pháp, chuỗi OCR gốc, confidence,
+        confidence từng ký tự hoặc None, engine đã dùng)."""
+        if (engine or self.engine) == 'native' and self.native is not None:
+            start = time.perf_counter()
+            raw_text, conf, char_confs = self.native.read(processed_image)
+            elapsed = (time.perf_counter() - start) * 1000
+            if not fallback or (raw_text != 'N/A' and conf >= self.native_min_confidence):
+                logger.info(f"OCR (native): text='{raw_text}', conf={conf:.2f}, {elapsed:.1f}ms")
+                return self._apply_grammar(raw_text), raw_text, conf, char_confs, 'native'
+            logger.info(f"OCR native không đủ tin cậy ('{raw_text}', conf={conf:.2f}), chuyển sang EasyOCR")
+
+        raw_text, conf = self._read_easyocr(processed_image)
+        return self._apply_grammar(raw_text), raw_text, conf, None, 'easyocr'
+
+    @staticmethod
+    def _apply_grammar(raw_text: str) -> str:
+        return raw_text if raw_text == 'N/A' else apply_plate_grammar(raw_text)
+
+    def _read_easyocr(self, processed_image: np.ndarray) -> Tuple[str, float]:
+        try:
+            start = time.perf_counter()
+            lines = split_lines(processed_image)
+            if self.mode == 'recognize' or len(lines) > 1:
+                image = processed_image
+                if len(lines) > 1:
+                    image = join_lines(processed_image, lines)
+                    lines = [[0, image.shape[1], 0, image.shape[0]]]
+                results = self.ocr.recognize(
+                    image,
+                    horizontal_list=lines,
+                    free_list=[],
+                    allowlist=PLATE_ALLOWLIST,
+                    detail=1,
+                    paragraph=False,
+                )
+            else:
+                results = self.ocr.readtext(processed_image, detail=1, paragraph=False)
+            text, conf = self._process_results(results)
+            logger.info(f"OCR ({self.mode}, {len(lines)} dòng): text='{text}', conf={conf:.2f}, "
+                        f"{(time.perf_counter() - start) * 1000:.1f}ms")
+            return text, conf
+        except Exception as e:
+            logger.error(f"OCR error: {e}")
             return "N/A", 0.0
-        
-        # Voting mechanism: select the most common text
-        texts = [text for text, _ in valid_results]
-        text_counter = Counter(texts)
-        most_common_text, count = text_counter.most_common(1)[0]
-        
-        # Calculate average confidence for the most common text
-        confidences = [conf for text, conf in valid_results if text == most_common_text]
-        avg_confidence = sum(confidences) / len(confidences) if confidences else 0.0
-        
-        logger.info(f"Voting result: '{most_common_text}' (appeared {count}/{len(texts)} times, avg_conf={avg_confidence:.2f})")
-        
-        return most_common_text, avg_confidence
 
     def _process_results(self, results) -> Tuple[str, float]:
         """Process EasyOCR results and return combined text and average confidence."""
         if not results:
             return "N/A", 0.0
 
+        all_boxes = []
         all_texts = []
         all_confidences = []
         try:
@@ -178,10 +283,12 @@ class PlateReader:
                     bbox, text, prob = item
                 else:
                     # fallback if different format
+                    bbox = None
                     text = item[1]
                     prob = item[-1] if len(item) > 2 else 0.0
 
                 if prob >= 0.3 and text and text.strip():
+                    all_boxes.append(bbox)
                     all_texts.append(text.strip())
                     all_confidences.append(float(prob))
         except Exception as e:
@@ -191,6 +298,12 @@ class PlateReader:
         if not all_texts:
             return "N/A", 0.0
 
-        combined_text = ' '.join(all_texts)
+        # Ghép theo thứ tự đọc (dòng trên trước, trái sang phải), không phụ thuộc thứ tự EasyOCR
+        # trả về; chưa sửa theo ngữ pháp để _read_once giữ được cả chuỗi gốc
+        if all(box is not None for box in all_boxes):
+            lines = [''.join(all_texts[i] for i in line) for line in reading_order(all_boxes)]
+        else:
+            lines = all_texts
+        combined_text = order_lines(lines)
         avg_confidence = sum(all_confidences) / len(all_confidences) if all_confidences else 0.0
         return combined_text, avg_confidence
@@ -0,0 +1,171 @@
+import itertools
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from app.ai.box_ops import box_iou
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+class Track:
+    """Một biển số được theo dõi qua nhiều frame, dự đoán vị trí bằng vận tốc không đổi."""
+
+    def __init__(self, track_id: int, box: np.ndarray, score: float, timestamp: float):
+        self.id = track_id
+        self.box = box.astype(np.float32)
+        self.velocity = np.zeros(4, dtype=np.float32)  # pixel / giây cho từng toạ độ
+        self.score = score
+        self.hits = 1
+        self.misses = 0
+        self.last_detection_box = self.box.copy()
+        self.last_detection_time = timestamp
+        self.last_time = timestamp
+
+        # Các ảnh biển số tốt nhất (theo quality, giảm dần) từng thấy của track này
+        self.best_crops: List[Tuple[float, Dict[str, Any]]] = []
+
+    @property
+    def best_quality(self) -> float:
+        return self.best_crops[0][0] if self.best_crops else 0.0
+
+    @property
+    def best_result(self) -> Optional[Dict[str, Any]]:
+        return self.best_crops[0][1] if self.best_crops else None
+
+    @property
+    def best_results(self) -> List[Dict[str, Any]]:
+        return [result for _, result in self.best_crops]
+
+    def predict(self, timestamp: float) -> np.ndarray:
+        dt = timestamp - self.last_time
+        if dt > 0:
+            self.box = self.box + self.velocity * dt
+            self.last_time = timestamp
+        return self.box
+
+    def correct(self, box: np.ndarray, score: float, timestamp: float, smoothing: float = 0.5):
+        dt = timestamp - self.last_detection_time
+        if dt > 0:
+            measured = (box - self.last_detection_box) / dt
+            self.velocity = smoothing * measured + (1 - smoothing) * self.velocity
+        self.box = box.astype(np.float32)
+        self.score = score
+        self.hits += 1
+        self.misses = 0
+        self.last_detection_box = self.box.copy()
+        self.last_detection_time = timestamp
+        self.last_time = timestamp
+
+
+class PlateTracker:
+    """Tracker nhiều biển số: ghép bbox theo IoU (tham lam) + dự đoán vận tốc không đổi.
+
+    YOLO chỉ chạy trên keyframe (mỗi keyframe_interval frame), các frame ở giữa chỉ
+    dự đoán vị trí bbox. Mỗi track giữ lại top_k ảnh biển số có chất lượng tốt nhất
+    để OCR voting giữa các frame.
+    """
+
+    def __init__(self, crop_fn: Callable[[np.ndarray, np.ndarray, float], Dict[str, Any]],
+                 iou_threshold: float = 0.3, max_misses: int = 3, keyframe_interval: int = 5,
+                 top_k: int = 3):
+        self.crop_fn = crop_fn
+        self.top_k = max(1, top_k)
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self.keyframe_interval = max(1, keyframe_interval)
+        self.tracks: List[Track] = []
+        self._ids = itertools.count(1)
+        self._frame_count = 0
+
+    def reset(self):
+        self.tracks = []
+        self._frame_count = 0
+
+    def is_keyframe(self) -> bool:
+        return not self.tracks or self._frame_count % self.keyframe_interval == 0
+
+    def predict(self, timestamp: float):
+        self._frame_count += 1
+        for track in self.tracks:
+            track.predict(timestamp)
+
+    def update(self, frame: np.ndarray, boxes: np.ndarray, scores: np.ndarray, timestamp: float):
+        """Cập nhật tracker bằng kết quả detect của một keyframe."""
+        self._frame_count += 1
+        for track in self.tracks:
+            track.predict(timestamp)
+
+        boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        scores = np.asarray(scores, dtype=np.float32).reshape(-1)
+        matched_tracks, matched_dets = self._associate(boxes)
+
+        for t, d in zip(matched_tracks, matched_dets):
+            track = self.tracks[t]
+            track.correct(boxes[d], float(scores[d]), timestamp)
+            self._update_best_crop(track, frame)
+
+        unmatched = np.ones(len(self.tracks), dtype=bool)
+        unmatched[matched_tracks] = False
+        for t in np.flatnonzero(unmatched):
+            self.tracks[t].misses += 1
+
+        new_dets = np.ones(len(boxes), dtype=bool)
+        new_dets[matched_dets] = False
+        for d in np.flatnonzero(new_dets):
+            track = Track(next(self._ids), boxes[d], float(scores[d]), timestamp)
+            self._update_best_crop(track, frame)
+            self.tracks.append(track)
+
+        self.tracks = [t for t in self.tracks if t.misses <= self.max_misses]
+
+    def _associate(self, boxes: np.ndarray):
+        if not self.tracks or len(boxes) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        iou = box_iou(np.stack([t.box for t in self.tracks]), boxes)
+        matched_tracks, matched_dets = [], []
+        # Ghép tham lam theo IoU giảm dần
+        for flat in np.argsort(-iou, axis=None):
+            t, d = np.unravel_index(flat, iou.shape)
+            if iou[t, d] < self.iou_threshold:
+                break
+            if t in matched_tracks or d in matched_dets:
+                continue
+            matched_tracks.append(int(t))
+            matched_dets.append(int(d))
+        return np.array(matched_tracks, dtype=np.int64), np.array(matched_dets, dtype=np.int64)
+
+    def _update_best_crop(self, track: Track, frame: np.ndarray):
+        quality = plate_quality(frame, track.box, track.score)
+        if len(track.best_crops) >= self.top_k and quality <= track.best_crops[-1][0]:
+            return
+        result = self.crop_fn(frame, track.box, track.score)
+        if result.get('cropped_plate') is not None:
+            track.best_crops.append((quality, result))
+            track.best_crops.sort(key=lambda item: -item[0])
+            del track.best_crops[self.top_k:]
+
+    def best_track(self) -> Optional[Track]:
+        candidates = [t for t in self.tracks if t.best_result is not None]
+        if not candidates:
+            return None
+        return max(candidates, key=lambda t: (t.hits, t.best_quality))
+
+
+def plate_quality(frame: np.ndarray, box: np.ndarray, score: float) -> float:
+    """Điểm chất lượng của vùng biển số: confidence * độ nét (phương sai Laplacian) * căn diện tích."""
+    h, w = frame.shape[:2]
+    x1, y1, x2, y2 = np.round(box).astype(int)
+    x1, y1 = max(0, x1), max(0, y1)
+    x2, y2 = min(w, x2), min(h, y2)
+    if x2 - x1 < 2 or y2 - y1 < 2:
+        return 0.0
+
+    region = frame[y1:y2, x1:x2]
+    gray = cv2.cvtColor(region, cv2.COLOR_BGR2GRAY) if region.ndim == 3 else region
+    sharpness = float(cv2.Laplacian(gray, cv2.CV_64F).var())
+    return score * np.log1p(sharpness) * np.sqrt((x2 - x1) * (y2 - y1))
@@ -1,31 +1,300 @@
+import os
 import re
-from app.ai.plate_detector import PlateDetector
-from app.ai.plate_reader import PlateReader
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from dotenv import load_dotenv
+from app.ai.frame_quality import FrameQualityScorer
+from app.ai.plate_index import PlateIndex
+from app.ai.stage_metrics import StageTimer, stage_metrics
+
+load_dotenv()
+
+# Cascade OCR: (profile tăng chất lượng ảnh, engine OCR) từ rẻ đến đắt, dừng ở bước đầu tiên
+# cho kết quả hợp lệ với confidence >= CASCADE_ACCEPT_CONF
+OCR_CASCADE = os.getenv("OCR_CASCADE", "1") == "1"
+CASCADE_STAGES = (('fast', 'native'), ('advanced', 'native'), ('advanced', 'easyocr'))
+CASCADE_ACCEPT_CONF = float(os.getenv("CASCADE_ACCEPT_CONF", "0.85"))
+
+
+def as_burst(frames) -> list:
+    """1 ảnh hoặc 1 loạt ảnh (burst) của cùng lần quẹt thẻ → danh sách ảnh."""
+    return list(frames) if isinstance(frames, (list, tuple)) else [frames]
 
 
 class Proccessor:
-    def __init__(self):
-        self.detector = PlateDetector()
-        self.reader = PlateReader()
+    def __init__(self, plate_index: PlateIndex = None, detector=None, reader=None):
+        # Load YOLO và EasyOCR song song (trừ khi được truyền sẵn), lưu thời gian load (giây) vào self.timings
+        self.timings: dict[str, float] = {}
+        start = time.perf_counter()
+        if OCR_CASCADE and os.getenv("ENHANCE_PROFILE", CASCADE_STAGES[0][0]) != CASCADE_STAGES[0][0]:
+            print(f"OCR_CASCADE=1 nên ENHANCE_PROFILE={os.getenv('ENHANCE_PROFILE')} không được dùng "
+                  f"(cascade tự chọn profile theo từng bước); đặt OCR_CASCADE=0 để dùng ENHANCE_PROFILE")
+        if detector is None or reader is None:
+            # Import tại đây để chỉ kéo theo torch/ultralytics/easyocr khi thật sự load model
+            from app.ai.plate_detector import PlateDetector
+            from app.ai.plate_reader import PlateReader
+
+            with ThreadPoolExecutor(max_workers=2) as executor:
+                # Với cascade, ảnh biển số detector trả về dùng luôn cho bước đầu tiên
+                detector_factory = partial(PlateDetector, enhance_profile=CASCADE_STAGES[0][0]) if OCR_CASCADE else PlateDetector
+                detector_future = executor.submit(self._timed, 'load_detector', detector_factory) if detector is None else None
+                reader_future = executor.submit(self._timed, 'load_reader', PlateReader) if reader is None else None
+                detector = detector or detector_future.result()
+                reader = reader or reader_future.result()
+        self.detector = detector
+        self.reader = reader
+        self.timings['load_total'] = time.perf_counter() - start
+        self.quality = FrameQualityScorer()
+        self.plate_index = plate_index
+
+    def _timed(self, name: str, func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        self.timings[name] = time.perf_counter() - start
+        return result
+
+    def warmup(self) -> dict[str, float]:
+        """Chạy thử detector và OCR để lần xử lý thật đầu tiên không chậm hơn các lần sau."""
+        start = time.perf_counter()
+        self._timed('warmup_detector', self.detector.warmup)
+        self._timed('warmup_reader', self.reader.warmup)
+        self.timings['warmup_total'] = time.perf_counter() - start
+        print(f"Model sẵn sàng: {', '.join(f'{k}={v:.2f}s' for k, v in self.timings.items())}")
+        return self.timings
     
-    def proccess_image(self, image_frame) -> tuple[str, str, str]:
-        detect_result = self.detector.detect_plate_with_frame(image_frame)
+    def proccess_image(self, image_frame, camera_id: str = None, fallback_detection: dict = None,
+                       timer: StageTimer = None, cache_scope: str = None) -> tuple[str, str, str, str]:
+        """Detect → crop/enhance → OCR + validate cho 1 ảnh, trả về (số biển, loại xe, ảnh biển số, chuỗi OCR gốc).
+
+        Thời gian từng stage (ns) được ghi vào timer.
+        """
+        return self.proccess_burst([image_frame], camera_id, fallback_detection, timer, cache_scope)
+
+    def proccess_burst(self, frames: list, camera_id: str = None, fallback_detection: dict = None,
+                       timer: StageTimer = None, cache_scope: str = None) -> tuple[str, str, str, str]:
+        """Xử lý loạt ảnh chụp liên tiếp: detect (1 batch) trên các frame đạt chất lượng, voting rồi OCR.
+
+        Trả về (số biển, loại xe, ảnh biển số, chuỗi OCR gốc); không frame nào đạt chất lượng thì báo lỗi
+        chất lượng (trừ khi có biển số dự phòng từ luồng camera).
+        """
+        timer = StageTimer() if timer is None else timer
+        try:
+            detection = self.detect_frames([frames], [camera_id], [timer])[0]
+            detect_result = self.crop_detection(frames, detection, fallback_detection, timer)
+            return self.read_and_validate(detect_result, timer, cache_scope)
+        finally:
+            stage_metrics.record(timer.timings)
+
+    def detect_frames(self, frames: list, camera_ids: list = None, timers: list = None) -> list:
+        """Quality gate + YOLO (1 batch) cho nhiều job, trả về (detections, error) cho từng job.
+
+        Mỗi phần tử của frames là 1 ảnh hoặc 1 loạt ảnh (burst) của cùng lần quẹt thẻ; detections là
+        (boxes, scores) của từng ảnh trong loạt, None với ảnh bị bỏ qua. Ảnh của mọi job đi chung 1 batch.
+        Frame kém chất lượng luôn bị bỏ qua; không frame nào của loạt đạt thì job nhận lỗi chất lượng.
+        Mỗi job được tính toàn bộ thời gian của batch detect (độ trễ job đó phải chờ).
+        """
+        bursts = [as_burst(burst) for burst in frames]
+        camera_ids = camera_ids or [None] * len(bursts)
+        timers = timers or [StageTimer() for _ in bursts]
+        detections = [[None] * len(burst) for burst in bursts]
+        errors = [None] * len(bursts)
+        good = []
+        for j, burst in enumerate(bursts):
+            readable = [k for k, frame in enumerate(burst) if frame is not None]
+            if len(readable) < len(burst):
+                errors[j] = "Không thể đọc ảnh"
+            if not readable:
+                continue
+            # Loại sớm frame mờ / sai phơi sáng, tránh chạy detect + enhance + OCR vô ích
+            with timers[j].stage('quality'):
+                best, scores = self.quality.pick_sharpest([burst[k] for k in readable])
+            if best is None:
+                errors[j] = scores[0]['reason']
+                print(f"Không frame nào đạt chất lượng: {errors[j]}")
+                continue
+            for k, score in zip(readable, scores):
+                if score['ok']:
+                    good.append((j, k))
+                else:
+                    print(f"Bỏ qua frame {k} không đạt chất lượng: {score['reason']}")
+
+        if good:
+            start = time.perf_counter_ns()
+            results = self.detector.detect_boxes_batch([bursts[j][k] for j, k in good],
+                                                       [camera_ids[j] for j, _ in good])
+            elapsed = time.perf_counter_ns() - start
+            for (j, k), (boxes, scores, error) in zip(good, results):
+                if error is None:
+                    detections[j][k] = (boxes, scores)
+                else:
+                    errors[j] = errors[j] or error
+            for j in {j for j, _ in good}:
+                timers[j].add('detect', elapsed)
+
+        # Job chỉ lỗi khi không ảnh nào trong loạt được detect
+        return [(burst_detections, None if any(d is not None for d in burst_detections) else error)
+                for burst_detections, error in zip(detections, errors)]
+
+    def crop_detection(self, frames, detection: tuple, fallback_detection: dict = None,
+                       timer: StageTimer = None) -> dict:
+        """Voting giữa các ảnh của loạt, cắt + enhance biển số thắng từ kết quả detect_frames.
+
+        Ảnh biển số của cùng xe trên các frame khác được đưa vào 'cropped_plates' để OCR voting.
+        """
+        timer = StageTimer() if timer is None else timer
+        detections, error = detection
+        if error is None:
+            vote = self.detector.vote_across_frames(detections)
+            _, boxes, scores, members = vote
+            # Loại bbox quá nhỏ trước khi cắt + enhance
+            with timer.stage('quality'):
+                plate_ok, reason = self.quality.check_plate_box(boxes[members[:1]], scores[members[:1]])
+            if plate_ok:
+                with timer.stage('enhance'):
+                    detect_result = self.detector.crop_vote(as_burst(frames), vote)
+                detect_result['success'] = detect_result['cropped_plate'] is not None
+            else:
+                print(f"Biển số không đạt chất lượng: {reason}")
+                detect_result = {'success': False, 'error': reason}
+        else:
+            detect_result = {'success': False, 'error': error}
+
+        if not detect_result['success'] and fallback_detection is not None:
+            # Ảnh chụp không thấy biển số, dùng kết quả đã detect trước trên luồng camera
+            print("Dùng biển số phát hiện từ luồng camera")
+            detect_result = fallback_detection
         if not detect_result['success']:
             raise Exception(f"Detect biển số thất bại: {detect_result['error']}")
+        return detect_result
 
-        read_result = self.reader.read_plate_with_frame(detect_result['cropped_plate'])
+    def read_and_validate(self, detect_result: dict, timer: StageTimer = None,
+                          cache_scope: str = None) -> tuple[str, str, str, str]:
+        """OCR + validate, trả về (số biển, loại xe, ảnh biển số, chuỗi OCR gốc).
+
+        Chuỗi OCR gốc khác số biển khi kết quả sai định dạng đã được sửa theo biển số đã biết.
+        cache_scope (UID thẻ) cho phép dùng lại kết quả OCR khi quẹt lại cùng thẻ.
+        """
+        timer = StageTimer() if timer is None else timer
+        if OCR_CASCADE and len(detect_result.get('cropped_plates') or []) <= 1:
+            return self._read_cascade(detect_result, timer, cache_scope)
+
+        with timer.stage('ocr'):
+            read_result = self._read_plate(detect_result, cache_scope=cache_scope)
         if not read_result['success']:
             raise Exception(f"Đọc số biển thất bại: {read_result['error']}")
         
         print(f"Đọc biển thành công!")
         print(f"Số biển: {read_result['text']}")
 
-        valid, type, plate = self.validate_plate(read_result['text'])
+        with timer.stage('validate'):
+            valid, type, plate = self._validate_with_index(read_result)
+            raw_valid = valid and self._raw_valid(read_result)
+        if not raw_valid and read_result.get('engine') == 'native':
+            # Chuỗi OCR native sai định dạng (kể cả khi ngữ pháp đã đoán lại ký tự cho hợp lệ): đọc lại bằng EasyOCR
+            print("Biển số từ OCR native không hợp lệ, đọc lại bằng EasyOCR")
+            with timer.stage('ocr'):
+                easyocr_result = self._read_plate(detect_result, engine='easyocr', cache_scope=cache_scope)
+            if easyocr_result['success']:
+                print(f"Số biển (EasyOCR): {easyocr_result['text']}")
+                with timer.stage('validate'):
+                    easyocr_valid, easyocr_type, easyocr_plate = self._validate_with_index(easyocr_result)
+                    easyocr_raw_valid = easyocr_valid and self._raw_valid(easyocr_result)
+                if easyocr_raw_valid or (easyocr_valid and not valid):
+                    read_result, valid, type, plate = easyocr_result, easyocr_valid, easyocr_type, easyocr_plate
         if valid:
-            return plate, type, detect_result['cropped_plate']
+            return plate, type, detect_result['cropped_plate'], self._ocr_text(read_result)
         else:
             raise Exception("Validate plate failed")
 
+    def _read_cascade(self, detect_result: dict, timer: StageTimer,
+                      cache_scope: str = None) -> tuple[str, str, str, str]:
+        """Enhance + OCR từ rẻ đến đắt trên ảnh biển số gốc ('raw_plate'), dừng sớm khi đủ tin cậy.
+
+        Chỉ dừng sớm khi chuỗi OCR gốc (trước khi sửa theo ngữ pháp) đã đúng định dạng biển số.
+        """
+        raw_plate = detect_result.get('raw_plate')
+        enhanced = {self.detector.enhancer.profile: detect_result['cropped_plate']}
+        native_ok = self.reader.native is not None
+        best = None
+        for i, (profile, engine) in enumerate(CASCADE_STAGES):
+            if engine == 'native' and not native_ok:
+                continue
+            if profile not in enhanced:
+                if raw_plate is None:
+                    continue
+                with timer.stage('enhance'):
+                    enhanced[profile] = self.detector.enhancer.enhance(raw_plate, profile)
+
+            start = time.perf_counter_ns()
+            read_result = self.reader.read_plate_with_frame(enhanced[profile], engine=engine, fallback=False,
+                                                            cache_scope=cache_scope)
+            elapsed = time.perf_counter_ns() - start
+            timer.add('ocr', elapsed)
+            print(f"Cascade {i + 1}/{len(CASCADE_STAGES)} ({profile} + {engine}): '{read_result['text']}', "
+                  f"conf={read_result['confidence']:.2f}, {elapsed / 1e6:.1f}ms")
+            if not read_result['success']:
+                if engine == 'native':
+                    # Native không tách được ký tự: bỏ các bước native còn lại, không enhance thêm chỉ để thử lại
+                    native_ok = False
+                continue
+
+            with timer.stage('validate'):
+                valid, type, plate = self._validate_with_index(read_result)
+                raw_valid = valid and self._raw_valid(read_result)
+            if not valid:
+                continue
+            if raw_valid and read_result['confidence'] >= CASCADE_ACCEPT_CONF:
+                return plate, type, detect_result['cropped_plate'], self._ocr_text(read_result)
+            candidate = (raw_valid, engine, read_result['confidence'], plate, type, self._ocr_text(read_result))
+            if best is None or self._cascade_better(candidate, best):
+                best = candidate
+
+        if best is None:
+            raise Exception("Validate plate failed")
+        return best[3], best[4], detect_result['cropped_plate'], best[5]
+
+    @staticmethod
+    def _cascade_better(candidate: tuple, best: tuple) -> bool:
+        """Không bước nào đủ tin cậy: ưu tiên chuỗi gốc đúng định dạng, rồi confidence cao hơn nếu cùng engine.
+
+        Confidence của native và EasyOCR khác thang đo nên không so với nhau: khác engine thì lấy bước sau (đắt hơn).
+        """
+        if candidate[0] != best[0]:
+            return candidate[0]
+        return candidate[1] != best[1] or candidate[2] > best[2]
+
+    def _raw_valid(self, read_result: dict) -> bool:
+        """Chuỗi OCR gốc đúng định dạng biển số mà không cần sửa ký tự theo ngữ pháp."""
+        return self.validate_plate(self._ocr_text(read_result))[0]
+
+    @staticmethod
+    def _ocr_text(read_result: dict) -> str:
+        return read_result.get('raw_text') or read_result['text']
+
+    def _validate_with_index(self, read_result: dict) -> tuple[bool, str, str]:
+        valid, type, plate = self.validate_plate(read_result['text'])
+        # Biển số hợp lệ giữ nguyên dù confidence thấp: xe mới có thể khác biển số đã biết đúng 1 ký tự
+        if valid or self.plate_index is None or not len(self.plate_index):
+            return valid, type, plate
+
+        # Sai định dạng: snap về biển số đã biết cách 1 ký tự
+        snapped = self.plate_index.snap(read_result.get('candidates') or [read_result['text']])
+        if snapped is None:
+            return valid, type, plate
+        snapped_valid, snapped_type, snapped_plate = self.validate_plate(snapped)
+        if snapped_valid:
+            print(f"Sửa biển số theo danh sách đã biết: {read_result['text']} → {snapped_plate}")
+            return snapped_valid, snapped_type, snapped_plate
+        return valid, type, plate
+
+    def _read_plate(self, detect_result: dict, engine: str = None, cache_scope: str = None) -> dict:
+        # Có nhiều ảnh biển số khác nhau (burst / track trên luồng camera) thì đọc mỗi ảnh 1 lần rồi voting
+        crops = detect_result.get('cropped_plates') or []
+        if len(crops) > 1:
+            return self.reader.read_plate_with_frames(crops, engine=engine)
+        return self.reader.read_plate_with_frame(detect_result['cropped_plate'], engine=engine, cache_scope=cache_scope)
+
     def validate_plate(self, plate: str) -> tuple[bool, str, str]:
         plate = plate.strip().upper().replace(" ", "").replace(".", "").replace(",", "").replace("-", "")
 
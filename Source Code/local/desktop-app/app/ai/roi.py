@@ -0,0 +1,106 @@
+import json
+import logging
+import os
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+DEFAULT_CAMERA_CONFIG = os.getenv("CAMERA_CONFIG", "camera_config.json")
+DEFAULT_IMGSZ = int(os.getenv("DETECTOR_IMGSZ", "640"))
+
+
+class RegionOfInterest:
+    """Vùng quan tâm của camera: hình chữ nhật [x1, y1, x2, y2] hoặc đa giác [[x, y], ...].
+
+    Toạ độ có thể là pixel hoặc tỉ lệ (0..1) so với kích thước frame.
+    """
+
+    def __init__(self, points: Sequence[Sequence[float]], is_rect: bool):
+        self.points = np.asarray(points, dtype=np.float32).reshape(-1, 2)
+        self.is_rect = is_rect
+        self.normalized = bool(np.all(self.points <= 1.0))
+
+    @classmethod
+    def from_config(cls, value: Any) -> Optional['RegionOfInterest']:
+        if not value:
+            return None
+        if len(value) == 4 and all(isinstance(v, (int, float)) for v in value):
+            x1, y1, x2, y2 = value
+            return cls([[x1, y1], [x2, y2]], is_rect=True)
+        if len(value) >= 3 and all(len(p) == 2 for p in value):
+            return cls(value, is_rect=False)
+        raise ValueError(f"ROI không hợp lệ: {value}")
+
+    def _pixel_points(self, width: int, height: int) -> np.ndarray:
+        if self.normalized:
+            return self.points * np.array([width, height], dtype=np.float32)
+        return self.points
+
+    def crop(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        """Cắt frame theo ROI, trả về (ảnh cắt, offset (x, y) của góc trên trái)."""
+        h, w = frame.shape[:2]
+        points = self._pixel_points(w, h)
+
+        x1, y1 = np.floor(points.min(axis=0)).astype(int)
+        x2, y2 = np.ceil(points.max(axis=0)).astype(int)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(w, x2), min(h, y2)
+        if x2 <= x1 or y2 <= y1:
+            return frame, (0, 0)
+
+        cropped = frame[y1:y2, x1:x2]
+        if not self.is_rect:
+            # Tô đen phần nằm ngoài đa giác để YOLO không bắt nhầm biển số làn bên cạnh
+            mask = np.zeros(cropped.shape[:2], dtype=np.uint8)
+            polygon = np.round(points - [x1, y1]).astype(np.int32)
+            cv2.fillPoly(mask, [polygon], 255)
+            cropped = cv2.bitwise_and(cropped, cropped, mask=mask)
+
+        return cropped, (int(x1), int(y1))
+
+
+class CameraConfig:
+    def __init__(self, roi: Optional[RegionOfInterest] = None, imgsz: int = DEFAULT_IMGSZ):
+        self.roi = roi
+        self.imgsz = imgsz
+
+    def prepare(self, frame: np.ndarray) -> Tuple[np.ndarray, Tuple[int, int]]:
+        if self.roi is None:
+            return frame, (0, 0)
+        return self.roi.crop(frame)
+
+
+def load_camera_configs(path: str = DEFAULT_CAMERA_CONFIG) -> Dict[str, CameraConfig]:
+    """Đọc file cấu hình camera dạng {"<camera_id>": {"roi": ..., "imgsz": ...}, "default": {...}}."""
+    if not path or not os.path.exists(path):
+        return {}
+
+    try:
+        with open(path, encoding='utf-8') as f:
+            raw: Dict[str, Dict[str, Any]] = json.load(f)
+    except Exception as e:
+        logger.error(f"Lỗi đọc cấu hình camera {path}: {e}")
+        return {}
+
+    default_imgsz = int(raw.get('default', {}).get('imgsz', DEFAULT_IMGSZ))
+    configs = {}
+    for camera_id, item in raw.items():
+        configs[camera_id] = CameraConfig(
+            roi=RegionOfInterest.from_config(item.get('roi')),
+            imgsz=int(item.get('imgsz', default_imgsz)),
+        )
+    logger.info(f"Đã load cấu hình ROI cho camera: {', '.join(configs)}")
+    return configs
+
+
+def to_full_frame(boxes: np.ndarray, offset: Tuple[int, int]) -> np.ndarray:
+    """Quy đổi bbox (N, 4) từ toạ độ vùng ROI về toạ độ frame gốc."""
+    ox, oy = offset
+    return np.asarray(boxes, dtype=np.float32).reshape(-1, 4) + np.array([ox, oy, ox, oy], dtype=np.float32)
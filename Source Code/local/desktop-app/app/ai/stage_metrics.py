@@ -0,0 +1,99 @@
+"""Thời gian từng stage xử lý biển số (nanosecond, đồng hồ monotonic) và thống kê p50/p95/p99.
+
+Mỗi job có một StageTimer; khi job xong, timings được đưa vào `stage_metrics` (dùng chung cho
+cả tiến trình) để theo dõi stage nào chậm đi sau khi nâng cấp model / OpenCV.
+"""
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Deque, Dict, Optional
+
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+STAGE_METRICS_WINDOW = int(os.getenv("STAGE_METRICS_WINDOW", "500"))
+STAGE_METRICS_LOG_EVERY = int(os.getenv("STAGE_METRICS_LOG_EVERY", "50"))
+PERCENTILES = (50, 95, 99)
+
+
+class StageTimer:
+    """Cộng dồn thời gian (ns) theo tên stage; cùng stage chạy nhiều lần (ví dụ cascade OCR) thì cộng lại."""
+
+    def __init__(self, timings: Optional[Dict[str, int]] = None):
+        self.timings: Dict[str, int] = timings if timings is not None else {}
+
+    def add(self, stage: str, elapsed_ns: int):
+        self.timings[stage] = self.timings.get(stage, 0) + int(elapsed_ns)
+
+    @contextmanager
+    def stage(self, stage: str):
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter_ns() - start)
+
+    @property
+    def total_ns(self) -> int:
+        return sum(self.timings.values())
+
+
+def format_timings(timings: Dict[str, int]) -> str:
+    return ', '.join(f"{stage}={ns / 1e6:.1f}ms" for stage, ns in timings.items())
+
+
+class StageMetrics:
+    """Cửa sổ trượt STAGE_METRICS_WINDOW job gần nhất cho mỗi stage."""
+
+    def __init__(self, window: int = STAGE_METRICS_WINDOW, log_every: int = STAGE_METRICS_LOG_EVERY):
+        self.window = window
+        self.log_every = log_every
+        self._samples: Dict[str, Deque[int]] = {}
+        self._lock = threading.Lock()
+        self._recorded = 0
+
+    def record(self, timings: Dict[str, int]):
+        if not timings:
+            return
+        with self._lock:
+            for stage, ns in timings.items():
+                self._samples.setdefault(stage, deque(maxlen=self.window)).append(int(ns))
+            self._samples.setdefault('total', deque(maxlen=self.window)).append(sum(timings.values()))
+            self._recorded += 1
+            should_log = self.log_every > 0 and self._recorded % self.log_every == 0
+        if should_log:
+            self.log()
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """{stage: {'count', 'p50_ms', 'p95_ms', 'p99_ms'}} trên cửa sổ hiện tại."""
+        with self._lock:
+            samples = {stage: np.fromiter(values, dtype=np.int64) for stage, values in self._samples.items()}
+        stats = {}
+        # 'total' luôn ở cuối bảng
+        for stage, values in sorted(samples.items(), key=lambda item: item[0] == 'total'):
+            stats[stage] = {'count': len(values)}
+            for p, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+                stats[stage][f'p{p}_ms'] = float(value) / 1e6
+        return stats
+
+    def log(self):
+        stats = self.snapshot()
+        lines = [f"  {stage:<10} n={s['count']:<4} " + ' '.join(f"p{p}={s[f'p{p}_ms']:.1f}ms" for p in PERCENTILES)
+                 for stage, s in stats.items()]
+        logger.info("Thời gian xử lý theo stage:\n" + '\n'.join(lines))
+
+    def reset(self):
+        with self._lock:
+            self._samples.clear()
+            self._recorded = 0
+
+
+stage_metrics = StageMetrics()
@@ -1,37 +1,79 @@
 import asyncio
+import os
+import time
 from enum import Enum
-from PySide6.QtCore import QObject, QThread, Signal, QTimer
+from PySide6.QtCore import QCoreApplication, QObject, QThread, Signal, Slot, QTimer, Qt
 from PySide6.QtGui import QPixmap
 import cv2
-from app.ai.proccessor import Proccessor
+from app.ai.motion_detector import MotionDetector
+from app.ai.inference_engine import InferenceEngine
+from app.ai.plate_index import PlateIndex
 from app.api.api_client import APIClient
 from app.models.call_api_worker import CallApiWorker
 from app.models.cam_stream_worker import CamStreamWorker
 from app.models.cap_capture_worker import CameraCaptureWorker
 from app.models.enums import EventType
-from app.models.proccess_plate_worker import ProccessPlateWorker
-from app.mqtt.mqtt_client import MQTTClient
+from app.models.model_loader_worker import ModelLoaderWorker
+from app.models.stream_detect_worker import StreamDetectWorker
+from app.mqtt.mqtt_client import ESP32CAM_CHANNEL, MQTTClient
 from PySide6.QtGui import QImage, QPixmap
 
-from app.utils.convert_util import bytes_to_ndarray, ndarray_to_bytes
+from app.utils.convert_util import ndarray_to_bytes
+
+# Kết quả detect trên luồng camera chỉ dùng lại trong khoảng thời gian này (giây)
+LANE_DETECTION_TTL = 3.0
+# Tên làn (cổng) của controller này trong inference engine dùng chung
+LANE_ID = os.getenv("LANE_ID") or ESP32CAM_CHANNEL
+
+
+class GuiThreadInvoker(QObject):
+    """Chạy callback trên thread GUI: thread nền (pipeline, load model) emit invoke, slot chạy qua queued connection."""
+    invoke = Signal(object, object)
+
+    def __init__(self):
+        super().__init__()
+        self.invoke.connect(self._run, Qt.QueuedConnection)
+        # MainController được tạo trong thread nền (InitMainControllerWorkers) đã kết thúc: chuyển về thread GUI
+        self.moveToThread(QCoreApplication.instance().thread())
+
+    @Slot(object, object)
+    def _run(self, callback, arg):
+        callback(arg)
+
 
 class MainController:
     def __init__(self, on_ui_event):
         self.on_ui_event = on_ui_event
+        # Tạo QThread / QTimer / QPixmap chỉ từ thread GUI
+        self._gui = GuiThreadInvoker()
         self.mqtt_client = MQTTClient(self._dispatch_message)
-        self.mqtt_client.run()
 
-        self.plate_proccessor = Proccessor()
+        # Model AI được load + warmup ở thread riêng, None cho tới khi sẵn sàng
+        self.plate_proccessor = None
+        self.engine = InferenceEngine()
+        self.lane_id = LANE_ID
+        self.engine.register_lane(self.lane_id, self._on_pipeline_done)
+        self._stream_url = None
         self.api = APIClient()
 
+        self._model_threads = {}
         self._cam_stream_threads = {}
+        self._stream_detect_threads = {}
         self._cam_capture_threads = {}
-        self._proccess_plate_threads = {}
         self._api_threads = {}
 
         self.capture_url = None
+        # Camera id dùng để tra cấu hình ROI/imgsz trong camera_config.json
+        self.camera_id = ESP32CAM_CHANNEL
         self.processing: dict[str, any] = None
 
+        # Trạng thái làn xe từ luồng camera
+        self.vehicle_present = False
+        self._lane_detection = None
+        self._stream_detect_worker = None
+
+        # Biển số đã check-in/out trên máy này, để sửa kết quả OCR sai 1 ký tự
+        self.plate_index = PlateIndex()
 
         self.tab = 'status'
 
@@ -42,6 +84,38 @@ class MainController:
             "months": ''
         }
 
+        self._load_models()
+        self.mqtt_client.run()
+
+    # ------------------- Load Models -------------------
+    def _load_models(self):
+        print("=== Loading AI models ===")
+        thread = QThread()
+        worker = ModelLoaderWorker(self.plate_index)
+        worker.moveToThread(thread)
+
+        thread_id = id(thread)
+        self._model_threads[thread_id] = (thread, worker)
+
+        thread.started.connect(worker.run)
+        # DirectConnection chỉ để emit từ thread load model, phần xử lý chạy trên thread GUI
+        worker.finished.connect(lambda proccessor: self._gui.invoke.emit(self._on_models_ready, proccessor),
+                                Qt.DirectConnection)
+        worker.failed.connect(
+            lambda e: self.on_ui_event(EventType.SHOW_MESS, f"Lỗi khởi tạo mô hình AI: {e}"), Qt.DirectConnection)
+        worker.finished.connect(thread.quit)
+        worker.failed.connect(thread.quit)
+        thread.start()
+
+    def _on_models_ready(self, proccessor):
+        # None khi model chạy ở tiến trình riêng (INFERENCE_MODE=process): không theo dõi luồng camera
+        self.plate_proccessor = proccessor
+        self.on_ui_event(EventType.MODELS_READY, dict(self.engine.timings))
+
+        # Luồng camera đã chạy trong lúc chờ model thì khởi động lại để bật phân tích
+        if self._stream_url:
+            self._start_camera(self._stream_url)
+
 
     def _handler_regiter_monthly(self, uid):
         get_success, res = self.api.get_card_info(uid)
@@ -102,6 +176,9 @@ class MainController:
                     return
 
                 self.on_ui_event(type, message)
+                if not self.engine.ready:
+                    self.on_ui_event(EventType.STATUS_CHANGED, "Mô hình AI đang khởi tạo, vui lòng quẹt lại sau")
+                    return
                 self.processing = {}
                 self.processing['uid'] = message
                 self._capture_image()
@@ -112,6 +189,7 @@ class MainController:
                 self.on_ui_event(type, None)
             case EventType.ESP32CAM_DISCONNECTED:
                 self.capture_url = None
+                self._stream_url = None
                 self._stop_camera_stream()
                 self.on_ui_event(type, None)
             case EventType.ESP32CAM_STREAM_URL:
@@ -171,6 +249,7 @@ class MainController:
             return
 
         print("=== Starting capture image ===")
+        processing = self.processing
         # Cleanup threads cũ
         self._cleanup_threads(self._cam_capture_threads)
 
@@ -189,11 +268,11 @@ class MainController:
         
         # Wrapper để tránh emit nhiều lần
         captured_emitted = [False]
-        def on_captured(b):
+        def on_captured(frames):
             if not captured_emitted[0]:
                 captured_emitted[0] = True
-                print(f"Captured image, thread {thread_id}")
-                self._on_captured(b)
+                print(f"Captured {len(frames)} image(s), thread {thread_id}")
+                self._on_captured(frames, processing)
                 # Cleanup sau khi xử lý xong
                 QTimer.singleShot(100, lambda: self._remove_thread(self._cam_capture_threads, thread_id))
         
@@ -229,68 +308,64 @@ class MainController:
             print(f"Error removing thread {thread_id}: {e}")
 
     # ------------------- On Captured -------------------
-    def _on_captured(self, b):
+    def _on_captured(self, frames, processing):
         print("=== Processing captured image ===")
-        self.processing['image'] = b
+        # Ảnh gửi lên server là ảnh pipeline chọn để cắt biển số, mặc định ảnh đầu của loạt
+        processing['images'] = frames
+        processing['image'] = b = frames[0]
+
+        # Cả loạt ảnh được detect (1 batch) rồi voting; đưa vào hàng đợi của làn,
+        # không huỷ xử lý của xe trước (các xe được xử lý chồng lấn)
+        accepted = self.engine.submit(self.lane_id, frames, self.camera_id, self._recent_lane_detection(),
+                                      context=processing, cache_scope=processing.get('uid'))
+        print(f"Pipeline queue: {self.engine.queue_depths()}")
+        if not accepted:
+            self.on_ui_event(EventType.STATUS_CHANGED, "Hệ thống đang bận, vui lòng quẹt lại sau")
 
-        # Cleanup threads cũ
-        self._cleanup_threads(self._proccess_plate_threads)
+        self.on_ui_event(EventType.ESP32CAM_RECEIVED_CAPTURE, QPixmap.fromImage(QImage.fromData(b)))
 
-        # Plate processing
-        thread = QThread()
-        worker = ProccessPlateWorker(self.plate_proccessor, bytes_to_ndarray(b))
-        worker.moveToThread(thread)
-        
-        # Generate unique ID
-        thread_id = id(thread)
-        self._proccess_plate_threads[thread_id] = (thread, worker)
-        print(f"Created process plate thread {thread_id}")
-        
-        # Connect signals
-        thread.started.connect(worker.run)
-        
-        # Wrapper để tránh emit nhiều lần
-        finished_emitted = [False]
-        def on_finished(data):
-            if not finished_emitted[0]:
-                finished_emitted[0] = True
-                print(f"Plate processing finished, thread {thread_id}")
-                self._on_image_proccessing_completed(data)
-                # Cleanup sau khi xử lý xong
-                QTimer.singleShot(100, lambda: self._remove_thread(self._proccess_plate_threads, thread_id))
-        
-        worker.finished.connect(on_finished)
-        thread.start()
+    def _on_pipeline_done(self, job):
+        # Gọi từ thread của stage cuối pipeline: chỉ chuyển kết quả sang thread GUI
+        self._gui.invoke.emit(self._on_pipeline_result, job)
 
-        self.on_ui_event(EventType.ESP32CAM_RECEIVED_CAPTURE, QPixmap.fromImage(QImage.fromData(b)))
+    def _on_pipeline_result(self, job):
+        if job.error:
+            print(f"License plate processing error: {job.error}")
+        # Thời gian từng stage (ns) của lần xử lý này
+        job.context['timings_ns'] = dict(job.timings)
+        if 0 <= job.frame_index < len(job.context.get('images') or []):
+            job.context['image'] = job.context['images'][job.frame_index]
+        self._on_image_proccessing_completed(job.result, job.context)
 
     # ------------------- Image Processing Completed -------------------
-    def _on_image_proccessing_completed(self, data):
+    def _on_image_proccessing_completed(self, data, processing):
         print("=== Image processing completed ===")
         if data is None:
-            self.processing['status'] = 'Xử lý thất bại, không phát hiện biển số'
+            processing['status'] = 'Xử lý thất bại, không phát hiện biển số'
             print("Plate detection failed")
             self.on_ui_event(EventType.STATUS_CHANGED, "Không phát hiện biển số")
             return
 
-        plate_number, vehicle_type, cropped_plate = data
-        self.processing['plate'] = plate_number
-        self.processing['vehicle_type'] = vehicle_type
-        self.processing['cropped_plate'] = cropped_plate
+        plate_number, vehicle_type, cropped_plate, ocr_text = data
+        processing['plate'] = plate_number
+        processing['vehicle_type'] = vehicle_type
+        processing['cropped_plate'] = cropped_plate
+        # Chuỗi OCR gốc, khác số biển khi đã được sửa theo biển số đã biết
+        processing['ocr_text'] = ocr_text
         
-        print(f"Plate: {plate_number}, Vehicle: {vehicle_type}")
-        self._check_with_server()
+        print(f"Plate: {plate_number} (OCR: {ocr_text}), Vehicle: {vehicle_type}")
+        self._check_with_server(processing)
 
     # ------------------- Check With Server -------------------
-    def _check_with_server(self):
+    def _check_with_server(self, processing):
         print("=== Checking with server ===")
         # Tạo thread mới
         thread = QThread()
         worker = CallApiWorker(
             self.api.check_in_out,
-            self.processing['uid'],
-            self.processing['plate'],
-            self.processing['image']
+            processing['uid'],
+            processing['plate'],
+            processing['image']
         )
 
         worker.moveToThread(thread)
@@ -309,7 +384,7 @@ class MainController:
             if not finished_emitted[0]:
                 finished_emitted[0] = True
                 print(f"API call finished, thread {thread_id}")
-                self._on_api_result(result)
+                self._on_api_result(result, processing)
                 # Cleanup sau khi xử lý xong
                 QTimer.singleShot(100, lambda: self._remove_thread(self._api_threads, thread_id))
         
@@ -330,10 +405,10 @@ class MainController:
         thread.start()
 
     # ------------------- API Result -------------------
-    def _on_api_result(self, result):
+    def _on_api_result(self, result, processing):
         print(f"=== API Result received: {result} ===")
     
-        cropped = self.processing['cropped_plate']
+        cropped = processing['cropped_plate']
         print(cropped.shape, cropped.dtype)
 
         # BGR → RGB nếu cần
@@ -349,17 +424,37 @@ class MainController:
         success, res = result
         self.on_ui_event(EventType.STATUS_CHANGED, res.get("message"))
         if success:
+            self.plate_index.add((res.get("data") or {}).get("plate"))
             self.on_ui_event(EventType.CHECKED_STATUS, (res.get("data", {}), pix))
 
     # ------------------- Camera Stream -------------------
     def _start_camera(self, stream_url):
         print("=== Starting camera stream ===")
+        self._stream_url = stream_url
         # Cleanup threads cũ
         self._cleanup_threads(self._cam_stream_threads)
+        self._cleanup_threads(self._stream_detect_threads)
+        self._stream_detect_worker = None
+
+        # Model chưa sẵn sàng thì chỉ hiển thị luồng camera, phân tích được bật khi load xong
+        detect_worker = None
+        motion_detector = None
+        if self.plate_proccessor is not None:
+            # Thread theo dõi biển số trên luồng camera, chỉ chạy khi có xe trong làn
+            detect_thread = QThread()
+            detect_worker = StreamDetectWorker(self.plate_proccessor.detector, self.camera_id)
+            detect_worker.moveToThread(detect_thread)
+            self._stream_detect_threads[id(detect_thread)] = (detect_thread, detect_worker)
+            detect_thread.started.connect(detect_worker.run)
+            detect_worker.plate_detected.connect(self._on_lane_plate_detected, Qt.DirectConnection)
+            detect_thread.start()
+            self._stream_detect_worker = detect_worker
+            motion_detector = MotionDetector(roi=self.plate_proccessor.detector.camera_config(self.camera_id).roi)
 
         # Tạo thread mới
         thread = QThread()
-        worker = CamStreamWorker(stream_url)
+        # Khi có xe, mọi frame đều được đưa cho tracker (YOLO chỉ chạy trên keyframe)
+        worker = CamStreamWorker(stream_url, motion_detector, analysis_interval=0)
         worker.moveToThread(thread)
         
         # Generate unique ID
@@ -370,12 +465,39 @@ class MainController:
         # Connect signals
         thread.started.connect(worker.run)
         worker.frame_received.connect(lambda f: self.on_ui_event(EventType.ESP32CAM_RECEIVED_FRAME, f))
+        worker.presence_changed.connect(self._on_presence_changed, Qt.DirectConnection)
+        if detect_worker is not None:
+            worker.vehicle_frame.connect(detect_worker.submit, Qt.DirectConnection)
         
         thread.start()
 
+    def _on_presence_changed(self, present):
+        self.vehicle_present = present
+        if present:
+            # Xe mới vào làn, bỏ kết quả detect của xe trước
+            self._lane_detection = None
+        elif self._stream_detect_worker is not None:
+            self._stream_detect_worker.reset()
+        self.on_ui_event(EventType.VEHICLE_PRESENCE, present)
+
+    def _on_lane_plate_detected(self, result):
+        self._lane_detection = result
+
+    def _recent_lane_detection(self):
+        detection = self._lane_detection
+        if detection is None:
+            return None
+        # Xe vẫn trong làn thì ảnh biển số tốt nhất của track vẫn còn giá trị
+        if not self.vehicle_present and time.monotonic() - detection['timestamp'] > LANE_DETECTION_TTL:
+            return None
+        return detection
+
     def _stop_camera_stream(self):
         print('=== Stopping camera stream ===')
         self.on_ui_event(EventType.ESP32CAM_RECEIVED_FRAME, QPixmap())
         
         # Cleanup tất cả camera stream threads
-        self._cleanup_threads(self._cam_stream_threads)
\ No newline at end of file
+        self._cleanup_threads(self._cam_stream_threads)
+        self._cleanup_threads(self._stream_detect_threads)
+        self._stream_detect_worker = None
+        self._lane_detection = None
\ No newline at end of file
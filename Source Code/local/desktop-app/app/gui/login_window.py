@@ -1,17 +1,28 @@
 from PySide6.QtWidgets import (QApplication, QMainWindow, QWidget, QVBoxLayout, 
                                QLabel, QLineEdit, QPushButton, QMessageBox)
-from PySide6.QtCore import Qt
+from PySide6.QtCore import Qt, QThread
 from PySide6.QtGui import QFont
 from qasync import asyncSlot
 
 from app.controllers.login_controller import LoginController
-from app.gui.main_window import MainWindow
+from app.models.preload_worker import PreloadWorker
 
 class LoginWindow(QMainWindow):
     def __init__(self):
         super().__init__()
         self.controller = LoginController(self.on_login_failed, self.on_login_successful)
         self.init_ui()
+        self._start_preload()
+
+    def _start_preload(self):
+        # MainWindow kéo theo torch/ultralytics/easyocr/cv2: import trong nền
+        # để cửa sổ đăng nhập hiện ngay
+        self._preload_thread = QThread()
+        self._preload_worker = PreloadWorker()
+        self._preload_worker.moveToThread(self._preload_thread)
+        self._preload_thread.started.connect(self._preload_worker.run)
+        self._preload_worker.finished.connect(self._preload_thread.quit)
+        self._preload_thread.start()
 
     def init_ui(self):
         self.setWindowTitle("Đăng nhập hệ thống")
@@ -128,6 +139,8 @@ class LoginWindow(QMainWindow):
         msg.exec()
     
     def on_login_successful(self):
+        from app.gui.main_window import MainWindow
+
         self.show_info("Đăng nhập thành công")
         self.main_window = MainWindow()
         self.main_window.show()
@@ -53,8 +53,12 @@ class MainWindow(QMainWindow):
         self.setStatusBar(self.status_bar)
         self.esp32c3_status_label = QLabel("ESP32C3: Đang kiểm tra kết nối ...")
         self.esp32cam_status_label = QLabel("ESP32CAM: Đang kiểm tra kết nối ...")
+        self.lane_status_label = QLabel("Làn xe: --")
+        self.model_status_label = QLabel("AI: Đang tải mô hình ...")
         self.status_bar.addWidget(self.esp32c3_status_label)
         self.status_bar.addWidget(self.esp32cam_status_label)
+        self.status_bar.addWidget(self.lane_status_label)
+        self.status_bar.addWidget(self.model_status_label)
 
         self._workers = []
         self.ui_event_signal.connect(self._on_ui_event)
@@ -211,6 +215,14 @@ class MainWindow(QMainWindow):
                 self.live_camera.setPixmap(data)
             case EventType.ESP32CAM_RECEIVED_CAPTURE:
                 self.capture_image.setPixmap(data)
+            case EventType.MODELS_READY:
+                self.model_status_label.setStyleSheet("color: green;")
+                self.model_status_label.setText(
+                    f"AI: Sẵn sàng (load {data['load_total']:.1f}s, warmup {data['warmup_total']:.1f}s)")
+                self.model_status_label.setToolTip("\n".join(f"{k}: {v:.2f}s" for k, v in data.items()))
+            case EventType.VEHICLE_PRESENCE:
+                self.lane_status_label.setStyleSheet("color: green;" if data else "")
+                self.lane_status_label.setText("Làn xe: Có xe" if data else "Làn xe: Trống")
 
             case EventType.RECEIVED_MONTHLY_INFO:
                 self.name_value.setText(data["monthly_user_name"])
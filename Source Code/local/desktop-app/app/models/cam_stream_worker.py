@@ -6,11 +6,17 @@ import time
 
 class CamStreamWorker(QObject):
     frame_received = Signal(QPixmap)
+    presence_changed = Signal(bool)
+    vehicle_frame = Signal(object)
 
-    def __init__(self, camera_url):
+    def __init__(self, camera_url, motion_detector=None, analysis_interval: float = 0.2):
         super().__init__()
         self.camera_url = camera_url
         self.running = True
+        # Phát hiện xe bằng trừ nền, chỉ gửi frame đi detect khi có xe trong làn
+        self.motion_detector = motion_detector
+        self.analysis_interval = analysis_interval
+        self._last_analysis = 0.0
 
     def stop(self):
         self.running = False
@@ -47,6 +53,8 @@ class CamStreamWorker(QObject):
                     # Reset failure counter on success
                     consecutive_failures = 0
 
+                    self._analyse_frame(frame)
+
                     # Convert BGR -> RGB để Qt hiển thị đúng màu
                     frame_rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
                     h, w, ch = frame_rgb.shape
@@ -68,4 +76,22 @@ class CamStreamWorker(QObject):
         finally:
             if cap is not None:
                 cap.release()
-            print("Camera stream stopped and released")
\ No newline at end of file
+            if self.motion_detector is not None and self.motion_detector.present:
+                self.motion_detector.reset()
+                self.presence_changed.emit(False)
+            print("Camera stream stopped and released")
+
+    def _analyse_frame(self, frame):
+        if self.motion_detector is None:
+            return
+
+        was_present = self.motion_detector.present
+        present = self.motion_detector.update(frame)
+        if present != was_present:
+            print(f"Vehicle presence: {present} (motion={self.motion_detector.motion_ratio:.3f})")
+            self.presence_changed.emit(present)
+
+        now = time.monotonic()
+        if present and now - self._last_analysis >= self.analysis_interval:
+            self._last_analysis = now
+            self.vehicle_frame.emit(frame)
\ No newline at end of file
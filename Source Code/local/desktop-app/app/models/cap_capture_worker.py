@@ -1,11 +1,19 @@
 import asyncio
+import os
 import httpx
+from dotenv import load_dotenv
 from PySide6.QtCore import QObject, Signal, QThread
 from PySide6.QtGui import QPixmap
 import cv2
 import numpy as np
 from PySide6.QtGui import QImage
 
+load_dotenv()
+
+# Số ảnh chụp liên tiếp mỗi lần quẹt thẻ (detect + OCR voting giữa các ảnh), cách nhau CAPTURE_BURST_INTERVAL giây
+CAPTURE_BURST = max(1, int(os.getenv("CAPTURE_BURST", "3")))
+CAPTURE_BURST_INTERVAL = float(os.getenv("CAPTURE_BURST_INTERVAL", "0.1"))
+
 def jpeg_bytes_to_pixmap(data: bytes) -> QPixmap:
     """Chuyển bytes JPEG thành QPixmap"""
     nparr = np.frombuffer(data, np.uint8)
@@ -19,11 +27,14 @@ def jpeg_bytes_to_pixmap(data: bytes) -> QPixmap:
     return QPixmap.fromImage(qt_image)
 
 class CameraCaptureWorker(QObject):
-    captured = Signal(bytes)
+    # List các ảnh JPEG (bytes) của 1 lần chụp, ảnh đầu tiên luôn có
+    captured = Signal(list)
 
-    def __init__(self, url: str):
+    def __init__(self, url: str, burst: int = CAPTURE_BURST, interval: float = CAPTURE_BURST_INTERVAL):
         super().__init__()
         self.url = url
+        self.burst = max(1, burst)
+        self.interval = interval
         self.running = False
 
     def start(self):
@@ -49,7 +60,9 @@ class CameraCaptureWorker(QObject):
                     r = await client.get(self.url)
                     if r.status_code == 200 and r.content:
                         print("Camera capture successful")
-                        self.captured.emit(r.content)
+                        frames = [r.content]
+                        await self._fetch_burst(client, frames)
+                        self.captured.emit(frames)
                         return
                     else:
                         print(f"HTTP error: {r.status_code}")
@@ -65,4 +78,19 @@ class CameraCaptureWorker(QObject):
             if retry_count < max_retries:
                 await asyncio.sleep(1)
         
-        print("Failed to capture image from ESP32CAM")
\ No newline at end of file
+        print("Failed to capture image from ESP32CAM")
+
+    async def _fetch_burst(self, client: httpx.AsyncClient, frames: list):
+        # Các ảnh sau của loạt chỉ thử 1 lần: lỗi thì xử lý với các ảnh đã chụp được
+        while len(frames) < self.burst and self.running:
+            await asyncio.sleep(self.interval)
+            try:
+                r = await client.get(self.url)
+            except httpx.HTTPError as e:
+                print(f"Burst capture error: {e}")
+                return
+            if r.status_code != 200 or not r.content:
+                print(f"Burst capture HTTP error: {r.status_code}")
+                return
+            frames.append(r.content)
+        print(f"Captured burst of {len(frames)} image(s)")
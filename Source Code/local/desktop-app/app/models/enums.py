@@ -7,6 +7,8 @@ class EventType(Enum):
     LOADING = 2,
     SHOW_MESS = 3,
     RECEIVED_MONTHLY_INFO = 4,
+    VEHICLE_PRESENCE = 5,
+    MODELS_READY = 6,
 
     ESP32C3_CONNECTED = 100,
     ESP32C3_UID = 101,
@@ -0,0 +1,21 @@
+from PySide6.QtCore import QObject, Signal
+
+from app.ai.inference_engine import InferenceEngine
+
+
+class ModelLoaderWorker(QObject):
+    finished = Signal(object)
+    failed = Signal(str)
+
+    def __init__(self, plate_index=None):
+        super().__init__()
+        self.plate_index = plate_index
+
+    def run(self):
+        try:
+            # Engine dùng chung cho mọi làn: model chỉ load 1 lần cho cả tiến trình
+            proccessor = InferenceEngine().load(self.plate_index)
+            self.finished.emit(proccessor)
+        except Exception as e:
+            print(f"Model loading error: {e}")
+            self.failed.emit(str(e))
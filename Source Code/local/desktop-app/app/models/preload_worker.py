@@ -0,0 +1,44 @@
+import importlib
+import sys
+import time
+
+from PySide6.QtCore import QObject, Signal
+
+# Thứ tự import: thư viện nặng trước, module của app sau (module sau chỉ tính phần chưa load)
+PRELOAD_MODULES = [
+    'numpy',
+    'cv2',
+    'torch',
+    'ultralytics',
+    'easyocr',
+    'app.ai.proccessor',
+    'app.gui.main_window',
+]
+
+
+def import_with_timings(modules=PRELOAD_MODULES) -> dict[str, float]:
+    """Import lần lượt các module, trả về thời gian import (giây) của từng module."""
+    timings = {}
+    for name in modules:
+        if name in sys.modules:
+            timings[name] = 0.0
+            continue
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except Exception as e:
+            print(f"Preload {name} error: {e}")
+        timings[name] = time.perf_counter() - start
+    return timings
+
+
+class PreloadWorker(QObject):
+    """Import trước ML stack trong nền khi cửa sổ đăng nhập đang hiển thị."""
+    finished = Signal(object)
+
+    def run(self):
+        start = time.perf_counter()
+        timings = import_with_timings()
+        report = ', '.join(f"{name}={t:.2f}s" for name, t in timings.items())
+        print(f"Preload xong sau {time.perf_counter() - start:.2f}s: {report}")
+        self.finished.emit(timings)
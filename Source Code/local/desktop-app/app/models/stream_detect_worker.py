@@ -0,0 +1,90 @@
+import threading
+import time
+
+from PySide6.QtCore import QObject, Signal
+import numpy as np
+
+from app.ai.plate_tracker import PlateTracker
+
+
+class StreamDetectWorker(QObject):
+    """Theo dõi biển số trên luồng camera khi có xe trong làn.
+
+    YOLO chỉ chạy trên keyframe, các frame ở giữa tracker tự dự đoán vị trí bbox.
+    Chỉ giữ frame mới nhất: nếu đang bận thì frame cũ bị bỏ qua.
+    """
+    plate_detected = Signal(object)
+
+    def __init__(self, detector, camera_id: str = None, keyframe_interval: int = 5):
+        super().__init__()
+        self.detector = detector
+        self.camera_id = camera_id
+        self.tracker = PlateTracker(detector.crop_plate, keyframe_interval=keyframe_interval)
+        self.running = True
+        self._frame = None
+        self._reset_requested = False
+        self._best = None
+        self._lock = threading.Lock()
+        self._has_frame = threading.Event()
+
+    def submit(self, frame: np.ndarray):
+        # Gọi từ thread của CamStreamWorker (DirectConnection)
+        with self._lock:
+            self._frame = frame
+        self._has_frame.set()
+
+    def reset(self):
+        # Xe rời làn: bỏ toàn bộ track ở lần xử lý tiếp theo
+        with self._lock:
+            self._frame = None
+            self._reset_requested = True
+
+    def stop(self):
+        self.running = False
+        self._has_frame.set()
+
+    def run(self):
+        while self.running:
+            self._has_frame.wait()
+            self._has_frame.clear()
+            if not self.running:
+                break
+
+            with self._lock:
+                frame, self._frame = self._frame, None
+                reset, self._reset_requested = self._reset_requested, False
+            if reset:
+                self.tracker.reset()
+                self._best = None
+            if frame is None:
+                continue
+
+            try:
+                self._track(frame, time.monotonic())
+            except Exception as e:
+                print(f"Stream detect error: {e}")
+
+    def _track(self, frame: np.ndarray, now: float):
+        if not self.tracker.is_keyframe():
+            self.tracker.predict(now)
+            return
+
+        boxes, scores, error = self.detector.detect_boxes_batch([frame], [self.camera_id])[0]
+        if error is not None:
+            print(f"Stream detect error: {error}")
+            return
+        self.tracker.update(frame, boxes, scores, now)
+
+        track = self.tracker.best_track()
+        if track is None or track.best_result is self._best:
+            return
+
+        # Ảnh biển số tốt nhất thay đổi: gửi cho controller
+        self._best = track.best_result
+        result = dict(track.best_result)
+        result['success'] = True
+        result['track_id'] = track.id
+        result['timestamp'] = now
+        # Top ảnh biển số của track để OCR voting giữa các frame
+        result['cropped_plates'] = [r['cropped_plate'] for r in track.best_results]
+        self.plate_detected.emit(result)
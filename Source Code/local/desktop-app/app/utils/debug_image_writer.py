@@ -0,0 +1,94 @@
+import itertools
+import os
+import queue
+import random
+import threading
+import time
+from collections import deque
+from typing import Optional
+
+import cv2
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+DEBUG_IMAGES = os.getenv("DEBUG_IMAGES", "0") == "1"
+DEBUG_IMAGES_SAMPLE_RATE = float(os.getenv("DEBUG_IMAGES_SAMPLE_RATE", "0.1"))
+DEBUG_IMAGES_MAX_FILES = int(os.getenv("DEBUG_IMAGES_MAX_FILES", "300"))
+DEBUG_IMAGES_FORMAT = os.getenv("DEBUG_IMAGES_FORMAT", ".jpg")
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp')
+
+
+class DebugImageWriter:
+    """Ghi ảnh debug ở thread nền, có lấy mẫu và giới hạn số file trên đĩa.
+
+    - sample(): quyết định có lưu lần xử lý này không (theo sample_rate), trả về prefix tên file
+    - submit(): đưa ảnh vào hàng đợi, không chặn; hàng đợi đầy thì bỏ ảnh
+    - Khi số file vượt max_files thì xoá file cũ nhất
+    """
+
+    def __init__(self, directory: str, enabled: bool = DEBUG_IMAGES, sample_rate: float = DEBUG_IMAGES_SAMPLE_RATE,
+                 max_files: int = DEBUG_IMAGES_MAX_FILES, ext: str = DEBUG_IMAGES_FORMAT,
+                 jpeg_quality: int = 80, queue_size: int = 32):
+        self.directory = directory
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.max_files = max_files
+        self.ext = ext if ext.startswith('.') else f'.{ext}'
+        self.params = [cv2.IMWRITE_JPEG_QUALITY, jpeg_quality] if self.ext in ('.jpg', '.jpeg') else []
+        self.dropped = 0
+
+        self._queue: "queue.Queue" = queue.Queue(maxsize=queue_size)
+        self._files: deque = deque()
+        self._ids = itertools.count(1)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def sample(self, force: bool = False) -> Optional[str]:
+        """Prefix tên file cho các ảnh của 1 lần xử lý, hoặc None nếu lần này không lưu."""
+        if not force and (not self.enabled or random.random() >= self.sample_rate):
+            return None
+        return f"{time.strftime('%Y%m%d_%H%M%S')}_{next(self._ids):05d}"
+
+    def submit(self, image: np.ndarray, prefix: str, step: str) -> str:
+        path = os.path.join(self.directory, f"{prefix}_{step}{self.ext}")
+        if image is None:
+            return path
+        self._ensure_started()
+        try:
+            self._queue.put_nowait((path, image))
+        except queue.Full:
+            self.dropped += 1
+        return path
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            # File debug của các lần chạy trước (tên bắt đầu bằng ngày) cũng tính vào giới hạn
+            existing = [os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                        if name[:8].isdigit() and name.lower().endswith(IMAGE_EXTENSIONS)]
+            self._files.extend(sorted(existing, key=os.path.getmtime))
+            self._thread = threading.Thread(target=self._run, name='debug-image-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            path, image = self._queue.get()
+            try:
+                to_write = image if image.dtype == np.uint8 else cv2.convertScaleAbs(image)
+                if cv2.imwrite(path, to_write, self.params):
+                    self._files.append(path)
+                self._rotate()
+            except Exception as e:
+                print(f"Debug image write error ({path}): {e}")
+
+    def _rotate(self):
+        while len(self._files) > self.max_files:
+            oldest = self._files.popleft()
+            try:
+                os.remove(oldest)
+            except OSError:
+                pass
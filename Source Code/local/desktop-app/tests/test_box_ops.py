@@ -0,0 +1,61 @@
+import numpy as np
+import pytest
+
+from app.ai.box_ops import box_area, box_iou, cluster_boxes, nms
+
+
+def test_box_area_clips_inverted_boxes():
+    areas = box_area([[0, 0, 10, 5], [5, 5, 2, 8], [0, 0, 0, 0]])
+    assert areas.tolist() == [50, 0, 0]
+
+
+def test_box_iou_matrix():
+    a = np.array([[0, 0, 10, 10], [20, 20, 30, 30]])
+    b = np.array([[0, 0, 10, 10], [5, 0, 15, 10], [100, 100, 110, 110]])
+    iou = box_iou(a, b)
+    assert iou.shape == (2, 3)
+    assert iou[0, 0] == pytest.approx(1.0)
+    assert iou[0, 1] == pytest.approx(50 / 150)
+    assert iou[0, 2] == 0 and iou[1].tolist() == [0, 0, 0]
+
+
+def test_box_iou_accepts_single_boxes_and_degenerate_boxes():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]).shape == (1, 1)
+    assert box_iou([[5, 5, 5, 5]], [[5, 5, 5, 5]])[0, 0] == 0
+
+
+def test_cluster_boxes_groups_by_iou_around_highest_scores():
+    boxes = np.array([[0, 0, 10, 10], [1, 0, 11, 10], [50, 50, 60, 60], [0, 1, 10, 11], [51, 50, 61, 60]])
+    scores = np.array([0.6, 0.9, 0.8, 0.5, 0.7])
+    labels = cluster_boxes(boxes, scores, iou_threshold=0.5)
+    # Cụm 0 có tâm là bbox score cao nhất (0.9)
+    assert labels.tolist() == [0, 0, 1, 0, 1]
+    assert cluster_boxes(np.zeros((0, 4)), np.zeros(0)).shape == (0,)
+
+
+def test_nms_keeps_one_box_per_cluster_by_score():
+    boxes = np.array([[0, 0, 10, 10], [1, 0, 11, 10], [50, 50, 60, 60], [0, 1, 10, 11]])
+    scores = np.array([0.6, 0.9, 0.8, 0.5])
+    assert nms(boxes, scores, 0.5).tolist() == [1, 2]
+    # Ngưỡng IoU cao hơn độ chồng lấn thì giữ lại tất cả
+    assert sorted(nms(boxes, scores, 0.95).tolist()) == [0, 1, 2, 3]
+
+
+def test_cluster_boxes_matches_greedy_reference_on_many_boxes():
+    rng = np.random.default_rng(0)
+    xy = rng.uniform(0, 200, (300, 2))
+    boxes = np.hstack([xy, xy + rng.uniform(20, 40, (300, 2))])
+    scores = rng.uniform(0.1, 1.0, 300)
+    labels = cluster_boxes(boxes, scores, 0.4)
+
+    # Cài đặt tham lam từng cặp (O(n²) Python) làm chuẩn so sánh
+    expected = np.full(300, -1)
+    cluster = 0
+    for seed in np.argsort(-scores, kind='stable'):
+        if expected[seed] >= 0:
+            continue
+        for j in range(300):
+            if expected[j] < 0 and (j == seed or box_iou(boxes[seed], boxes[j])[0, 0] >= 0.4):
+                expected[j] = cluster
+        cluster += 1
+    assert labels.tolist() == expected.tolist()
@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.ai.frame_quality import FrameQualityScorer
+from app.ai.proccessor import Proccessor
+from tests.test_plate_detector import PLATE, FakePrediction, make_detector
+
+
+def textured(seed=0):
+    return np.random.default_rng(seed).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+
+def blurred(frame, ksize):
+    return cv2.GaussianBlur(frame, (ksize, ksize), 0)
+
+
+BLURRY = np.full((240, 320, 3), 128, np.uint8)
+
+
+def test_pick_sharpest_prefers_sharpest_passing_frame():
+    scorer = FrameQualityScorer()
+    frames = [blurred(textured(), 3), BLURRY, textured(1)]
+    best, scores = scorer.pick_sharpest(frames)
+    assert best == 2 and [score['ok'] for score in scores] == [True, False, True]
+
+
+def test_pick_sharpest_returns_none_when_no_frame_passes():
+    best, scores = FrameQualityScorer().pick_sharpest([BLURRY, np.zeros((240, 320, 3), np.uint8)])
+    assert best is None and all(not score['ok'] for score in scores)
+
+
+def test_failed_frames_are_skipped_but_the_rest_of_the_burst_is_detected():
+    detector = make_detector([FakePrediction([PLATE], [0.9])])
+    proccessor = Proccessor(detector=detector, reader=object())
+    detections, error = proccessor.detect_frames([[BLURRY, textured()]])[0]
+    assert error is None and detections[0] is None and detections[1] is not None
+    assert detector._model.calls == [1]
+
+
+def test_burst_without_passing_frame_returns_quality_error():
+    detector = make_detector([])
+    proccessor = Proccessor(detector=detector, reader=object())
+    with pytest.raises(Exception, match="mờ"):
+        proccessor.proccess_burst([BLURRY, BLURRY.copy()])
+    assert detector._model.calls == []
+
+    # Có biển số dự phòng từ luồng camera thì dùng biển số đó thay vì báo lỗi
+    fallback = {'success': True, 'cropped_plate': np.zeros((20, 60), np.uint8)}
+    detection = proccessor.detect_frames([BLURRY])[0]
+    assert proccessor.crop_detection(BLURRY, detection, fallback) is fallback
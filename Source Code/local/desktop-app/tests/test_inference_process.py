@@ -0,0 +1,88 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.ai.inference_process import FrameRing, ProcessPipeline
+from app.utils.convert_util import ndarray_to_bytes
+
+
+@pytest.fixture
+def ring():
+    ring = FrameRing(slots=2, slot_size=64 * 1024)
+    yield ring
+    ring.close()
+
+
+def test_frame_ring_round_trips_raw_jpeg_and_burst(ring):
+    frame = np.random.default_rng(0).integers(0, 255, (32, 48, 3), dtype=np.uint8)
+    assert np.array_equal(ring.read(0, ring.write(0, frame)), frame)
+
+    decoded = ring.read(1, ring.write(1, ndarray_to_bytes(frame, '.png')))
+    assert np.array_equal(decoded, frame)
+
+    burst = [frame, ndarray_to_bytes(frame, '.png'), frame[::2, ::2]]
+    frames = ring.read(0, ring.write(0, burst))
+    assert len(frames) == 3
+    assert all(np.array_equal(a, b) for a, b in zip(frames, [frame, frame, np.ascontiguousarray(frame[::2, ::2])]))
+
+
+def test_frame_ring_rejects_data_larger_than_slot(ring):
+    with pytest.raises(ValueError):
+        ring.write(0, np.zeros(64 * 1024 + 1, np.uint8))
+    with pytest.raises(ValueError):
+        ring.write(0, [np.zeros(40 * 1024, np.uint8), np.zeros(40 * 1024, np.uint8)])
+
+
+class DeadProcess:
+    pid = 0
+
+    def is_alive(self):
+        return False
+
+
+@pytest.fixture
+def pipeline():
+    done = []
+    pipeline = ProcessPipeline(on_done=done.append, queue_size=2, slots=3, slot_size=1024)
+    pipeline.done = done
+    yield pipeline
+    pipeline._requests.cancel_join_thread()
+    pipeline.stop()
+
+
+def test_submit_limits_slots_per_lane_and_returns_slot_on_write_error(pipeline):
+    # Ảnh lớn hơn slot: job bị bỏ và slot được trả lại ngay
+    assert not pipeline.submit(np.zeros(2048, np.uint8), lane='a')
+    assert pipeline.queue_depths() == {'lane:a': 0, 'free_slots': 3}
+
+    frame = np.zeros((8, 8, 3), np.uint8)
+    assert pipeline.submit(frame, lane='a') and pipeline.submit(frame, lane='a')
+    # Mỗi làn giữ tối đa queue_size slot
+    assert not pipeline.submit(frame, lane='a')
+    assert pipeline.submit(frame, lane='b')
+    assert pipeline.queue_depths() == {'lane:a': 2, 'lane:b': 1, 'free_slots': 0}
+    # Ring đầy: làn mới cũng không lấy được slot
+    assert not pipeline.submit(frame, lane='c')
+
+
+def test_worker_failure_returns_every_slot_and_fails_pending_jobs(pipeline):
+    frame = np.zeros((8, 8, 3), np.uint8)
+    for lane in ('a', 'a', 'b'):
+        assert pipeline.submit(frame, lane=lane)
+    first, second, third = sorted(pipeline._pending)
+
+    # Tiến trình con đã chép ảnh của job đầu và trả kết quả job thứ 2 rồi chết
+    pipeline._results.put(('free', first, pipeline._pending[first][1]))
+    pipeline._results.put(('free', second, pipeline._pending[second][1]))
+    pipeline._results.put(('done', second, ('51A-12345', 'Ô tô', None, '51A12345'), None, {}, 0))
+    pipeline._process = DeadProcess()
+    listener = threading.Thread(target=pipeline._listen)
+    listener.start()
+    listener.join(timeout=5)
+
+    assert not listener.is_alive()
+    assert pipeline.queue_depths() == {'lane:a': 0, 'lane:b': 0, 'free_slots': 3}
+    results = {job.id: (job.result, job.error) for job in pipeline.done}
+    assert results[second] == (('51A-12345', 'Ô tô', None, '51A12345'), None)
+    assert results[first][1] == results[third][1] == "Tiến trình inference đã dừng"
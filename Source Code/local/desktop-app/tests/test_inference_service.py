@@ -0,0 +1,108 @@
+import socket
+import threading
+
+import numpy as np
+import pytest
+
+from app.ai.inference_service import STATUS_OK, InferenceClient, InferenceServer, RemotePipeline
+from app.ai.pipeline import PipelineJob
+from app.utils.convert_util import ndarray_to_bytes
+
+
+class FakeEngine:
+    """Trả kết quả ngay trong thread của kết nối; delay > 0 thì trả muộn để thử timeout."""
+
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.submitted = 0
+        self._lanes = {}
+
+    def register_lane(self, lane, on_done):
+        self._lanes[lane] = on_done
+
+    def unregister_lane(self, lane):
+        self._lanes.pop(lane, None)
+
+    def submit(self, lane, data, camera_id=None, fallback_detection=None, context=None, cache_scope=None):
+        self.submitted += 1
+        job = PipelineJob(data, camera_id, context=context, lane=lane)
+        job.result = ('51A12345', 'car', None, '51A12345')
+        on_done = self._lanes[lane]
+        if self.delay:
+            threading.Timer(self.delay, on_done, (job,)).start()
+        else:
+            on_done(job)
+        return True
+
+
+@pytest.fixture
+def serve():
+    servers = []
+
+    def start(engine, token=''):
+        server = InferenceServer(engine, '127.0.0.1', 0, token=token)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return server.server_address[1]
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+FRAME = np.zeros((8, 8, 3), np.uint8)
+
+
+def test_request_round_trip_with_token(serve):
+    port = serve(FakeEngine(), token='secret')
+    client = InferenceClient('127.0.0.1', port, timeout=2, token='secret')
+    status, body, _ = client.request(FRAME, 'cam-1')
+    assert status == STATUS_OK and body['plate'] == '51A12345' and body['ocr_text'] == '51A12345'
+
+
+def test_wrong_token_is_rejected_at_handshake(serve):
+    engine = FakeEngine()
+    port = serve(engine, token='secret')
+    with pytest.raises(PermissionError):
+        InferenceClient('127.0.0.1', port, timeout=2, token='wrong').request(FRAME)
+    assert engine.submitted == 0
+
+
+def test_timeout_does_not_resend_the_frame(serve):
+    engine = FakeEngine(delay=0.5)
+    port = serve(engine)
+    client = InferenceClient('127.0.0.1', port, timeout=0.1)
+    with pytest.raises(socket.timeout):
+        client.request(FRAME)
+    assert engine.submitted == 1
+
+    # Response đến muộn của request trước không bị trả nhầm cho request sau
+    engine.delay = 0.0
+    status, _, _ = client.request(FRAME)
+    assert status == STATUS_OK and engine.submitted == 2
+
+
+def test_client_reconnects_after_server_restart(serve):
+    engine = FakeEngine()
+    port = serve(engine)
+    client = InferenceClient('127.0.0.1', port, timeout=2)
+    assert client.request(FRAME)[0] == STATUS_OK
+
+    # Server thấy EOF nên đóng kết nối cũ, giống server khởi động lại trong lúc client rảnh
+    client._local.sock.shutdown(socket.SHUT_WR)
+    threading.Event().wait(0.1)
+    assert client.request(FRAME)[0] == STATUS_OK
+    assert engine.submitted == 2
+
+
+def test_remote_pipeline_sends_sharpest_frame_of_burst():
+    sharp = np.random.default_rng(0).integers(0, 255, (64, 64, 3), dtype=np.uint8)
+    blurry = np.full((64, 64, 3), 128, np.uint8)
+    pipeline = RemotePipeline(client=InferenceClient('127.0.0.1', 1))
+    job = PipelineJob([ndarray_to_bytes(blurry), ndarray_to_bytes(sharp)], None)
+    assert pipeline._pick_frame(job) == job.data[1] and job.frame_index == 1
+
+    # Không ảnh nào đạt: gửi ảnh đầu, service tự trả lỗi chất lượng
+    job = PipelineJob([blurry, blurry], None)
+    assert pipeline._pick_frame(job) is job.data[0] and job.frame_index == 0
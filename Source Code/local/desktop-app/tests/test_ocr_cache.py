@@ -0,0 +1,51 @@
+import time
+
+import numpy as np
+
+from app.ai.ocr_cache import OcrCache, dhash
+from tests.test_plate_ocr import render_plate
+
+RESULT = {'success': True, 'text': '51A12345', 'confidence': 0.9}
+
+
+def test_dhash_is_stable_for_identical_images():
+    image = render_plate(['51A12345'], 60, 150)
+    assert dhash(image) == dhash(image.copy())
+
+
+def test_near_identical_plates_of_different_cards_never_share_a_result():
+    cache = OcrCache(max_size=8, ttl=30, max_distance=6)
+    cache.put(render_plate(['51A12345'], 60, 150), RESULT, tag=('card-1', 'easyocr', True))
+    # Biển khác 1 ký tự có dHash gần như trùng nên chỉ phạm vi (UID thẻ) mới tách được 2 xe
+    other = render_plate(['51A12346'], 60, 150)
+    assert cache.get(other, tag=('card-2', 'easyocr', True)) is None
+    assert cache.get(other, tag=('card-1', 'easyocr', True))['text'] == '51A12345'
+
+
+def test_hit_returns_a_copy_and_counts_stats():
+    cache = OcrCache(max_size=8, ttl=30)
+    image = render_plate(['51A12345'], 60, 150)
+    cache.put(image, RESULT, tag='card-1')
+    hit = cache.get(image, tag='card-1')
+    hit['text'] = 'changed'
+    assert cache.get(image, tag='card-1')['text'] == '51A12345'
+    assert cache.get(np.zeros((40, 160), np.uint8), tag='card-1') is None
+    assert cache.stats()['hits'] == 2 and cache.stats()['misses'] == 1
+
+
+def test_entries_expire_and_lru_is_bounded():
+    cache = OcrCache(max_size=2, ttl=0.05)
+    images = [np.random.default_rng(i).integers(0, 255, (40, 160), dtype=np.uint8) for i in range(3)]
+    for i, image in enumerate(images):
+        cache.put(image, {**RESULT, 'text': str(i)}, tag='card')
+    assert cache.stats()['size'] == 2
+    assert cache.get(images[0], tag='card') is None
+    time.sleep(0.1)
+    assert cache.get(images[2], tag='card') is None
+
+
+def test_disabled_cache_stores_nothing():
+    cache = OcrCache(max_size=0)
+    image = render_plate(['51A12345'], 60, 150)
+    cache.put(image, RESULT)
+    assert cache.get(image) is None
@@ -0,0 +1,84 @@
+import pytest
+
+from app.ai import proccessor as proccessor_module
+from app.ai.proccessor import CASCADE_ACCEPT_CONF, Proccessor
+from app.ai.stage_metrics import StageTimer
+
+
+class StubEnhancer:
+    profile = 'fast'
+
+    def enhance(self, image, profile=None):
+        return f"{profile}:{image}"
+
+
+class StubDetector:
+    enhancer = StubEnhancer()
+
+
+class StubReader:
+    """Trả lần lượt các kết quả OCR đã chuẩn bị, ghi lại (ảnh, engine) của từng lần đọc."""
+
+    native = object()
+
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = []
+
+    def read_plate_with_frame(self, image, engine=None, fallback=True, cache_scope=None):
+        self.calls.append((image, engine))
+        return self.results.pop(0)
+
+
+def ocr(text, confidence, engine, raw_text=None, success=True):
+    return {'text': text, 'raw_text': raw_text or text, 'confidence': confidence, 'success': success,
+            'engine': engine, 'error': None if success else 'Không đọc được'}
+
+
+def run_cascade(reader):
+    proccessor = Proccessor(detector=StubDetector(), reader=reader)
+    detect_result = {'cropped_plate': 'crop', 'raw_plate': 'raw'}
+    return proccessor._read_cascade(detect_result, StageTimer())
+
+
+@pytest.fixture(autouse=True)
+def cascade_stages(monkeypatch):
+    monkeypatch.setattr(proccessor_module, 'CASCADE_STAGES',
+                        (('fast', 'native'), ('advanced', 'native'), ('advanced', 'easyocr')))
+
+
+def test_confident_first_stage_exits_early():
+    reader = StubReader(ocr('51A12345', CASCADE_ACCEPT_CONF, 'native'))
+    assert run_cascade(reader) == ('51A-12345', 'Ô tô', 'crop', '51A12345')
+    assert reader.calls == [('crop', 'native')]
+
+
+def test_failed_native_skips_remaining_native_stages():
+    reader = StubReader(ocr('', 0.0, 'native', success=False), ocr('59X12345', 0.95, 'easyocr'))
+    assert run_cascade(reader)[0] == '59X-12345'
+    assert reader.calls == [('crop', 'native'), ('advanced:raw', 'easyocr')]
+
+
+def test_confidence_is_not_compared_across_engines():
+    # Native tự tin hơn theo thang đo của nó, nhưng bước EasyOCR (đắt hơn, chạy sau) được ưu tiên
+    reader = StubReader(ocr('51A12345', 0.8, 'native'), ocr('51A12346', 0.7, 'native'),
+                        ocr('51A12347', 0.3, 'easyocr'))
+    assert run_cascade(reader)[0] == '51A-12347'
+
+
+def test_same_engine_keeps_higher_confidence():
+    reader = StubReader(ocr('51A12345', 0.6, 'native'), ocr('51A12346', 0.7, 'native'),
+                        ocr('', 0.0, 'easyocr', success=False))
+    assert run_cascade(reader)[0] == '51A-12346'
+
+
+def test_raw_valid_result_beats_corrected_one():
+    reader = StubReader(ocr('51A12345', 0.5, 'native'), ocr('51A12346', 0.4, 'native'),
+                        ocr('51A12347', 0.84, 'easyocr', raw_text='5lA12347'))
+    assert run_cascade(reader) == ('51A-12345', 'Ô tô', 'crop', '51A12345')
+
+
+def test_no_valid_stage_raises():
+    reader = StubReader(ocr('ABC', 0.9, 'native'), ocr('ABC', 0.9, 'native'), ocr('ABC', 0.9, 'easyocr'))
+    with pytest.raises(Exception, match="Validate plate failed"):
+        run_cascade(reader)
@@ -0,0 +1,30 @@
+import pytest
+
+from app.ai.ocr_fusion import fuse_readings, normalize_plate_text
+
+
+def test_normalize_strips_separators_and_uppercases():
+    assert normalize_plate_text(' 51a-123.45 ') == '51A12345'
+    assert normalize_plate_text('29-B1 123,45') == '29B112345'
+
+
+def test_votes_per_position_weighted_by_confidence():
+    text, conf = fuse_readings([('51A-123.45', 0.9, None), ('51A12346', 0.6, None), ('51A12345', 0.7, None)])
+    assert text == '51A12345'
+    # Vị trí cuối: '5' có 0.9 + 0.7 trên 3 lần đọc, các vị trí khác đủ 2.2 / 3
+    assert conf == pytest.approx((7 * 2.2 / 3 + 1.6 / 3) / 8)
+
+
+def test_char_confidences_override_string_confidence():
+    readings = [('51A12345', 0.9, [0.9] * 7 + [0.1]), ('51A12346', 0.5, [0.5] * 8)]
+    assert fuse_readings(readings)[0] == '51A12346'
+
+
+def test_length_group_with_most_confidence_wins():
+    readings = [('51A1234', 0.95, None), ('51A12345', 0.6, None), ('51A12345', 0.6, None)]
+    assert fuse_readings(readings)[0] == '51A12345'
+
+
+def test_no_usable_reading():
+    assert fuse_readings([]) == ('N/A', 0.0)
+    assert fuse_readings([('', 0.9, None), ('51A12345', 0.0, None)]) == ('N/A', 0.0)
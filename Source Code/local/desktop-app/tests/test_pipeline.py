@@ -0,0 +1,181 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from app.ai.inference_engine import InferenceEngine
+from app.ai.pipeline import PlatePipeline
+
+FRAME = np.zeros((8, 8, 3), np.uint8)
+
+
+class StubProccessor:
+    """Detect/crop/OCR giả: biển số là context của job, ghi lại kích thước các batch detect."""
+
+    def __init__(self, gate: threading.Event = None):
+        self.detect_batches = []
+        self.gate = gate
+        self.detecting = threading.Event()
+
+    def detect_frames(self, frames, camera_ids=None, timers=None):
+        self.detecting.set()
+        if self.gate is not None:
+            self.gate.wait(5)
+        self.detect_batches.append(len(frames))
+        return [([(np.zeros((1, 4)), np.ones(1))], None) for _ in frames]
+
+    def crop_detection(self, frames, detection, fallback_detection=None, timer=None):
+        return {'success': True, 'cropped_plate': frames[0], 'frame_index': 0}
+
+    def read_and_validate(self, detect_result, timer=None, cache_scope=None):
+        if cache_scope == 'bad':
+            raise Exception("Validate plate failed")
+        return '51A-12345', 'Ô tô', detect_result['cropped_plate'], '51A12345'
+
+
+def take(pipeline, count):
+    """Lấy count job như stage decode (không chạy thread của pipeline)."""
+    return [pipeline._next_lane_job().context for _ in range(count)]
+
+
+def wait_until(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Hết thời gian chờ"
+        time.sleep(0.01)
+
+
+@pytest.fixture
+def running():
+    pipelines = []
+
+    def start(proccessor, **kwargs):
+        done = []
+        pipeline = PlatePipeline(proccessor, on_done=done.append, workers={'ocr': 1}, **kwargs)
+        pipeline.start()
+        pipelines.append(pipeline)
+        return pipeline, done
+
+    yield start
+    for pipeline in pipelines:
+        pipeline.stop()
+
+
+def test_submit_returns_false_when_lane_queue_is_full():
+    pipeline = PlatePipeline(StubProccessor(), queue_size=2)
+    assert pipeline.submit(FRAME, lane='a') and pipeline.submit(FRAME, lane='a')
+    assert not pipeline.submit(FRAME, lane='a')
+    # Làn khác có hàng đợi riêng
+    assert pipeline.submit(FRAME, lane='b')
+
+
+def test_jobs_finish_in_order_with_results_and_timings(running):
+    pipeline, done = running(StubProccessor(), queue_size=8)
+    for i in range(5):
+        assert pipeline.submit(FRAME, context=i, cache_scope='bad' if i == 2 else None)
+    wait_until(lambda: len(done) == 5)
+
+    assert [job.context for job in done] == [0, 1, 2, 3, 4]
+    assert [job.error for job in done] == [None, None, "Validate plate failed", None, None]
+    assert done[0].result == ('51A-12345', 'Ô tô', FRAME, '51A12345')
+    assert {'queue', 'decode'} <= set(done[0].timings)
+
+
+def test_job_callback_overrides_pipeline_callback(running):
+    pipeline, done = running(StubProccessor())
+    own = []
+    pipeline.submit(FRAME, on_done=own.append)
+    wait_until(lambda: len(own) == 1)
+    assert done == []
+
+
+def test_waiting_jobs_are_detected_in_one_batch(running):
+    gate = threading.Event()
+    proccessor = StubProccessor(gate)
+    pipeline, done = running(proccessor, detect_batch_size=4)
+    pipeline.submit(FRAME, context=0)
+    assert proccessor.detecting.wait(5)
+    # Job đầu đang chờ trong detect, 3 job sau dồn lại ở hàng đợi detect
+    for i in range(1, 4):
+        pipeline.submit(FRAME, context=i)
+    wait_until(lambda: pipeline.queue_depths()['detect'] == 3)
+    gate.set()
+    wait_until(lambda: len(done) == 4)
+    assert proccessor.detect_batches == [1, 3]
+
+
+def test_stop_ends_every_stage_thread(running):
+    pipeline, done = running(StubProccessor())
+    pipeline.submit(FRAME)
+    wait_until(lambda: len(done) == 1)
+    pipeline.stop()
+    for thread in pipeline._threads:
+        thread.join(timeout=5)
+    assert not any(thread.is_alive() for thread in pipeline._threads)
+
+
+def test_lanes_are_served_round_robin():
+    pipeline = PlatePipeline(StubProccessor())
+    for i in range(3):
+        pipeline.submit(FRAME, context=f"a{i}", lane='a')
+    pipeline.submit(FRAME, context='b0', lane='b')
+    assert pipeline.queue_depths() == {'lane:a': 3, 'lane:b': 1, 'detect': 0, 'crop': 0, 'ocr': 0}
+
+    # Làn đông xe không chặn làn kia: b0 được lấy ngay sau job đầu của làn a
+    assert take(pipeline, 4) == ['a0', 'b0', 'a1', 'a2']
+    assert pipeline.queue_depths()['lane:a'] == 0
+
+
+def test_removed_lane_is_kept_until_its_jobs_are_taken():
+    pipeline = PlatePipeline(StubProccessor())
+    pipeline.add_lane('empty')
+    pipeline.remove_lane('empty')
+    assert 'lane:empty' not in pipeline.queue_depths()
+
+    pipeline.submit(FRAME, context='a0', lane='a')
+    pipeline.submit(FRAME, context='a1', lane='a')
+    pipeline.remove_lane('a')
+    assert pipeline.queue_depths()['lane:a'] == 2
+    assert take(pipeline, 2) == ['a0', 'a1']
+    assert 'lane:a' not in pipeline.queue_depths()
+
+
+def test_lane_added_again_before_draining_is_not_removed():
+    pipeline = PlatePipeline(StubProccessor())
+    pipeline.submit(FRAME, context='a0', lane='a')
+    pipeline.remove_lane('a')
+    pipeline.add_lane('a')
+    assert take(pipeline, 1) == ['a0']
+    assert 'lane:a' in pipeline.queue_depths()
+
+
+@pytest.fixture
+def engine(monkeypatch):
+    monkeypatch.setattr(InferenceEngine, '_instance', None)
+    engine = InferenceEngine()
+    engine.pipeline = PlatePipeline(StubProccessor())
+    return engine
+
+
+def test_engine_lanes_share_one_pipeline(engine):
+    done = []
+    engine.register_lane('in', done.append)
+    engine.register_lane('out', done.append)
+    assert engine.submit('in', FRAME, context='in0') and engine.submit('out', FRAME, context='out0')
+    assert engine.queue_depths() == {'lane:in': 1, 'lane:out': 1, 'detect': 0, 'crop': 0, 'ocr': 0}
+
+    with pytest.raises(ValueError):
+        engine.submit('unknown', FRAME)
+
+
+def test_engine_unregister_lane_drains_pending_jobs(engine):
+    engine.register_lane('in', lambda job: None)
+    engine.submit('in', FRAME, context='in0')
+    engine.unregister_lane('in')
+    assert engine.queue_depths()['lane:in'] == 1
+    with pytest.raises(ValueError):
+        engine.submit('in', FRAME)
+
+    assert take(engine.pipeline, 1) == ['in0']
+    assert 'lane:in' not in engine.queue_depths()
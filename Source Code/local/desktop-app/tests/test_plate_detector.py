@@ -0,0 +1,132 @@
+import threading
+
+import numpy as np
+import pytest
+
+from app.ai.plate_detector import PlateDetector
+from app.ai.plate_enhancer import PlateEnhancer
+from app.ai.proccessor import Proccessor
+from app.ai.roi import CameraConfig
+
+
+class FakeTensor:
+    def __init__(self, values):
+        self.values = np.asarray(values, dtype=np.float32)
+
+    def cpu(self):
+        return self
+
+    def numpy(self):
+        return self.values
+
+
+class FakePrediction:
+    names = {0: 'License_Plate', 1: 'Car'}
+
+    def __init__(self, boxes, scores, classes=None):
+        self.boxes = type('Boxes', (), {})()
+        self.boxes.xyxy = FakeTensor(np.asarray(boxes, dtype=np.float32).reshape(-1, 4))
+        self.boxes.conf = FakeTensor(scores)
+        self.boxes.cls = FakeTensor(classes if classes is not None else [0] * len(scores))
+
+
+class FakeModel:
+    """Trả lần lượt các prediction đã chuẩn bị, mỗi ảnh đưa vào model lấy 1 prediction."""
+
+    def __init__(self, predictions):
+        self.predictions = list(predictions)
+        self.calls = []
+
+    def __call__(self, images, **kwargs):
+        self.calls.append(len(images))
+        taken, self.predictions = self.predictions[:len(images)], self.predictions[len(images):]
+        return taken
+
+
+def make_detector(predictions, batch_size=8):
+    detector = PlateDetector.__new__(PlateDetector)
+    detector._conf_threshold = 0.3
+    detector.nms_threshold = 0.5
+    detector.batch_size = batch_size
+    detector.imgsz = 640
+    detector.enhancer = PlateEnhancer('fast')
+    detector._model_lock = threading.Lock()
+    detector._cameras = {}
+    detector._default_camera = CameraConfig(imgsz=640)
+    detector._model = FakeModel(predictions)
+    return detector
+
+
+def frame(value=0):
+    image = np.full((240, 320, 3), value, np.uint8)
+    image[100:140, 80:240] = 255 - value
+    return image
+
+
+PLATE = [80, 100, 240, 140]
+SHIFTED = [84, 102, 244, 142]
+OTHER = [10, 10, 70, 30]
+TINY = [10, 10, 40, 20]
+
+
+def test_burst_is_voted_into_one_result_with_extra_crops():
+    detector = make_detector([
+        FakePrediction([PLATE, OTHER], [0.6, 0.9]),
+        FakePrediction([SHIFTED], [0.8]),
+        FakePrediction([PLATE], [0.7]),
+    ])
+    results = detector.detect_plates_batch([frame(), frame(10), frame(20)], bursts=['lane', 'lane', 'lane'])
+
+    # Cụm biển số xuất hiện ở cả 3 frame thắng bbox đơn lẻ conf cao hơn
+    assert len(results) == 1
+    result = results[0]
+    assert result['frame_index'] == 1 and result['confidence'] == pytest.approx(0.8)
+    assert len(result['cropped_plates']) == 3
+    assert len(result['boxes']) == 4
+    assert detector._model.calls == [3]
+
+
+def test_frames_without_burst_are_voted_separately():
+    detector = make_detector([FakePrediction([PLATE], [0.9]), FakePrediction(np.zeros((0, 4)), [])])
+    results = detector.detect_plates_batch([frame(), frame()])
+    assert [r['cropped_plate'] is not None for r in results] == [True, False]
+    assert 'cropped_plates' not in results[0]
+
+
+def test_vote_across_frames_skips_missing_frames():
+    detector = make_detector([])
+    vote = detector.vote_across_frames([None, (np.array([PLATE], np.float32), np.array([0.5], np.float32))])
+    frame_ids, boxes, scores, members = vote
+    assert frame_ids.tolist() == [1] and members.tolist() == [0]
+
+    empty = detector.vote_across_frames([None, None])
+    assert len(empty[3]) == 0
+    assert detector.crop_vote([frame(), frame()], empty)['cropped_plate'] is None
+
+
+def test_detect_plate_with_frames_ignores_unreadable_frames():
+    detector = make_detector([FakePrediction([PLATE], [0.5]), FakePrediction([SHIFTED], [0.9])])
+    result = detector.detect_plate_with_frames([frame(), None, frame(30)])
+    assert result['success'] and result['frame_index'] == 1 and len(result['cropped_plates']) == 2
+
+
+def test_proccessor_detects_every_burst_in_one_batch():
+    sharp = np.random.default_rng(0).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+    sharp[100:140, 80:240] = 255
+    detector = make_detector([
+        FakePrediction([PLATE], [0.6]),
+        FakePrediction([SHIFTED], [0.9]),
+        FakePrediction([TINY], [0.8]),
+    ])
+    proccessor = Proccessor(detector=detector, reader=object())
+    bursts = [[sharp, sharp.copy()], sharp.copy()]
+    detections = proccessor.detect_frames(bursts, ['cam-1', 'cam-2'])
+    assert detector._model.calls == [3]
+    assert [error for _, error in detections] == [None, None]
+
+    result = proccessor.crop_detection(bursts[0], detections[0])
+    assert result['success'] and result['frame_index'] == 1 and len(result['cropped_plates']) == 2
+
+    # Biển số quá nhỏ bị loại trước khi cắt, không có ảnh dự phòng thì báo lỗi
+    with pytest.raises(Exception, match="quá nhỏ"):
+        proccessor.crop_detection(bursts[1], detections[1])
@@ -0,0 +1,41 @@
+from app.ai.plate_index import BKTree, PlateIndex, edit_distance
+
+
+def test_edit_distance():
+    assert edit_distance('51A12345', '51A12345') == 0
+    assert edit_distance('51A12345', '51A12346') == 1
+    assert edit_distance('51A12345', '51A1234') == 1
+    assert edit_distance('', 'ABC') == 3
+
+
+def test_bk_tree_search_matches_brute_force():
+    words = ['51A12345', '51A12346', '30F99999', '29B112345', '51A1234', '43C56789']
+    tree = BKTree()
+    for word in words:
+        tree.add(word)
+    for query in ('51A12344', '29B11234', '43C5678'):
+        for max_distance in (0, 1, 2):
+            expected = sorted((edit_distance(query, w), w) for w in words if edit_distance(query, w) <= max_distance)
+            assert tree.search(query, max_distance) == expected
+
+
+def test_index_normalizes_plates():
+    index = PlateIndex()
+    assert index.add('51A-123.45')
+    assert not index.add('51a12345')
+    assert '51A-12345' in index and len(index) == 1
+    assert index.snapshot() == {'51A12345'}
+
+
+def test_snap_prefers_exact_then_unique_neighbour():
+    index = PlateIndex()
+    index.add_many(['51A12345', '30F99999'])
+    assert index.snap(['51A12845', '30F99999']) == '30F99999'
+    assert index.snap(['51A1234S']) == '51A12345'
+    assert index.snap(['N/A', '']) is None
+
+
+def test_snap_refuses_ambiguous_neighbours():
+    index = PlateIndex()
+    index.add_many(['51A12345', '51A12346'])
+    assert index.snap(['51A12347']) is None
@@ -0,0 +1,64 @@
+import numpy as np
+
+from app.ai.plate_layout import (apply_plate_grammar, assemble_lines, binarize, join_lines, order_lines,
+                                 reading_order, split_lines)
+from tests.test_plate_ocr import prepare, render_plate
+
+
+def test_binarize_makes_characters_white_whatever_the_padding_or_plate_polarity():
+    plate = prepare(render_plate(['51A12345'], 60, 220))
+    for image in (plate, prepare(render_plate(['51A12345'], 60, 30)), 255 - plate):
+        binary = binarize(image)
+        h, w = binary.shape
+        interior = binary[h // 4:h - h // 4, w // 4:w - w // 4]
+        # Trong biển số, ký tự (trắng) chiếm ít pixel hơn nền
+        assert 0 < np.count_nonzero(interior) < interior.size // 2
+
+
+def test_split_lines_keeps_long_plates_and_splits_square_ones():
+    one_line = prepare(render_plate(['51A12345'], 60, 220))
+    assert split_lines(one_line) == [[0, one_line.shape[1], 0, one_line.shape[0]]]
+
+    two_line = prepare(render_plate(['29B1', '12345'], 90, 220))
+    lines = split_lines(two_line)
+    assert len(lines) == 2
+    (_, _, _, top_bottom), (_, _, bottom_top, _) = lines
+    h = two_line.shape[0]
+    assert 0.3 * h < bottom_top <= top_bottom < 0.7 * h
+
+
+def test_reading_order_groups_boxes_into_lines():
+    def box(x, y, w=20, h=30):
+        return [[x, y], [x + w, y], [x + w, y + h], [x, y + h]]
+
+    boxes = [box(60, 50), box(10, 0), box(10, 52), box(40, 2)]
+    assert reading_order(boxes) == [[1, 3], [2, 0]]
+
+
+def test_plate_grammar_fixes_characters_by_position():
+    assert apply_plate_grammar('S1-81 234S') == '51B12345'
+    assert apply_plate_grammar('29-B1 O12.34') == '29B101234'
+    # Quá ngắn thì không đoán vị trí
+    assert apply_plate_grammar('S1A') == 'S1A'
+
+
+def test_join_lines_puts_top_line_on_the_left():
+    gray = np.full((100, 140), 200, np.uint8)
+    gray[10:40, 20:30] = 10   # dòng trên
+    gray[60:90, 100:110] = 10  # dòng dưới
+    joined = join_lines(gray, [[0, 140, 0, 50], [0, 140, 50, 100]])
+    assert joined.shape == (50, 140 + 25 + 140)
+    ink_columns = np.where((joined < 100).any(axis=0))[0]
+    assert ink_columns.min() == 20 and ink_columns.max() == 140 + 25 + 109
+
+
+def test_join_lines_resizes_lines_to_the_same_height():
+    gray = np.full((90, 120), 200, np.uint8)
+    joined = join_lines(gray, [[0, 120, 0, 30], [0, 120, 30, 90]])
+    assert joined.shape == (60, 240 + 30 + 120)
+
+
+def test_order_lines_keeps_raw_text_and_assemble_applies_grammar():
+    assert order_lines(['12345', '29-B1']) == '29B112345'
+    assert order_lines(['S1A-1234O']) == 'S1A1234O'
+    assert assemble_lines(['S1A-1234O']) == '51A12340'
@@ -0,0 +1,88 @@
+import cv2
+import numpy as np
+import pytest
+
+from app.ai.plate_enhancer import PlateEnhancer
+from app.ai.plate_ocr import NativePlateRecognizer, find_char_boxes, group_lines
+from app.ai.plate_layout import binarize
+
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+DETECTOR_PAD = 20  # PlateDetector.crop_plate
+
+
+def render_plate(lines, plate_h, background, pad=DETECTOR_PAD):
+    """Biển trắng chữ đen có viền, đặt trên nền xám `background` với padding như ảnh cắt từ detector."""
+    plate_w = int(plate_h * (1.4 if len(lines) == 2 else 4.7))
+    plate = np.full((plate_h, plate_w), 235, np.uint8)
+    cv2.rectangle(plate, (1, 1), (plate_w - 2, plate_h - 2), 20, max(1, plate_h // 30))
+    line_h = plate_h / len(lines)
+    for i, text in enumerate(lines):
+        char_h = int(line_h * 0.6)
+        thickness = max(1, char_h // 9)
+        scale = cv2.getFontScaleFromHeight(FONT, char_h, thickness)
+        widths = [cv2.getTextSize(char, FONT, scale, thickness)[0][0] for char in text]
+        gap = max(2, char_h // 6)
+        x = (plate_w - sum(widths) - gap * (len(text) - 1)) // 2
+        y = int(line_h * i + (line_h + char_h) / 2)
+        for char, width in zip(text, widths):
+            cv2.putText(plate, char, (x, y), FONT, scale, 20, thickness)
+            x += width + gap
+    image = np.full((plate_h + 2 * pad, plate_w + 2 * pad), background, np.uint8)
+    image[pad:pad + plate_h, pad:pad + plate_w] = plate
+    return cv2.cvtColor(image, cv2.COLOR_GRAY2BGR)
+
+
+def prepare(image):
+    """Giống đường đi thật: PlateEnhancer('fast') rồi PlateReader phóng to lên rộng 600px."""
+    gray = PlateEnhancer('fast').enhance(image)
+    h, w = gray.shape[:2]
+    if w < 600:
+        gray = cv2.resize(gray, (600, int(h * 600 / w)), interpolation=cv2.INTER_CUBIC)
+    return gray
+
+
+@pytest.fixture(scope='module')
+def recognizer():
+    return NativePlateRecognizer(templates_dir=None)
+
+
+@pytest.mark.parametrize('background', [30, 60, 150, 200])
+@pytest.mark.parametrize('plate_h', [30, 60, 100, 160])
+def test_reads_padded_one_line_crop(recognizer, plate_h, background):
+    text, conf, char_confs = recognizer.read(prepare(render_plate(['51A12345'], plate_h, background)))
+    assert text == '51A12345'
+    assert len(char_confs) == 8
+    assert conf > 0.8
+
+
+@pytest.mark.parametrize('background', [30, 60, 150, 200])
+@pytest.mark.parametrize('plate_h', [60, 100, 140])
+def test_reads_padded_two_line_crop(recognizer, plate_h, background):
+    text, conf, _ = recognizer.read(prepare(render_plate(['29B1', '12345'], plate_h, background)))
+    assert text == '29B112345'
+    assert conf > 0.8
+
+
+@pytest.mark.parametrize('pad', [0, DETECTOR_PAD])
+def test_reads_light_text_on_dark_plate(recognizer, pad):
+    image = 255 - render_plate(['51A12345'], 60, 60, pad=pad)
+    assert recognizer.read(prepare(image))[0] == '51A12345'
+
+
+def test_polarity_comes_from_plate_interior():
+    # Nền tối quanh biển chiếm phần lớn ảnh nhưng ký tự vẫn phải là màu trắng
+    binary = binarize(prepare(render_plate(['51A12345'], 30, 30)))
+    h, w = binary.shape
+    interior = binary[h // 4:h - h // 4, w // 4:w - w // 4]
+    assert cv2.countNonZero(interior) < interior.size // 2
+
+
+def test_groups_two_lines_in_reading_order():
+    boxes, _ = find_char_boxes(binarize(prepare(render_plate(['29B1', '12345'], 100, 150))))
+    lines = group_lines(boxes)
+    assert [len(line) for line in lines] == [4, 5]
+    assert all(a[0] < b[0] for line in lines for a, b in zip(line, line[1:]))
+
+
+def test_blank_plate_is_not_read(recognizer):
+    assert recognizer.read(prepare(render_plate([''], 60, 150))) == ('N/A', 0.0, [])
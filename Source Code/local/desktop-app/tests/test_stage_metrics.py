@@ -0,0 +1,57 @@
+import pytest
+
+from app.ai.stage_metrics import StageMetrics, StageTimer, format_timings
+
+
+def test_timer_accumulates_repeated_stages():
+    timer = StageTimer()
+    timer.add('ocr', 1_000_000)
+    timer.add('ocr', 2_000_000)
+    with timer.stage('detect'):
+        pass
+    assert timer.timings['ocr'] == 3_000_000
+    assert timer.total_ns == 3_000_000 + timer.timings['detect']
+
+
+def test_timer_records_stage_even_when_it_raises():
+    timer = StageTimer()
+    with pytest.raises(ValueError):
+        with timer.stage('decode'):
+            raise ValueError
+    assert 'decode' in timer.timings
+
+
+def test_format_timings():
+    assert format_timings({'detect': 12_340_000, 'ocr': 500_000}) == 'detect=12.3ms, ocr=0.5ms'
+
+
+def test_snapshot_percentiles_over_window_with_total_last():
+    metrics = StageMetrics(window=100, log_every=0)
+    for ms in range(1, 101):
+        metrics.record({'ocr': ms * 1_000_000, 'detect': 1_000_000})
+    stats = metrics.snapshot()
+    assert list(stats) == ['ocr', 'detect', 'total']
+    assert stats['ocr']['count'] == 100
+    assert stats['ocr']['p50_ms'] == pytest.approx(50.5)
+    assert stats['ocr']['p99_ms'] == pytest.approx(99.01)
+    assert stats['total']['p50_ms'] == pytest.approx(51.5)
+
+
+def test_window_is_bounded_and_reset_clears():
+    metrics = StageMetrics(window=3, log_every=0)
+    for ms in (100, 1, 2, 3):
+        metrics.record({'ocr': ms * 1_000_000})
+    metrics.record({})
+    assert metrics.snapshot()['ocr']['count'] == 3
+    assert metrics.snapshot()['ocr']['p99_ms'] < 4
+    metrics.reset()
+    assert metrics.snapshot() == {}
+
+
+def test_logs_every_n_jobs(caplog):
+    metrics = StageMetrics(window=10, log_every=2)
+    with caplog.at_level('INFO', logger='app.ai.stage_metrics'):
+        metrics.record({'ocr': 1})
+        assert not caplog.records
+        metrics.record({'ocr': 1})
+    assert len(caplog.records) == 1
@@ -0,0 +1,62 @@
+"""Tạo template ký tự cho OCR native từ ảnh biển số thật đã gán nhãn.
+
+Chạy từ thư mục desktop-app:
+    python -m tools.build_char_templates --images <thư mục ảnh biển số> [--output app/ai/plate_templates]
+
+Tên file ảnh (phần trước dấu '_' đầu tiên) là số biển, ví dụ `51A-123.45_2.jpg`.
+Chỉ những ảnh tách được đúng số ký tự như nhãn mới được dùng.
+"""
+import argparse
+import glob
+import os
+from collections import Counter
+
+import cv2
+
+from app.ai.ocr_fusion import normalize_plate_text
+from app.ai.plate_enhancer import PlateEnhancer
+from app.ai.plate_ocr import DEFAULT_TEMPLATES_DIR, PLATE_ALLOWLIST, segment_plate_chars
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tạo template ký tự biển số cho OCR native")
+    parser.add_argument('--images', required=True, help="Thư mục ảnh biển số đã cắt, tên file là số biển")
+    parser.add_argument('--output', default=DEFAULT_TEMPLATES_DIR)
+    parser.add_argument('--profile', default='fast', help="Profile PlateEnhancer dùng trước khi tách ký tự")
+    args = parser.parse_args()
+
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(args.images, pattern)))
+    if not paths:
+        parser.error(f"Không có ảnh trong {args.images}")
+
+    os.makedirs(args.output, exist_ok=True)
+    enhancer = PlateEnhancer(args.profile)
+    used, counts = 0, Counter()
+    for path in paths:
+        stem = os.path.splitext(os.path.basename(path))[0]
+        label = normalize_plate_text(stem.split('_')[0])
+        image = cv2.imread(path)
+        if image is None or not label or any(c not in PLATE_ALLOWLIST for c in label):
+            print(f"Bỏ qua {path}: không đọc được ảnh hoặc nhãn không hợp lệ")
+            continue
+
+        chars = segment_plate_chars(enhancer.enhance(image))
+        if len(chars) != len(label):
+            print(f"Bỏ qua {path}: tách được {len(chars)} ký tự, nhãn có {len(label)}")
+            continue
+
+        for i, (char, char_image) in enumerate(zip(label, chars)):
+            cv2.imwrite(os.path.join(args.output, f"{char}_{stem}_{i}.png"), char_image)
+            counts[char] += 1
+        used += 1
+
+    print(f"\nDùng {used}/{len(paths)} ảnh, {sum(counts.values())} template ký tự → {args.output}")
+    missing = [c for c in PLATE_ALLOWLIST if counts[c] == 0]
+    if missing:
+        print(f"Chưa có template thật cho: {' '.join(missing)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""Báo cáo thời gian import theo từng module (dựa trên `python -X importtime`).
+
+Chạy từ thư mục desktop-app:
+    python -m tools.import_report                       # đo module mở cửa sổ đăng nhập
+    python -m tools.import_report --module app.ai.proccessor --top 30
+
+Trả về exit code 1 nếu module được đo kéo theo thư viện nặng trong --forbid,
+để phát hiện regression làm chậm lúc mở app.
+"""
+import argparse
+import subprocess
+import sys
+from typing import List, Tuple
+
+DEFAULT_MODULE = 'app.gui.login_window'
+HEAVY_MODULES = ['torch', 'ultralytics', 'easyocr', 'cv2', 'skimage', 'scipy']
+
+
+def measure_imports(module: str) -> List[Tuple[str, int, int]]:
+    """Import module trong process mới, trả về (tên, self_us, cumulative_us) cho từng module."""
+    proc = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1] if proc.stderr else 'import thất bại')
+
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Báo cáo thời gian import theo module")
+    parser.add_argument('--module', default=DEFAULT_MODULE)
+    parser.add_argument('--top', type=int, default=20, help="Số module chậm nhất cần in")
+    parser.add_argument('--forbid', nargs='*', default=HEAVY_MODULES,
+                        help="Module gốc không được phép bị import")
+    args = parser.parse_args()
+
+    rows = measure_imports(args.module)
+    total_us = sum(self_us for _, self_us, _ in rows)
+    print(f"Import '{args.module}': {len(rows)} module, tổng {total_us / 1e6:.3f}s")
+
+    print(f"\n{'cumulative ms':>14}{'self ms':>10}  module")
+    for name, self_us, cumulative_us in sorted(rows, key=lambda r: -r[2])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {name}")
+
+    imported_roots = {name.split('.')[0] for name, _, _ in rows}
+    violations = sorted(set(args.forbid) & imported_roots)
+    if violations:
+        print(f"\nCẢNH BÁO: '{args.module}' import thư viện nặng: {', '.join(violations)}")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
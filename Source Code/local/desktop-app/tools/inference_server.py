@@ -0,0 +1,47 @@
+"""Chạy inference service cục bộ: máy này giữ model, các app desktop đặt INFERENCE_MODE=remote để gửi ảnh tới.
+
+Chạy từ thư mục desktop-app:
+    python -m tools.inference_server [--host 127.0.0.1] [--port 8765] [--mode thread|process]
+
+Service không mã hoá dữ liệu, chỉ mở ra mạng LAN nội bộ; đặt INFERENCE_SERVICE_TOKEN để từ chối các máy lạ.
+"""
+import argparse
+
+from app.ai.inference_engine import InferenceEngine
+from app.ai.inference_service import (INFERENCE_SERVICE_HOST, INFERENCE_SERVICE_MAX_INFLIGHT,
+                                      INFERENCE_SERVICE_PORT, INFERENCE_SERVICE_TOKEN, InferenceServer)
+from app.ai.pipeline import DEFAULT_QUEUE_SIZE
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inference service nhận dạng biển số")
+    parser.add_argument('--host', default=INFERENCE_SERVICE_HOST,
+                        help="Địa chỉ lắng nghe; 0.0.0.0 để các bốt khác trong mạng LAN kết nối (không mở ra Internet)")
+    parser.add_argument('--port', type=int, default=INFERENCE_SERVICE_PORT)
+    parser.add_argument('--mode', choices=('thread', 'process'), default='thread',
+                        help="Chạy model trong tiến trình service hay ở tiến trình con")
+    parser.add_argument('--max-inflight', type=int, default=INFERENCE_SERVICE_MAX_INFLIGHT,
+                        help="Số request tối đa đang xử lý, vượt quá thì trả BUSY")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Số ảnh tối đa đang chờ của mỗi kết nối")
+    args = parser.parse_args()
+    if not INFERENCE_SERVICE_TOKEN and args.host not in ('127.0.0.1', 'localhost', '::1'):
+        print(f"Cảnh báo: lắng nghe tại {args.host} mà không đặt INFERENCE_SERVICE_TOKEN, "
+              f"mọi máy trong mạng đều gửi ảnh được")
+
+    engine = InferenceEngine()
+    engine.load(queue_size=args.queue_size, mode=args.mode)
+    print(f"Model sẵn sàng: {', '.join(f'{k}={v:.2f}s' for k, v in engine.timings.items())}")
+
+    with InferenceServer(engine, args.host, args.port, args.max_inflight, INFERENCE_SERVICE_TOKEN) as server:
+        print(f"Inference service lắng nghe tại {args.host}:{args.port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            engine.shutdown()
+
+
+if __name__ == '__main__':
+    main()
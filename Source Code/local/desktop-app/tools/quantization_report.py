@@ -0,0 +1,137 @@
+"""So sánh độ chính xác (mAP) và độ trễ giữa model FP32 và các biến thể INT8.
+
+Chạy từ thư mục desktop-app:
+    python -m tools.quantization_report --images <thư mục ảnh> [--data <dataset.yaml>]
+
+- mAP của từng biến thể được đo bằng YOLO.val trên dataset --data (nếu có)
+  và so với mAP validation tốt nhất trong ai-train-result/train/results.csv.
+- Độ trễ được đo bằng cách chạy từng ảnh trong --images (batch 1, CPU).
+"""
+import argparse
+import csv
+import json
+import os
+import statistics
+import time
+from typing import Any, Dict, List, Optional
+
+import cv2
+
+from app.ai.inference_backend import create_backend, list_calibration_images
+
+DEFAULT_RESULTS_CSV = os.path.join('..', '..', 'ai-train-result', 'train', 'results.csv')
+DEFAULT_VARIANTS = ['torch', 'onnx', 'onnx-int8', 'openvino', 'openvino-int8']
+
+
+def load_reference_metrics(results_csv: str) -> Optional[Dict[str, float]]:
+    """Lấy metrics validation của epoch tốt nhất (fitness = 0.1*mAP50 + 0.9*mAP50-95 như ultralytics)."""
+    if not os.path.exists(results_csv):
+        return None
+
+    with open(results_csv, newline='') as f:
+        rows = [{k.strip(): v.strip() for k, v in row.items()} for row in csv.DictReader(f)]
+    if not rows:
+        return None
+
+    def fitness(row):
+        return 0.1 * float(row['metrics/mAP50(B)']) + 0.9 * float(row['metrics/mAP50-95(B)'])
+
+    best = max(rows, key=fitness)
+    return {
+        'epoch': int(best['epoch']),
+        'map50': float(best['metrics/mAP50(B)']),
+        'map': float(best['metrics/mAP50-95(B)']),
+    }
+
+
+def measure_latency(model, images: List[str], imgsz: int, warmup: int = 3) -> Dict[str, float]:
+    frames = [f for f in (cv2.imread(p) for p in images) if f is not None]
+    if not frames:
+        return {}
+
+    for frame in frames[:warmup]:
+        model(frame, imgsz=imgsz, verbose=False)
+
+    timings = []
+    for frame in frames:
+        start = time.perf_counter()
+        model(frame, imgsz=imgsz, verbose=False)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    timings.sort()
+    return {
+        'mean_ms': statistics.fmean(timings),
+        'p50_ms': timings[len(timings) // 2],
+        'p95_ms': timings[min(len(timings) - 1, int(len(timings) * 0.95))],
+    }
+
+
+def evaluate_variant(variant: str, args) -> Dict[str, Any]:
+    report: Dict[str, Any] = {'variant': variant}
+    try:
+        model = create_backend(variant, args.model, imgsz=args.imgsz).load()
+    except Exception as e:
+        report['error'] = str(e)
+        return report
+
+    if args.data:
+        metrics = model.val(data=args.data, imgsz=args.imgsz, batch=1, device='cpu', plots=False, verbose=False)
+        report['map50'] = float(metrics.box.map50)
+        report['map'] = float(metrics.box.map)
+
+    report.update(measure_latency(model, args.image_paths, args.imgsz))
+    return report
+
+
+def print_report(reports: List[Dict[str, Any]], reference: Optional[Dict[str, float]]):
+    if reference:
+        print(f"Tham chiếu (results.csv, epoch {reference['epoch']}): "
+              f"mAP50={reference['map50']:.4f}, mAP50-95={reference['map']:.4f}")
+
+    baseline = next((r for r in reports if r['variant'] == 'torch' and 'error' not in r), None)
+
+    header = f"{'variant':<15}{'mAP50':>9}{'mAP50-95':>10}{'ΔmAP':>9}{'p50 ms':>9}{'p95 ms':>9}{'speedup':>9}"
+    print(header)
+    print('-' * len(header))
+    for r in reports:
+        if 'error' in r:
+            print(f"{r['variant']:<15} lỗi: {r['error']}")
+            continue
+
+        ref_map = reference['map'] if reference else (baseline or {}).get('map')
+        delta = f"{r['map'] - ref_map:+.4f}" if 'map' in r and ref_map is not None else '-'
+        speedup = '-'
+        if baseline and 'p50_ms' in r and 'p50_ms' in baseline:
+            speedup = f"{baseline['p50_ms'] / r['p50_ms']:.2f}x"
+
+        print(f"{r['variant']:<15}"
+              f"{r.get('map50', float('nan')):>9.4f}{r.get('map', float('nan')):>10.4f}{delta:>9}"
+              f"{r.get('p50_ms', float('nan')):>9.1f}{r.get('p95_ms', float('nan')):>9.1f}{speedup:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="So sánh FP32 và INT8 cho model nhận diện biển số")
+    parser.add_argument('--model', default=r'app/ai/model.pt')
+    parser.add_argument('--images', required=True, help="Thư mục ảnh dùng để đo độ trễ")
+    parser.add_argument('--data', help="Dataset .yaml để đo mAP (bỏ qua nếu không có)")
+    parser.add_argument('--results-csv', default=DEFAULT_RESULTS_CSV)
+    parser.add_argument('--imgsz', type=int, default=640)
+    parser.add_argument('--variants', nargs='+', default=DEFAULT_VARIANTS)
+    parser.add_argument('--json', help="Ghi báo cáo ra file JSON")
+    args = parser.parse_args()
+
+    args.image_paths = list_calibration_images(args.images)
+    if not args.image_paths:
+        parser.error(f"Không tìm thấy ảnh trong {args.images}")
+
+    reference = load_reference_metrics(args.results_csv)
+    reports = [evaluate_variant(v, args) for v in args.variants]
+    print_report(reports, reference)
+
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'reference': reference, 'variants': reports}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
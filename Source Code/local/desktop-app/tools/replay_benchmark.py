@@ -0,0 +1,220 @@
+"""Chạy lại một thư mục ảnh chụp (JPEG) qua Proccessor để đo tốc độ và độ chính xác, không cần quẹt thẻ thật.
+
+Chạy từ thư mục desktop-app:
+    python -m tools.replay_benchmark --images <thư mục ảnh> [--labels labels.csv] [--batch 4]
+    python -m tools.replay_benchmark --images <thư mục ảnh> \\
+        --config torch:DETECTOR_BACKEND=torch --config openvino:DETECTOR_BACKEND=openvino \\
+        --config fast-2t:OCR_CASCADE=0,ENHANCE_PROFILE=fast,THREADS=2 --config rec:OCR_MODE=recognize
+
+Nhãn (số biển đúng) lấy từ --labels (CSV `tên file,số biển`), nếu không có thì từ tên file
+(phần trước dấu '_' đầu tiên, ví dụ `51A-123.45_2.jpg`) khi đúng định dạng biển số.
+Mỗi --config là `tên:KEY=VALUE,...`, KEY là biến môi trường của app (DETECTOR_BACKEND, ENHANCE_PROFILE,
+OCR_MODE, OCR_ENGINE, OCR_CASCADE, DETECTOR_IMGSZ, ...) hoặc THREADS (số thread của torch/OpenCV).
+Cấu hình được đọc khi import nên mỗi config chạy trong một tiến trình riêng. OCR_CASCADE=1 (mặc định) tự chọn
+profile tăng chất lượng ảnh theo từng bước, nên config so sánh ENHANCE_PROFILE cần đặt OCR_CASCADE=0.
+"""
+import argparse
+import csv
+import glob
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+IMAGE_PATTERNS = ('*.jpg', '*.jpeg', '*.png', '*.bmp')
+PLATE_PATTERN = re.compile(r"^[0-9]{2}[A-Z]{1,2}[0-9]{4,5}$")
+RESULT_MARKER = 'REPLAY_BENCHMARK_RESULT '
+# Replay không được dùng lại kết quả OCR của ảnh trước hay ghi ảnh debug, trừ khi config đặt khác
+BENCHMARK_ENV = {'OCR_CACHE_SIZE': '0', 'DEBUG_IMAGES': '0', 'STAGE_METRICS_LOG_EVERY': '0'}
+
+
+def normalize(plate: str) -> str:
+    return re.sub(r"[\s.,\-]", "", plate or "").upper()
+
+
+def load_samples(images_dir: str, labels_path: str = None) -> list:
+    """[(đường dẫn ảnh, số biển đã chuẩn hoá hoặc None)]"""
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(images_dir, pattern)))
+    labels = {}
+    if labels_path:
+        with open(labels_path, newline='', encoding='utf-8') as f:
+            for row in csv.reader(f):
+                if len(row) >= 2 and row[0].strip():
+                    labels[os.path.basename(row[0].strip())] = normalize(row[1])
+
+    samples = []
+    for path in paths:
+        name = os.path.basename(path)
+        label = labels.get(name) if labels_path else normalize(os.path.splitext(name)[0].split('_')[0])
+        samples.append((path, label if label and PLATE_PATTERN.match(label) else None))
+    return samples
+
+
+def percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100
+    lo = int(k)
+    hi = min(lo + 1, len(values) - 1)
+    return values[lo] + (values[hi] - values[lo]) * (k - lo)
+
+
+def set_threads(threads: int):
+    import cv2
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def run_benchmark(samples: list, batch: int = 1, warmup: int = 2) -> dict:
+    """Chạy toàn bộ ảnh qua Proccessor trong tiến trình hiện tại, trả về báo cáo."""
+    import cv2
+
+    from app.ai.proccessor import Proccessor
+    from app.ai.stage_metrics import StageMetrics, StageTimer
+
+    start = time.perf_counter()
+    proccessor = Proccessor()
+    proccessor.warmup()
+    load_time = time.perf_counter() - start
+
+    frames = [(path, label, cv2.imread(path)) for path, label in samples]
+    # Vài ảnh đầu chạy trước để lần chạy đo không tính chi phí khởi tạo lười (cudnn, cache OpenCV, ...)
+    for _, _, frame in frames[:warmup]:
+        try:
+            proccessor.proccess_image(frame, timer=StageTimer())
+        except Exception:
+            pass
+
+    metrics = StageMetrics(window=max(1, len(frames)), log_every=0)
+    records = []
+    start = time.perf_counter()
+    for i in range(0, len(frames), batch):
+        chunk = frames[i:i + batch]
+        timers = [StageTimer() for _ in chunk]
+        detections = proccessor.detect_frames([frame for _, _, frame in chunk], None, timers)
+        for (path, label, frame), detection, timer in zip(chunk, detections, timers):
+            record = {'image': os.path.basename(path), 'label': label, 'detected': False, 'plate': None, 'error': None}
+            try:
+                detect_result = proccessor.crop_detection(frame, detection, None, timer)
+                record['detected'] = True
+                plate, _, _, _ = proccessor.read_and_validate(detect_result, timer)
+                record['plate'] = normalize(plate)
+            except Exception as e:
+                record['error'] = str(e)
+            record['latency_ms'] = timer.total_ns / 1e6
+            metrics.record(timer.timings)
+            records.append(record)
+    elapsed = time.perf_counter() - start
+
+    labeled = [r for r in records if r['label']]
+    latencies = [r['latency_ms'] for r in records]
+    return {
+        'images': len(records),
+        'labeled': len(labeled),
+        'batch': batch,
+        'load_s': load_time,
+        'elapsed_s': elapsed,
+        'throughput': len(records) / elapsed if elapsed else 0.0,
+        'latency_ms': {f'p{p}': percentile(latencies, p) for p in (50, 95, 99)},
+        # Có nhãn thì ảnh chắc chắn có biển số; không có nhãn thì chỉ là tỉ lệ ảnh detect được biển số
+        'detection_recall': sum(r['detected'] for r in (labeled or records)) / max(1, len(labeled or records)),
+        'exact_match': sum(r['plate'] == r['label'] for r in labeled) / len(labeled) if labeled else None,
+        'stages': metrics.snapshot(),
+        'records': records,
+    }
+
+
+def parse_config(spec: str) -> tuple:
+    name, _, assignments = spec.partition(':')
+    env = {}
+    for assignment in filter(None, assignments.split(',')):
+        key, _, value = assignment.partition('=')
+        env[key.strip()] = value.strip()
+    return name or spec, env
+
+
+def run_config(name: str, env: dict, args) -> dict:
+    """Chạy 1 config trong tiến trình con với biến môi trường riêng."""
+    child_env = {**os.environ, **BENCHMARK_ENV, **env}
+    if 'THREADS' in env:
+        child_env['OMP_NUM_THREADS'] = env['THREADS']
+    cmd = [sys.executable, '-m', 'tools.replay_benchmark', '--images', args.images, '--batch', str(args.batch),
+           '--warmup', str(args.warmup), '--child']
+    if args.labels:
+        cmd += ['--labels', args.labels]
+    print(f"\n=== Config '{name}': {env or 'mặc định'} ===")
+    if 'ENHANCE_PROFILE' in env and child_env.get('OCR_CASCADE', '1') == '1':
+        print(f"Cảnh báo: config '{name}' đặt ENHANCE_PROFILE nhưng OCR_CASCADE=1 nên profile không có tác dụng, "
+              f"thêm OCR_CASCADE=0 để đo profile")
+    proc = subprocess.run(cmd, env=child_env, stdout=subprocess.PIPE, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return {'error': f"Tiến trình benchmark lỗi (exit code {proc.returncode})"}
+
+
+def print_report(reports: dict):
+    header = f"{'config':<16}{'ảnh':>6}{'ảnh/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'recall':>9}{'exact':>9}"
+    print("\n" + header + "\n" + '-' * len(header))
+    for name, report in reports.items():
+        if 'error' in report:
+            print(f"{name:<16}{report['error']}")
+            continue
+        latency = report['latency_ms']
+        exact = f"{report['exact_match'] * 100:.1f}%" if report['exact_match'] is not None else '-'
+        print(f"{name:<16}{report['images']:>6}{report['throughput']:>9.2f}{latency['p50']:>9.1f}"
+              f"{latency['p95']:>9.1f}{latency['p99']:>9.1f}{report['detection_recall'] * 100:>8.1f}%{exact:>9}")
+
+    for name, report in reports.items():
+        if 'stages' in report:
+            print(f"\n{name} - thời gian từng stage:")
+            for stage, s in report['stages'].items():
+                print(f"  {stage:<10} p50={s['p50_ms']:.1f}ms p95={s['p95_ms']:.1f}ms p99={s['p99_ms']:.1f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay ảnh chụp qua pipeline nhận dạng biển số")
+    parser.add_argument('--images', required=True, help="Thư mục ảnh chụp (JPEG)")
+    parser.add_argument('--labels', help="CSV `tên file,số biển`; mặc định lấy nhãn từ tên file")
+    parser.add_argument('--config', action='append', default=[], metavar='TÊN:KEY=VALUE,...',
+                        help="Cấu hình cần so sánh, lặp lại để so sánh nhiều cấu hình")
+    parser.add_argument('--batch', type=int, default=1, help="Số ảnh mỗi batch detect")
+    parser.add_argument('--warmup', type=int, default=2, help="Số ảnh chạy trước, không tính vào kết quả")
+    parser.add_argument('--output', help="Ghi báo cáo đầy đủ (kể cả kết quả từng ảnh) ra file JSON")
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    samples = load_samples(args.images, args.labels)
+    if not samples:
+        parser.error(f"Không có ảnh trong {args.images}")
+
+    if args.child or not args.config:
+        if not args.child:
+            os.environ.update({key: value for key, value in BENCHMARK_ENV.items() if key not in os.environ})
+        if os.getenv('THREADS'):
+            set_threads(int(os.environ['THREADS']))
+        report = run_benchmark(samples, args.batch, args.warmup)
+        if args.child:
+            print(RESULT_MARKER + json.dumps(report))
+            return
+        reports = {'default': report}
+    else:
+        print(f"{len(samples)} ảnh, {sum(label is not None for _, label in samples)} ảnh có nhãn")
+        reports = {name: run_config(name, env, args) for name, env in map(parse_config, args.config)}
+
+    print_report(reports)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi báo cáo: {args.output}")
+
+
+if __name__ == '__main__':
+    main()